@@ -0,0 +1,112 @@
+"""
+Hedged requests for tail latency.
+When a request is still running after the rolling latency percentile, a duplicate is sent and the
+first good answer wins; the other is cancelled. A hedge budget (a fraction of all requests) and the
+rate limiter's spare capacity bound how much extra quota hedging can spend.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class HedgePolicy:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, name: str = "llm"):
+        config = config or {}
+        self.name = name
+        self.enabled = config.get("enabled", False)
+        self.percentile = float(config.get("percentile", 95)) # Hedge once a request is slower than this percentile
+        self.min_samples = int(config.get("min_samples", 20)) # No hedging until the window says what "slow" is
+        self.min_delay = float(config.get("min_delay", 2.0)) # Seconds; never hedge sooner than this
+        self.max_hedge_ratio = float(config.get("max_hedge_ratio", 0.1)) # Hedges per request, long-run
+        self.burst = int(config.get("burst", 2)) # Hedges allowed before the ratio applies
+        self._latencies: deque = deque(maxlen=int(config.get("window", 200)))
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "budget_denied": 0, "limiter_denied": 0}
+
+    def record(self, latency: float):
+        """Add a completed request's latency to the rolling window"""
+        self._latencies.append(latency)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        rank = max(0, math.ceil(percentile / 100.0 * len(ordered)) - 1) # Nearest-rank
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off or there is no baseline yet"""
+        if not self.enabled or len(self._latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency_percentile(self.percentile))
+
+    def _within_budget(self) -> bool:
+        return self.stats["hedged"] < self.burst + self.max_hedge_ratio * self.stats["requests"]
+
+    async def run(self, attempt: Callable[[], Awaitable[Any]], is_error: Callable[[Any], bool],
+                  can_hedge: Callable[[], bool] = lambda: True) -> Any:
+        """
+        Run attempt(), hedging it with a second attempt() if it outlives hedge_delay().
+        Returns the first non-error result (or the last error if both fail). can_hedge is consulted
+        right before hedging, e.g. to skip hedges the rate limiter would have to queue.
+        """
+        self.stats["requests"] += 1
+        start = time.monotonic()
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(attempt())
+        tasks = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    if not self._within_budget():
+                        self.stats["budget_denied"] += 1
+                    elif not can_hedge():
+                        self.stats["limiter_denied"] += 1
+                    else:
+                        self.stats["hedged"] += 1
+                        logger.debug(f"[{self.name}] Request exceeded p{self.percentile:g} ({delay:.2f}s); sending hedge")
+                        tasks.append(asyncio.ensure_future(attempt()))
+
+            result, winner = None, primary
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index): # Prefer the primary on a tie
+                    result, winner = task.result(), task
+                    if not is_error(result):
+                        break
+                if not is_error(result):
+                    break
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks) # Caller cancelled: release the attempts' rate-limit slots before returning
+            raise
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel() # The losing attempt (or both, if the caller was cancelled)
+
+        if not is_error(result):
+            self.record(time.monotonic() - start)
+            if winner is not primary:
+                self.stats["hedge_wins"] += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hedge counts plus the latency percentiles the threshold is tuned against"""
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "hedge_rate": round(self.stats["hedged"] / requests, 3) if requests else 0.0,
+            "samples": len(self._latencies),
+            "p50": self.latency_percentile(50),
+            "p95": self.latency_percentile(95),
+            "p99": self.latency_percentile(99),
+            "hedge_delay": self.hedge_delay(),
+        }
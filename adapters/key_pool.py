@@ -0,0 +1,106 @@
+"""
+Pool of API keys for one model.
+Every key keeps its own rate limiter (quota bucket + concurrency window); each request goes to the
+least-loaded key, and a key that was answered with 429 cools down before it is picked again.
+"""
+import time
+from typing import Dict, List, Any, Optional
+
+from adapters.rate_limiter import AdaptiveRateLimiter, RateLimitedRequest, get_rate_limiter
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class _PooledKey:
+    def __init__(self, index: int, api_key: Optional[str], limiter: AdaptiveRateLimiter):
+        self.index = index
+        self.api_key = api_key
+        self.limiter = limiter
+        self.cooldown_until = 0.0
+        self.stats = {"requests": 0, "throttled": 0}
+
+    def cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def load(self) -> float:
+        """Fraction of the concurrency window in use"""
+        return self.limiter.in_flight / max(self.limiter.concurrency_limit, 1.0)
+
+class PooledRequest(RateLimitedRequest):
+    """A RateLimitedRequest on the key the pool picked; exposes that key as .api_key"""
+
+    def __init__(self, pool: "ApiKeyPool", entry: _PooledKey):
+        super().__init__(entry.limiter)
+        self.pool = pool
+        self.entry = entry
+        self.api_key = entry.api_key
+
+    def throttled(self, retry_after: Optional[float] = None):
+        super().throttled(retry_after)
+        self.pool._cool_down(self.entry, retry_after)
+
+class ApiKeyPool:
+    def __init__(self, model: str, api_keys: List[Optional[str]], rate_config: Optional[Dict[str, Any]] = None,
+                 cooldown: Optional[float] = None):
+        if not api_keys:
+            raise ValueError("ApiKeyPool needs at least one API key")
+        rate_config = rate_config or {}
+        self.model = model
+        self.keys = [_PooledKey(index, key, get_rate_limiter(model, key, rate_config)) for index, key in enumerate(dict.fromkeys(api_keys))]
+        # Minimum time a throttled key is skipped; Retry-After wins when it is longer
+        self.cooldown = float(cooldown if cooldown is not None else rate_config.get("default_retry_after", 10.0))
+        self.stats = {"requests": 0, "throttled": 0, "all_cooling": 0}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def pick(self) -> _PooledKey:
+        """Least-loaded key that is not cooling down; if all are, the one that recovers first"""
+        now = time.monotonic()
+        ready = [entry for entry in self.keys if not entry.cooling(now)]
+        if not ready:
+            self.stats["all_cooling"] += 1
+            return min(self.keys, key=lambda entry: entry.cooldown_until)
+        return min(ready, key=lambda entry: (
+            not entry.limiter.has_capacity(), # Keys that can start right now first
+            entry.load(),
+            -entry.limiter.available_tokens(), # Then the fullest quota bucket
+            entry.stats["requests"]
+        ))
+
+    def request(self) -> PooledRequest:
+        """Async context manager holding a slot on the picked key (see RateLimitedRequest)"""
+        entry = self.pick()
+        entry.stats["requests"] += 1
+        self.stats["requests"] += 1
+        return PooledRequest(self, entry)
+
+    def has_capacity(self) -> bool:
+        now = time.monotonic()
+        return any(not entry.cooling(now) and entry.limiter.has_capacity() for entry in self.keys)
+
+    def _cool_down(self, entry: _PooledKey, retry_after: Optional[float]):
+        entry.cooldown_until = time.monotonic() + max(self.cooldown, retry_after or 0.0)
+        entry.stats["throttled"] += 1
+        self.stats["throttled"] += 1
+        logger.warning(f"[{self.model}] Key #{entry.index} throttled; cooling down for {entry.cooldown_until - time.monotonic():.1f}s "
+                       f"({sum(not e.cooling(time.monotonic()) for e in self.keys)}/{len(self.keys)} keys available)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool totals plus per-key load (keys are reported by index, never by value)"""
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "keys": [
+                {
+                    "index": entry.index,
+                    **entry.stats,
+                    "in_flight": entry.limiter.in_flight,
+                    "concurrency_limit": round(entry.limiter.concurrency_limit, 2),
+                    "tokens": round(entry.limiter.available_tokens(), 2),
+                    "cooling_for": round(max(0.0, entry.cooldown_until - now), 1),
+                    "priorities": entry.limiter.get_stats()["priorities"], # Queue wait per priority class
+                }
+                for entry in self.keys
+            ],
+        }
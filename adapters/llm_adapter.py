@@ -182,12 +182,35 @@ import logging
 import json
 import aiohttp
 import asyncio
-from typing import Dict, List, Optional, Any, Union
+import time
+from typing import Dict, List, Optional, Any, Union, AsyncIterator, Callable
 from utils.logger import get_logger
-from aiolimiter import AsyncLimiter
-
-# Global limiter (15 requests per minute)
-gemini_rate_limiter = AsyncLimiter(10, 60)  # 15 requests per minute
+from adapters.llm_cache import LLMResponseCache
+from adapters.rate_limiter import llm_priority, parse_retry_after
+from utils.cancellation import time_remaining
+from adapters.key_pool import ApiKeyPool
+from adapters.single_flight import SingleFlight
+from adapters.hedging import HedgePolicy
+from adapters.retry import RetryPolicy, error_result, is_retryable_status, is_retryable_exception
+from adapters.llm_replay import ReplayStore, REPLAY_MODES
+from adapters.llm_providers import make_provider
+from adapters.llm_telemetry import LLMLedger, note_attempt, note_response, note_source, note_usage, trace_config
+from utils.schema import validate_schema
+from utils.json_scanner import JSONMatch, JSONScanner, find_json, iter_json
+
+CONTINUATION_PROMPT = (
+    "Your previous answer was cut off by the output limit. Continue exactly where it stopped. "
+    "Do not repeat anything already written, do not restart, and do not add explanations."
+)
+CONTINUATION_OVERLAP_WINDOW = 200 # Chars of the previous turn checked for a repeated prefix
+OUTPUT_TOKEN_HEADROOM = 1.3 # Rewritten files tend to grow; leave room before hitting MAX_TOKENS
+
+class LLMStreamError(Exception):
+    """Raised when a streaming generation fails mid-flight"""
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
 
 class LLMAdapter:
     def __init__(self, config: Dict[str, Any]):
@@ -196,92 +219,519 @@ class LLMAdapter:
         # Set the configuration
         self.config = config
 
-        # Gemini API configuration
-        self.api_key = config["api_key"]
+        # Provider API configuration (llm.provider: "gemini" by default, or "openai" for chat-completions servers)
         self.model = config.get("model", "gemini-2.0-flash")
-        self.api_url = config.get(
-                        "api_url", 
-                        f"https://generativelanguage.googleapis.com/v1/models/{self.model}:generateContent"
-                        )
-        self.max_output_tokens = config.get("max_output_tokens", 4000) # Gemini uses max_output_tokens
+        self.provider = make_provider(config, self.model)
+        # llm.api_keys (plus api_key, if set) spreads requests over several keys, each with its own quota
+        self.api_keys = list(dict.fromkeys([*(config.get("api_keys") or []), *([config["api_key"]] if config.get("api_key") else [])]))
+        if self.provider.requires_api_key and not self.api_keys:
+            if "api_key" not in config:
+                raise ValueError(f"No API key configured for provider '{self.provider.name}': set llm.api_key or llm.api_keys "
+                                 f"(or the GEMINI_API_KEY / GEMINI_API_KEYS environment variables)")
+            self.api_keys = [config["api_key"]] # Set but empty (e.g. from an unset variable): requests fail with 401
+        self.api_key = self.api_keys[0] if self.api_keys else config.get("api_key")
+        self.api_url = self.provider.api_url
+        self.stream_api_url = self.provider.stream_api_url
+        self.max_output_tokens = config.get("max_output_tokens", 4000)
+        self.max_output_tokens_cap = config.get("max_output_tokens_cap", 8192) # Upper bound for dynamic sizing
+        self.max_continuations = config.get("max_continuations", 3) # Follow-ups after a MAX_TOKENS finish
+        self.truncation_stats = {"truncated": 0, "continuations": 0, "unfinished": 0, "enlarged": 0}
         self.temperature = config.get("temperature", 0.7)
         self.timeout = config.get("timeout", 30)  # timeout in seconds
-
-        # Rate limiting
-        self.semaphore = asyncio.Semaphore(5)  # Limit concurrent API calls
-
-    async def generate(self, prompt: str, formated_output: Optional[str] = None) -> Union[str, Dict[str, Any]]:
-        """Generate text from LLM with robust output handling"""
-        headers = {
-            "Content-Type": "application/json",
-        }
-        params = {"key": self.api_key}
-
+        # Schema-constrained JSON (responseMimeType/responseSchema) when callers pass a response_schema
+        self.structured_output = config.get("structured_output", True)
+        # How JSON responses were obtained: one-pass structured parses vs. the fallback guessing strategies
+        self.json_stats = {"structured": 0, "structured_invalid": 0, "direct": 0, "markdown": 0, "braces": 0, "lines": 0, "failed": 0}
+
+        # Rate limiting: token bucket + AIMD concurrency window shared per (model, api key), one per pooled key
+        rate_config = dict(config.get("rate_limit", {}))
+        if "max_requests_per_minute" in config: # Deprecated spelling of rate_limit.requests_per_minute
+            if "requests_per_minute" in rate_config:
+                self.logger.warning("llm.max_requests_per_minute is deprecated and ignored: rate_limit.requests_per_minute is set")
+            else:
+                self.logger.warning("llm.max_requests_per_minute is deprecated; use llm.rate_limit.requests_per_minute")
+                rate_config["requests_per_minute"] = config["max_requests_per_minute"]
+        self.key_pool = ApiKeyPool(self.model, self.api_keys or [self.api_key], rate_config, config.get("key_cooldown"))
+        self.rate_limiter = self.key_pool.keys[0].limiter # First key's limiter, for single-key callers
+
+        # Hedged requests: duplicate a generateContent call that outlives the rolling latency percentile
+        self.hedging = HedgePolicy(config.get("hedging", {}), name=self.model)
+
+        # Retries for transient failures (429/5xx/timeouts) with jittered backoff, behind a circuit breaker
+        self.retry = RetryPolicy(config.get("retry", {}), name=self.model)
+
+        # Connection pooling (session is created lazily inside the running event loop)
+        pool_config = config.get("connection_pool", {})
+        self.pool_limit = pool_config.get("limit", 20) # Total simultaneous connections
+        self.pool_limit_per_host = pool_config.get("limit_per_host", 10)
+        self.keepalive_timeout = pool_config.get("keepalive_timeout", 60) # Seconds an idle connection is kept open
+        self.dns_cache_ttl = pool_config.get("ttl_dns_cache", 300) # Seconds a DNS lookup is cached
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Response cache (Redis tier is attached later by the Agent if Redis is configured)
+        self.response_cache = LLMResponseCache(config.get("cache", {}))
+
+        # Identical concurrent requests share one API call
+        self.single_flight = SingleFlight()
+
+        # Record/replay: "record" saves live responses to disk, "replay" serves them back offline
+        replay_config = config.get("replay", {})
+        self.replay_mode = replay_config.get("mode", "off")
+        if self.replay_mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode '{self.replay_mode}', expected one of {REPLAY_MODES}")
+        self.replay_store = ReplayStore.from_config(replay_config) if self.replay_mode != "off" else None
+
+        # Per-call timing, tokens and cost (the Agent shares one ledger across adapters and labels it with the task)
+        self.ledger = LLMLedger(config.get("telemetry", {}))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use or after close"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace_config()] # Connection queueing and setup times for the ledger
+            )
+            self.logger.debug(f"Created pooled HTTP session (limit={self.pool_limit}, per_host={self.pool_limit_per_host})")
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _build_payload(self, prompt: str, formated_output: Optional[str] = None,
+                       response_schema: Optional[Dict[str, Any]] = None,
+                       max_output_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Build the provider request body for a prompt"""
         # Format prompt based on desired output
         formatted_prompt, system_message = self._format_prompt(prompt, formated_output)
-
-        data = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [{"text": system_message}]
-                },
-                {
-                    "role": "model",
-                    "parts": [{"text": "Okay, I understand."}] # Initial response from the model
-                },
-                {
-                    "role": "user",
-                    "parts": [{"text": formatted_prompt}]
-                }
-            ],
-            "generationConfig": {
-                "maxOutputTokens": self.max_output_tokens,
-                "temperature": self.temperature
-            }
-        }
-
-        async with self.semaphore, gemini_rate_limiter:
+        return self.provider.build_payload(system_message, formatted_prompt, max_output_tokens or self.max_output_tokens,
+                                           self.temperature, response_schema)
+
+    def _extract_candidate_text(self, result: Dict[str, Any]) -> Optional[str]:
+        """Return the text of the first candidate in a response (or stream chunk)"""
+        return self.provider.extract_text(result)
+
+    def _process_output(self, generated_text: str, formated_output: Optional[str],
+                        response_schema: Optional[Dict[str, Any]] = None,
+                        json_match: Optional[JSONMatch] = None) -> Union[str, Dict[str, Any]]:
+        """Process raw model text based on requested format (json_match: the first value, already found while streaming)"""
+        if response_schema:
+            return self._parse_structured_response(generated_text, response_schema)
+        if formated_output == "json":
+            return self._parse_json_response(generated_text, json_match)
+        elif formated_output == "code":
+            return self._extract_code(generated_text)
+        return generated_text
+
+    def _is_error(self, result: Any) -> bool:
+        return isinstance(result, dict) and "error" in result
+
+    async def _cache_lookup(self, data: Dict[str, Any], use_cache: bool) -> tuple[Optional[str], Optional[str]]:
+        """Return (cache_key, cached_text); cache_key is None when the cache must not be used"""
+        if not use_cache or not self.response_cache.should_use(self.temperature):
+            return None, None
+        cache_key = self.response_cache.make_key(self.model, data)
+        cached_text = await self.response_cache.get(cache_key)
+        if cached_text is not None:
+            self.logger.debug(f"LLM cache hit for key {cache_key[:12]}")
+        return cache_key, cached_text
+
+    async def generate(self, prompt: str, formated_output: Optional[str] = None, use_cache: bool = True,
+                       response_schema: Optional[Dict[str, Any]] = None,
+                       max_output_tokens: Optional[int] = None, call_type: Optional[str] = None,
+                       validate: Optional[Callable[[Any], Optional[str]]] = None,
+                       priority: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+        """
+        Generate text from LLM with robust output handling.
+        With a response_schema (and structured_output enabled) the model is constrained to that JSON schema
+        and the result is parsed and validated in one pass instead of guessed at.
+        max_output_tokens overrides the configured default for this call (see size_output_tokens).
+        call_type and validate are used by ModelRouter to pick and escalate tiers; here they only label logs.
+        priority ("interactive", "normal", "background") orders this call in the rate limiter queue.
+        Every call is recorded in self.ledger, labelled with call_type.
+        """
+        with llm_priority(priority):
+            return await self.ledger.observe(
+                self._generate(prompt, formated_output, use_cache, response_schema, max_output_tokens, call_type, validate),
+                self.model, call_type, stream=False)
+
+    async def _generate(self, prompt: str, formated_output: Optional[str], use_cache: bool,
+                        response_schema: Optional[Dict[str, Any]], max_output_tokens: Optional[int],
+                        call_type: Optional[str], validate: Optional[Callable[[Any], Optional[str]]]) -> Union[str, Dict[str, Any]]:
+        """generate() inside its priority class and ledger record"""
+        if not self.structured_output:
+            response_schema = None # Fall back to prompt-only JSON and the parsing heuristics
+        if response_schema:
+            formated_output = "json"
+        data = self._build_payload(prompt, formated_output, response_schema, max_output_tokens)
+
+        cache_key, cached_text = await self._cache_lookup(data, use_cache)
+        if cached_text is not None:
+            note_source("cache")
+            return self._log_validation(self._process_output(cached_text, formated_output, response_schema), call_type, validate)
+
+        # Concurrent callers with the same payload wait on a single request
+        flight_key = f"{formated_output}:{LLMResponseCache.make_key(self.model, data)}"
+        result = await self.single_flight.do(
+            flight_key, lambda: self._send_generate_request(data, formated_output, cache_key, response_schema)
+        )
+        return self._log_validation(result, call_type, validate)
+
+    def _log_validation(self, result: Any, call_type: Optional[str], validate: Optional[Callable[[Any], Optional[str]]]) -> Any:
+        """Warn when a caller's validator rejects a result (there is no stronger tier to escalate to)"""
+        if validate is not None and not self._is_error(result):
+            reason = validate(result)
+            if reason:
+                self.logger.warning(f"{call_type or 'LLM'} response from {self.model} failed validation: {reason}")
+        return result
+
+    async def _send_generate_request(self, data: Dict[str, Any], formated_output: Optional[str],
+                                     cache_key: Optional[str], response_schema: Optional[Dict[str, Any]] = None) -> Union[str, Dict[str, Any]]:
+        """Send one generateContent request (plus continuations if truncated) and process the response"""
+        result = await self._post_generate(data)
+        if self._is_error(result):
+            return result
+        result = await self._continue_if_truncated(data, result, response_schema)
+        return await self._handle_response(result, formated_output, cache_key, response_schema)
+
+    async def _post_generate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """POST one generateContent request; returns the raw response body or an error dict"""
+        if self.replay_mode == "replay":
+            note_source("replay")
+            result = await self.replay_store.replay(ReplayStore.make_key(self.model, data))
+            if result is None:
+                self.logger.error("No recorded response for this request (replay mode)")
+                return {"error": "No recorded response for this request (replay mode)"}
+            return result
+        return await self.retry.run(
+            lambda: self.hedging.run(lambda: self._post_once(data), self._is_error, self.key_pool.has_capacity),
+            self._is_error
+        )
+
+    async def _post_once(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """One HTTP attempt at generateContent (hedging may run two of these concurrently)"""
+        async with self.key_pool.request() as ticket:
+            note_attempt(ticket.queue_wait)
+            headers = self.provider.request_headers(ticket.api_key)
+            params = self.provider.request_params(ticket.api_key, stream=False)
             try:
-                self.logger.debug(f"Sending request to Gemini API: {self.api_url}")
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        self.api_url,
-                        headers=headers,
-                        params=params,
-                        json=data,
-                        timeout=aiohttp.ClientTimeout(total=self.timeout)
-                    ) as response:
-
-                        if response.status != 200:
-                            error_msg = await response.text()
-                            self.logger.error(f"API request failed with status {response.status}: {error_msg}")
-                            return {"error": f"API request failed: {error_msg}"}
-
-                        result = await response.json()
-                        # Gemini response structure is different
-                        if "candidates" in result and result["candidates"]:
-                            generated_text = result["candidates"][0]["content"]["parts"][0]["text"]
-
-                            # Process output based on requested format
-                            if formated_output == "json":
-                                return self._parse_json_response(generated_text)
-                            elif formated_output == "code":
-                                return self._extract_code(generated_text)
-                            return generated_text
-                        else:
-                            self.logger.warning(f"No candidates found in Gemini API response: {result}")
-                            return {"error": "No response from the model"}
+                self.logger.debug(f"Sending request to {self.provider.name} API: {self.api_url}")
+
+                session = self._get_session()
+                async with session.post(
+                    self.api_url,
+                    headers=headers,
+                    params=params,
+                    json=self.provider.request_body(data, stream=False),
+                    timeout=aiohttp.ClientTimeout(total=time_remaining(self.timeout)) # Never past the caller's deadline
+                ) as response:
+                    ticket.responded()
+                    note_response(ticket.latency)
+
+                    if response.status != 200:
+                        error_msg = await response.text()
+                        if response.status == 429:
+                            ticket.throttled(parse_retry_after(response.headers, error_msg))
+                        self.logger.error(f"API request failed with status {response.status}: {error_msg}")
+                        return error_result(f"API request failed: {error_msg}", response.status,
+                                            is_retryable_status(response.status))
+
+                    result = await response.json()
+                    note_usage(self.provider.extract_usage(result))
+                    if self.replay_mode == "record":
+                        await self.replay_store.record(ReplayStore.make_key(self.model, data), result)
+                    return result
 
             except aiohttp.ClientError as e:
                 self.logger.error(f"HTTP request failed: {str(e)}")
-                return {"error": f"HTTP request failed: {str(e)}"}
+                return error_result(f"HTTP request failed: {str(e)}", retryable=is_retryable_exception(e))
             except asyncio.TimeoutError:
                 self.logger.error(f"Request timed out after {self.timeout} seconds")
-                return {"error": f"Request timed out after {self.timeout} seconds"}
+                return error_result(f"Request timed out after {self.timeout} seconds", retryable=True)
             except Exception as e:
-                return {"error": f"Unexpected error: {str(e)}"}
+                return error_result(f"Unexpected error: {str(e)}")
+
+    # --- Truncation handling ---
+    def _extract_finish_reason(self, result: Dict[str, Any]) -> Optional[str]:
+        """Finish reason normalized to Gemini's names ("STOP", "MAX_TOKENS", ...)"""
+        return self.provider.extract_finish_reason(result)
+
+    def size_output_tokens(self, expected_tokens: int) -> int:
+        """maxOutputTokens for an answer of roughly expected_tokens: the default, grown with headroom up to the cap"""
+        wanted = int(expected_tokens * OUTPUT_TOKEN_HEADROOM) + 512
+        return min(self.max_output_tokens_cap, max(self.max_output_tokens, wanted))
+
+    def _continuation_payload(self, data: Dict[str, Any], partial_text: str) -> Dict[str, Any]:
+        """Same conversation with the truncated answer as the model turn and a request to carry on"""
+        return self.provider.continuation_payload(data, partial_text, CONTINUATION_PROMPT)
+
+    def _stitch(self, previous: str, continuation: str) -> str:
+        """Return the part of continuation that is new: drop a re-opened code fence and any repeated overlap"""
+        if previous.count("```") % 2 == 1 and continuation.lstrip().startswith("```"):
+            # Still inside the first fence; the model opened a second one
+            stripped = continuation.lstrip()
+            continuation = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        window = previous[-CONTINUATION_OVERLAP_WINDOW:]
+        for size in range(min(len(window), len(continuation)), 0, -1):
+            if window.endswith(continuation[:size]) and (size >= 8 or continuation[:size].strip() == ""):
+                return continuation[size:] # Repeated tail of the previous turn
+        return continuation
+
+    async def _continue_if_truncated(self, data: Dict[str, Any], result: Dict[str, Any],
+                                     response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Follow a MAX_TOKENS response with continuation requests and return one stitched response body"""
+        if self._extract_finish_reason(result) != "MAX_TOKENS":
+            return result
+        text = self._extract_candidate_text(result) or ""
+        if response_schema:
+            # Constrained decoding restarts the JSON document on continuation; retry once with more room instead
+            budget = self.provider.max_output_tokens(data)
+            if budget >= self.max_output_tokens_cap:
+                self.logger.warning(f"Structured response truncated at the {budget}-token cap")
+                return result
+            self.truncation_stats["enlarged"] += 1
+            retry = self.provider.with_max_output_tokens(data, self.max_output_tokens_cap)
+            self.logger.info(f"Structured response truncated at {budget} tokens; retrying with {self.max_output_tokens_cap}")
+            retried = await self._post_generate(retry)
+            return result if self._is_error(retried) else retried
+
+        self.truncation_stats["truncated"] += 1
+        finish_reason = "MAX_TOKENS"
+        for attempt in range(1, self.max_continuations + 1):
+            self.logger.info(f"Response truncated at maxOutputTokens ({len(text)} chars so far); continuation {attempt}/{self.max_continuations}")
+            self.truncation_stats["continuations"] += 1
+            follow_up = await self._post_generate(self._continuation_payload(data, text))
+            if self._is_error(follow_up):
+                self.logger.warning(f"Continuation request failed, keeping truncated output: {follow_up['error']}")
+                break
+            text += self._stitch(text, self._extract_candidate_text(follow_up) or "")
+            finish_reason = self._extract_finish_reason(follow_up)
+            if finish_reason != "MAX_TOKENS":
+                break
+        if finish_reason == "MAX_TOKENS":
+            self.truncation_stats["unfinished"] += 1
+            self.logger.warning(f"Output still truncated after {self.max_continuations} continuations")
+        return self.provider.make_result(text, finish_reason)
+
+    async def _handle_response(self, result: Dict[str, Any], formated_output: Optional[str],
+                               cache_key: Optional[str], response_schema: Optional[Dict[str, Any]] = None) -> Union[str, Dict[str, Any]]:
+        """Turn a generateContent response body into the caller-facing result"""
+        generated_text = self._extract_candidate_text(result)
+        if generated_text is not None:
+            processed = self._process_output(generated_text, formated_output, response_schema)
+            if cache_key and not self._is_error(processed) and self._extract_finish_reason(result) != "MAX_TOKENS":
+                await self.response_cache.set(cache_key, generated_text, formated_output)
+            return processed
+        else:
+            self.logger.warning(f"No candidates found in {self.provider.name} API response: {result}")
+            return {"error": "No response from the model"}
+
+    async def _replay_stream(self, data: Dict[str, Any], state: Dict[str, Any]) -> AsyncIterator[str]:
+        """Replay a recorded response as a sequence of line-sized stream chunks"""
+        result = await self.replay_store.replay(ReplayStore.make_key(self.model, data))
+        text = self._extract_candidate_text(result) if result is not None else None
+        if text is None:
+            raise LLMStreamError("No recorded response for this request (replay mode)")
+        state["finish_reason"] = self._extract_finish_reason(result)
+        for line in text.splitlines(keepends=True):
+            yield line
+            await asyncio.sleep(0) # Let renderers draw between chunks like a live stream
+
+    async def generate_stream(self, prompt: str, formated_output: Optional[str] = None,
+                              max_output_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Stream raw text chunks from the streamGenerateContent endpoint as they arrive.
+        A stream cut off at maxOutputTokens is continued with follow-up streams, so callers see one answer.
+        Raises LLMStreamError on HTTP, timeout or protocol failures.
+        """
+        data = self._build_payload(prompt, formated_output, max_output_tokens=max_output_tokens)
+        emitted = ""
+        for attempt in range(self.max_continuations + 1):
+            round_data = data if attempt == 0 else self._continuation_payload(data, emitted)
+            state: Dict[str, Any] = {"finish_reason": None}
+            held = None if attempt == 0 else "" # Start of a continuation, held until its overlap is known
+            async for text in self._stream_round_with_retry(round_data, state):
+                if held is not None:
+                    held += text
+                    if len(held) < CONTINUATION_OVERLAP_WINDOW:
+                        continue
+                    text, held = self._stitch(emitted, held), None
+                emitted += text
+                yield text
+            if held:
+                text = self._stitch(emitted, held)
+                emitted += text
+                yield text
+
+            if state["finish_reason"] != "MAX_TOKENS":
+                return
+            if attempt == 0:
+                self.truncation_stats["truncated"] += 1
+            if attempt < self.max_continuations:
+                self.truncation_stats["continuations"] += 1
+                self.logger.info(f"Stream truncated at maxOutputTokens; continuation {attempt + 1}/{self.max_continuations}")
+        self.truncation_stats["unfinished"] += 1
+        self.logger.warning(f"Streamed output still truncated after {self.max_continuations} continuations")
+
+    async def _stream_round_with_retry(self, data: Dict[str, Any], state: Dict[str, Any]) -> AsyncIterator[str]:
+        """_stream_round, retried like generate() as long as no chunk has been yielded yet"""
+        if self.replay_mode == "replay":
+            async for text in self._stream_round(data, state):
+                yield text
+            return
+        if not self.retry.breaker.allow():
+            raise LLMStreamError(f"Circuit open: LLM API failing, retry in {self.retry.breaker.retry_in():.0f}s")
+        started = time.monotonic()
+        try:
+            for attempt in range(self.retry.max_attempts):
+                streamed = False
+                try:
+                    async for text in self._stream_round(data, state):
+                        streamed = True
+                        yield text
+                except LLMStreamError as e:
+                    delay = self.retry.next_delay(attempt, started) if e.retryable and not streamed else None
+                    if delay is None:
+                        self.retry.observe(e.retryable, e.status, failed=True)
+                        raise # Fatal, out of retries, or already partly shown to the caller
+                    self.retry.stats["retries"] += 1
+                    self.logger.warning(f"Retryable streaming error ({e}); retry {attempt + 1} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self.retry.observe(False, None, failed=False)
+                return
+        except BaseException:
+            self.retry.breaker.release_trial() # Cancelled or the caller stopped reading (no-op after an outcome)
+            raise
+
+    async def _stream_round(self, data: Dict[str, Any], state: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream one streamGenerateContent request, recording its finishReason in state"""
+        if self.replay_mode == "replay":
+            note_source("replay")
+            async for text in self._replay_stream(data, state):
+                yield text
+            return
+
+        recorded: List[str] = [] # Stitched stream text, saved as one response in record mode
+        async with self.key_pool.request() as ticket:
+            note_attempt(ticket.queue_wait)
+            headers = self.provider.request_headers(ticket.api_key)
+            params = self.provider.request_params(ticket.api_key, stream=True)
+            self.logger.debug(f"Streaming request to {self.provider.name} API: {self.stream_api_url}")
+            session = self._get_session()
+            try:
+                async with session.post(
+                    self.stream_api_url,
+                    headers=headers,
+                    params=params,
+                    json=self.provider.request_body(data, stream=True),
+                    # Long generations may exceed the total timeout; bound the gap between chunks instead
+                    # (the whole stream is bounded only by the caller's deadline, if any)
+                    timeout=aiohttp.ClientTimeout(total=time_remaining(), sock_read=self.timeout)
+                ) as response:
+                    ticket.responded()
+                    note_response(ticket.latency)
+
+                    if response.status != 200:
+                        error_msg = await response.text()
+                        if response.status == 429:
+                            ticket.throttled(parse_retry_after(response.headers, error_msg))
+                        self.logger.error(f"Streaming request failed with status {response.status}: {error_msg}")
+                        raise LLMStreamError(f"API request failed: {error_msg}", response.status,
+                                             is_retryable_status(response.status))
+
+                    usage = None # Last usage seen: counts arrive with (or as) the final chunk
+                    async for raw_line in response.content:
+                        line = raw_line.decode("utf-8", errors="replace").strip()
+                        if not line.startswith("data:"):
+                            continue # Skip blank separator lines between events
+                        try:
+                            chunk = self.provider.parse_stream_event(line[len("data:"):].strip())
+                        except json.JSONDecodeError as e:
+                            raise LLMStreamError(f"Malformed stream chunk: {line[:200]}") from e
+                        if chunk is None:
+                            break # End-of-stream marker
+                        state["finish_reason"] = self._extract_finish_reason(chunk) or state["finish_reason"]
+                        usage = self.provider.extract_usage(chunk) or usage
+                        text = self._extract_candidate_text(chunk)
+                        if text:
+                            if self.replay_mode == "record":
+                                recorded.append(text)
+                            yield text
+                    note_usage(usage)
+
+            except aiohttp.ClientError as e:
+                self.logger.error(f"HTTP streaming request failed: {str(e)}")
+                raise LLMStreamError(f"HTTP request failed: {str(e)}", retryable=is_retryable_exception(e)) from e
+            except asyncio.TimeoutError as e:
+                self.logger.error(f"Stream stalled for more than {self.timeout} seconds")
+                raise LLMStreamError(f"Stream stalled for more than {self.timeout} seconds", retryable=True) from e
+
+        if recorded:
+            await self.replay_store.record(
+                ReplayStore.make_key(self.model, data),
+                self.provider.make_result("".join(recorded), state["finish_reason"])
+            )
+
+    async def generate_streaming(self, prompt: str, formated_output: Optional[str] = None,
+                                 on_chunk: Optional[Callable[[str], None]] = None, use_cache: bool = True,
+                                 max_output_tokens: Optional[int] = None, call_type: Optional[str] = None,
+                                 validate: Optional[Callable[[Any], Optional[str]]] = None,
+                                 priority: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+        """
+        Generate via the streaming endpoint, invoking on_chunk for every text chunk.
+        Returns the same shape as generate() so callers can switch between the two freely.
+        """
+        with llm_priority(priority):
+            return await self.ledger.observe(
+                self._generate_streaming(prompt, formated_output, on_chunk, use_cache, max_output_tokens, call_type, validate),
+                self.model, call_type, stream=True)
+
+    async def _generate_streaming(self, prompt: str, formated_output: Optional[str], on_chunk: Optional[Callable[[str], None]],
+                                  use_cache: bool, max_output_tokens: Optional[int], call_type: Optional[str],
+                                  validate: Optional[Callable[[Any], Optional[str]]]) -> Union[str, Dict[str, Any]]:
+        """generate_streaming() inside its priority class and ledger record"""
+        cache_key, cached_text = await self._cache_lookup(
+            self._build_payload(prompt, formated_output, max_output_tokens=max_output_tokens), use_cache)
+        if cached_text is not None:
+            note_source("cache")
+            if on_chunk:
+                on_chunk(cached_text) # Replay the cached response as a single chunk
+            return self._log_validation(self._process_output(cached_text, formated_output), call_type, validate)
+
+        chunks: List[str] = []
+        scanner = JSONScanner() if formated_output == "json" else None
+        unfinished = self.truncation_stats["unfinished"]
+        try:
+            async for chunk in self.generate_stream(prompt, formated_output, max_output_tokens):
+                chunks.append(chunk)
+                if scanner:
+                    scanner.feed(chunk) # Finds the JSON as it arrives instead of rescanning the whole text
+                if on_chunk:
+                    on_chunk(chunk)
+        except LLMStreamError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Unexpected error: {str(e)}"}
+
+        if not chunks:
+            self.logger.warning("Streaming response contained no text")
+            return {"error": "No response from the model"}
+        generated_text = "".join(chunks)
+        processed = self._process_output(generated_text, formated_output, json_match=scanner.match if scanner else None)
+        if cache_key and not self._is_error(processed) and self.truncation_stats["unfinished"] == unfinished:
+            await self.response_cache.set(cache_key, generated_text, formated_output)
+        return self._log_validation(processed, call_type, validate)
 
     def _format_prompt(self, prompt: str, output_format: Optional[str]) -> tuple[str, str]:
         """Format prompt and system message based on desired output format"""
@@ -297,44 +747,49 @@ class LLMAdapter:
 
         return formatted_prompt, system_message
 
-    def _parse_json_response(self, text: str) -> Dict[str, Any]:
-        """More robust JSON parsing with multiple strategies"""
-        # Strategy 1: Direct parse
+    def _parse_structured_response(self, text: str, response_schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse and validate a schema-constrained response in a single pass (no guessing)"""
         try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # Strategy 2: Extract from markdown
-        json_str = self._extract_from_markdown(text, "json")
-        if json_str:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.json_stats["structured_invalid"] += 1
+            self.logger.error(f"Structured response is not valid JSON: {e}")
+            return {"error": f"Invalid structured JSON response: {e}", "raw_response": text[:500] + "..."}
+        value = self.provider.normalize_structured(value, response_schema)
+        errors = validate_schema(value, response_schema)
+        if errors:
+            self.json_stats["structured_invalid"] += 1
+            self.logger.error(f"Structured response violates schema: {errors[:5]}")
+            return {"error": f"Structured response violates schema: {'; '.join(errors[:5])}", "raw_response": text[:500] + "..."}
+        self.json_stats["structured"] += 1
+        return value
+
+    def _parse_json_response(self, text: str, first: Optional[JSONMatch] = None) -> Dict[str, Any]:
+        """Parse the first JSON value in the response (bare, in a markdown fence or embedded in prose) in one scan"""
+        first = first or find_json(text)
+        if first is None:
             try:
-                return json.loads(json_str)
+                parsed = json.loads(text) # A bare scalar: the only JSON the scanner does not look for
+                self.json_stats["direct"] += 1
+                return parsed
             except json.JSONDecodeError:
-                pass
-
-        # Strategy 3: Find JSON object in text
-        try:
-            # Find the first { and last }
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end != -1:
-                return json.loads(text[start:end])
-        except Exception:
-            pass
-
-        # Strategy 4: Try parsing as JSON lines
-        try:
-            lines = [line for line in text.split('\n') if line.strip()]
-            if len(lines) == 1:
-                return json.loads(lines[0])
-            return [json.loads(line) for line in lines if line.strip()]
-        except Exception:
-            pass
-
-        # Final fallback
-        self.logger.error("All JSON parsing strategies failed")
-        return {"error": "Invalid JSON response", "raw_response": text[:500] + "..."}
+                self.json_stats["failed"] += 1
+                self.logger.error("No JSON value found in response")
+                return {"error": "Invalid JSON response", "raw_response": text[:500] + "..."}
+
+        kind = first.kind(text)
+        if kind == "braces" and not text[:first.start].strip():
+            # JSON lines: several values separated only by whitespace
+            values = [first]
+            for match in iter_json(text, first.end):
+                if text[values[-1].end:match.start].strip():
+                    break
+                values.append(match)
+            if len(values) > 1 and not text[values[-1].end:].strip():
+                self.json_stats["lines"] += 1
+                return [match.value for match in values]
+        self.json_stats[kind] += 1
+        return first.value
 
     def _extract_code(self, text: str) -> str:
         """Extract clean code from response"""
@@ -358,18 +813,3 @@ class LLMAdapter:
                 self.logger.error(f"Failed to extract code from markdown: {str(e)}")
 
         return text.strip()
-
-    def _extract_from_markdown(self, text: str, lang: Optional[str] = None) -> Optional[str]:
-        """Extract content from markdown code blocks"""
-        try:
-            if lang and f"```{lang}" in text:
-                parts = text.split(f"```{lang}")
-                if len(parts) > 1:
-                    return parts[1].split("```")[0].strip()
-            elif "```" in text:
-                parts = text.split("```")
-                if len(parts) > 1:
-                    return parts[1].split("```")[0].strip()
-        except Exception as e:
-            self.logger.error(f"Error extracting from markdown: {str(e)}")
-        return None
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Content-addressed response cache for the LLM adapter.
+Tiers: bounded in-process LRU -> optional on-disk JSON store -> optional Redis (via RedisAdapter).
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import aiofiles
+
+from utils.logger import get_logger
+
+# Default TTLs (seconds) per requested output format; None means "plain text"
+DEFAULT_FORMAT_TTLS = {
+    "json": 3600,
+    "code": 1800,
+    "text": 600,
+}
+
+class LLMResponseCache:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, redis_adapter=None):
+        config = config or {}
+        self.logger = get_logger(__name__)
+        self.enabled = config.get("enabled", True)
+        self.max_entries = config.get("max_entries", 256) # In-process LRU bound
+        self.format_ttls = {**DEFAULT_FORMAT_TTLS, **config.get("ttl", {})}
+        # Sampling with temperature > 0 is non-deterministic; callers may opt out of caching it
+        self.bypass_nondeterministic = config.get("bypass_nondeterministic", False)
+        self.disk_dir = config.get("disk_dir") # Disk tier is off unless a directory is configured
+        self.disk_max_entries = config.get("disk_max_entries", 2000) # Least recently written files are pruned beyond this
+        self._disk_entries: Optional[int] = None # Files in disk_dir, counted on the first write
+        self.use_redis = config.get("use_redis", True)
+        self.redis = redis_adapter
+
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict() # key -> (expires_at, text)
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_expired": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def attach_redis(self, redis_adapter):
+        """Enable the Redis tier once a RedisAdapter is available"""
+        self.redis = redis_adapter
+
+    @staticmethod
+    def make_key(model: str, payload: Dict[str, Any]) -> str:
+        """Hash of model and the full request body (generation config and prompt contents/messages)"""
+        material = json.dumps({"model": model, **payload}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def should_use(self, temperature: float) -> bool:
+        """Whether a call with this temperature may read from or write to the cache"""
+        if not self.enabled:
+            return False
+        if self.bypass_nondeterministic and temperature > 0:
+            self.stats["bypassed"] += 1
+            return False
+        return True
+
+    def _ttl_for(self, formated_output: Optional[str]) -> int:
+        return self.format_ttls.get(formated_output or "text", self.format_ttls["text"])
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look the key up tier by tier, promoting hits into the faster tiers"""
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry:
+            expires_at, text = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return text
+            del self._memory[key]
+
+        if self.disk_dir:
+            disk_entry = await self._read_disk(key)
+            if disk_entry and disk_entry.get("expires_at", 0) > now:
+                self.stats["disk_hits"] += 1
+                self._remember(key, disk_entry["text"], disk_entry["expires_at"])
+                return disk_entry["text"]
+            if disk_entry:
+                self.stats["disk_expired"] += 1
+                self._delete_disk(self._disk_path(key))
+
+        if self.redis and self.use_redis:
+            try:
+                redis_entry = await self.redis.get_context(f"llm_cache:{key}")
+                if redis_entry and "text" in redis_entry:
+                    self.stats["redis_hits"] += 1
+                    expires_at = redis_entry.get("expires_at", now + self.format_ttls["text"])
+                    self._remember(key, redis_entry["text"], expires_at)
+                    return redis_entry["text"]
+            except Exception as e:
+                self.logger.warning(f"Redis tier lookup failed for LLM cache key {key[:12]}: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, text: str, formated_output: Optional[str] = None):
+        """Store a raw model response in every enabled tier"""
+        ttl = self._ttl_for(formated_output)
+        expires_at = time.time() + ttl
+        self._remember(key, text, expires_at)
+        self.stats["stores"] += 1
+
+        entry = {"text": text, "expires_at": expires_at, "format": formated_output or "text"}
+        if self.disk_dir:
+            await self._write_disk(key, entry)
+        if self.redis and self.use_redis:
+            try:
+                await self.redis.store_context(f"llm_cache:{key}", entry, ttl=ttl)
+            except Exception as e:
+                self.logger.warning(f"Redis tier store failed for LLM cache key {key[:12]}: {e}")
+
+    def _remember(self, key: str, text: str, expires_at: float):
+        self._memory[key] = (expires_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    async def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                return json.loads(await f.read())
+        except Exception as e:
+            self.logger.warning(f"Deleting unreadable LLM cache file {path}: {e}")
+            self._delete_disk(path)
+            return None
+
+    async def _write_disk(self, key: str, entry: Dict[str, Any]):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+                await f.write(json.dumps(entry))
+            replaced = os.path.exists(path)
+            os.replace(tmp_path, path) # Atomic so concurrent readers never see partial files
+        except Exception as e:
+            self.logger.warning(f"Failed to write LLM cache file {path}: {e}")
+            return
+        if self._disk_entries is None:
+            self._disk_entries = len(self._disk_files())
+        elif not replaced:
+            self._disk_entries += 1
+        if self._disk_entries > self.disk_max_entries:
+            self._prune_disk()
+
+    def _disk_files(self) -> list:
+        return glob.glob(os.path.join(self.disk_dir, "??", "*.json"))
+
+    def _delete_disk(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False # Already gone (another process pruned it)
+        except OSError as e:
+            self.logger.warning(f"Failed to delete LLM cache file {path}: {e}")
+            return False
+
+    def _prune_disk(self):
+        """Delete the least recently written files down to 90% of disk_max_entries, so pruning is not run on every write"""
+        def written_at(path: str) -> float:
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0.0
+        files = sorted(self._disk_files(), key=written_at)
+        excess = len(files) - int(self.disk_max_entries * 0.9)
+        deleted = sum(self._delete_disk(path) for path in files[:max(excess, 0)])
+        self._disk_entries = len(files) - deleted
+        self.stats["disk_evictions"] += deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus derived hit rate"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["redis_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
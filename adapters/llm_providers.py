@@ -0,0 +1,267 @@
+"""
+LLM provider wire formats.
+LLMAdapter handles caching, rate limiting, retries, hedging and truncation; a provider only knows how to
+build a request body for one API and read text and finish reasons back out of its responses.
+Finish reasons are normalized to Gemini's names ("STOP", "MAX_TOKENS") so the adapter can stay generic.
+"""
+import json
+from typing import Dict, List, Any, Optional, Tuple
+
+class LLMProvider:
+    name = "base"
+    requires_api_key = True
+
+    def __init__(self, config: Dict[str, Any], model: str):
+        self.model = model
+        self.api_url = config.get("api_url") or self.default_api_url()
+        self.stream_api_url = config.get("stream_api_url") or self.default_stream_api_url()
+
+    def default_api_url(self) -> str:
+        raise NotImplementedError
+
+    def default_stream_api_url(self) -> str:
+        return self.api_url
+
+    def build_payload(self, system_message: str, prompt: str, max_output_tokens: int, temperature: float,
+                      response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def continuation_payload(self, data: Dict[str, Any], partial_text: str, follow_up: str) -> Dict[str, Any]:
+        """Same conversation with partial_text as the model's turn and follow_up as the next user turn"""
+        raise NotImplementedError
+
+    def max_output_tokens(self, data: Dict[str, Any]) -> int:
+        raise NotImplementedError
+
+    def with_max_output_tokens(self, data: Dict[str, Any], max_output_tokens: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def request_body(self, data: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        return data
+
+    def request_headers(self, api_key: Optional[str]) -> Dict[str, str]:
+        return {"Content-Type": "application/json"}
+
+    def request_params(self, api_key: Optional[str], stream: bool) -> Dict[str, str]:
+        return {}
+
+    def extract_text(self, result: Dict[str, Any]) -> Optional[str]:
+        """Text of the first candidate/choice in a response body or stream chunk"""
+        raise NotImplementedError
+
+    def extract_finish_reason(self, result: Dict[str, Any]) -> Optional[str]:
+        raise NotImplementedError
+
+    def extract_usage(self, result: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """(prompt_tokens, response_tokens) reported in a response body or stream chunk, if any"""
+        return None
+
+    def parse_stream_event(self, data: str) -> Optional[Dict[str, Any]]:
+        """Decode the payload of one SSE 'data:' line; None for end-of-stream markers"""
+        return json.loads(data)
+
+    def make_result(self, text: str, finish_reason: Optional[str]) -> Dict[str, Any]:
+        """A response body in this provider's shape (used for stitched continuations and recordings)"""
+        raise NotImplementedError
+
+    def normalize_structured(self, value: Any, schema: Dict[str, Any]) -> Any:
+        """A schema-constrained response as the response schema describes it (before validation)"""
+        return value
+
+class GeminiProvider(LLMProvider):
+    """generateContent / streamGenerateContent?alt=sse"""
+    name = "gemini"
+
+    def default_api_url(self) -> str:
+        return f"https://generativelanguage.googleapis.com/v1/models/{self.model}:generateContent"
+
+    def default_stream_api_url(self) -> str:
+        return self.api_url.replace(":generateContent", ":streamGenerateContent")
+
+    def build_payload(self, system_message, prompt, max_output_tokens, temperature, response_schema=None):
+        payload = {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [{"text": system_message}]
+                },
+                {
+                    "role": "model",
+                    "parts": [{"text": "Okay, I understand."}] # Initial response from the model
+                },
+                {
+                    "role": "user",
+                    "parts": [{"text": prompt}]
+                }
+            ],
+            "generationConfig": {
+                "maxOutputTokens": max_output_tokens,
+                "temperature": temperature
+            }
+        }
+        if response_schema:
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+            payload["generationConfig"]["responseSchema"] = response_schema
+        return payload
+
+    def continuation_payload(self, data, partial_text, follow_up):
+        return {
+            **data,
+            "contents": data["contents"] + [
+                {"role": "model", "parts": [{"text": partial_text}]},
+                {"role": "user", "parts": [{"text": follow_up}]}
+            ]
+        }
+
+    def max_output_tokens(self, data):
+        return data["generationConfig"]["maxOutputTokens"]
+
+    def with_max_output_tokens(self, data, max_output_tokens):
+        return {**data, "generationConfig": {**data["generationConfig"], "maxOutputTokens": max_output_tokens}}
+
+    def request_params(self, api_key, stream):
+        params = {"key": api_key}
+        if stream:
+            params["alt"] = "sse" # Server-sent events, one JSON chunk per 'data:' line
+        return params
+
+    def extract_text(self, result):
+        candidates = result.get("candidates") or []
+        if not candidates:
+            return None
+        parts = candidates[0].get("content", {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    def extract_finish_reason(self, result):
+        candidates = result.get("candidates") or []
+        return candidates[0].get("finishReason") if candidates else None
+
+    def extract_usage(self, result):
+        usage = result.get("usageMetadata")
+        return (usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0)) if usage else None
+
+    def make_result(self, text, finish_reason):
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": finish_reason}]}
+
+def to_json_schema(schema: Dict[str, Any], nullable: bool = False) -> Dict[str, Any]:
+    """
+    Gemini's OpenAPI-style schema (upper-case types, nullable) as standard JSON Schema for strict structured outputs,
+    which require every property of an object: optional properties are listed too and made nullable instead.
+    """
+    converted: Dict[str, Any] = {}
+    nullable = nullable or bool(schema.get("nullable"))
+    kind = schema.get("type", "").lower() or None
+    if kind:
+        converted["type"] = [kind, "null"] if nullable else kind
+    if "properties" in schema:
+        required = set(schema.get("required", []))
+        converted["properties"] = {name: to_json_schema(sub, nullable=name not in required)
+                                   for name, sub in schema["properties"].items()}
+        converted["required"] = list(schema["properties"])
+        converted["additionalProperties"] = False
+    if "items" in schema:
+        converted["items"] = to_json_schema(schema["items"])
+    if "enum" in schema:
+        converted["enum"] = schema["enum"] + [None] if nullable else schema["enum"]
+    if "description" in schema:
+        converted["description"] = schema["description"]
+    return converted
+
+def drop_strict_nulls(value: Any, schema: Dict[str, Any]) -> Any:
+    """Remove the nulls strict mode sent for optional properties (see to_json_schema), so their defaults apply"""
+    if isinstance(value, dict) and "properties" in schema:
+        required, properties = set(schema.get("required", [])), schema["properties"]
+        return {name: drop_strict_nulls(item, properties.get(name, {})) for name, item in value.items()
+                if not (item is None and name not in required and not properties.get(name, {}).get("nullable"))}
+    if isinstance(value, list) and "items" in schema:
+        return [drop_strict_nulls(item, schema["items"]) for item in value]
+    return value
+
+class OpenAICompatibleProvider(LLMProvider):
+    """/v1/chat/completions as served by OpenAI, vLLM, llama.cpp server, Ollama and similar"""
+    name = "openai"
+    requires_api_key = False # Local servers usually run without auth
+
+    FINISH_REASONS = {"stop": "STOP", "length": "MAX_TOKENS", "content_filter": "SAFETY", "tool_calls": "STOP"}
+
+    def default_api_url(self) -> str:
+        return "http://127.0.0.1:8000/v1/chat/completions"
+
+    def build_payload(self, system_message, prompt, max_output_tokens, temperature, response_schema=None):
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_output_tokens,
+            "temperature": temperature
+        }
+        if response_schema:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "response", "schema": to_json_schema(response_schema), "strict": True}
+            }
+        return payload
+
+    def normalize_structured(self, value, schema):
+        return drop_strict_nulls(value, schema)
+
+    def continuation_payload(self, data, partial_text, follow_up):
+        messages: List[Dict[str, Any]] = data["messages"] + [
+            {"role": "assistant", "content": partial_text},
+            {"role": "user", "content": follow_up}
+        ]
+        return {**data, "messages": messages}
+
+    def max_output_tokens(self, data):
+        return data["max_tokens"]
+
+    def with_max_output_tokens(self, data, max_output_tokens):
+        return {**data, "max_tokens": max_output_tokens}
+
+    def request_body(self, data, stream):
+        # include_usage: token counts arrive in a final chunk without choices
+        return {**data, "stream": True, "stream_options": {"include_usage": True}} if stream else data
+
+    def request_headers(self, api_key):
+        headers = super().request_headers(api_key)
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+    def extract_text(self, result):
+        choices = result.get("choices") or []
+        if not choices:
+            return None
+        message = choices[0].get("message") or choices[0].get("delta") or {}
+        return message.get("content") or ""
+
+    def extract_finish_reason(self, result):
+        choices = result.get("choices") or []
+        reason = choices[0].get("finish_reason") if choices else None
+        return self.FINISH_REASONS.get(reason, reason.upper()) if reason else None
+
+    def extract_usage(self, result):
+        usage = result.get("usage")
+        return (usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)) if usage else None
+
+    def parse_stream_event(self, data):
+        return None if data == "[DONE]" else json.loads(data)
+
+    def make_result(self, text, finish_reason):
+        reverse = {"STOP": "stop", "MAX_TOKENS": "length"}
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": reverse.get(finish_reason, finish_reason)}]}
+
+PROVIDERS = {
+    GeminiProvider.name: GeminiProvider,
+    OpenAICompatibleProvider.name: OpenAICompatibleProvider,
+}
+
+def make_provider(config: Dict[str, Any], model: str) -> LLMProvider:
+    """Provider named by llm.provider (default "gemini")"""
+    name = config.get("provider", "gemini")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}', expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name](config, model)
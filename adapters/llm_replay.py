@@ -0,0 +1,100 @@
+"""
+Record/replay store for raw generateContent responses.
+In "record" mode live responses are appended to a gzip'd JSONL file keyed by request;
+in "replay" mode they are served back from it with synthetic latency, without touching the network.
+"""
+import asyncio
+import gzip
+import json
+import os
+import random
+import threading
+import zlib
+from typing import Dict, Any, Optional
+
+from adapters.llm_cache import LLMResponseCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+REPLAY_MODES = ("off", "record", "replay")
+
+class ReplayStore:
+    def __init__(self, path: str, latency: float = 0.0, latency_jitter: float = 0.0):
+        self.path = path
+        self.latency = float(latency) # Seconds added before every replayed response
+        self.latency_jitter = float(latency_jitter) # Uniform +/- spread around latency
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._write_lock = threading.Lock() # Appends run in worker threads; keep gzip members whole
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._load()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ReplayStore":
+        return cls(
+            config.get("path", ".cache/llm_replay.jsonl.gz"),
+            latency=config.get("latency", 0.0),
+            latency_jitter=config.get("latency_jitter", 0.0)
+        )
+
+    @staticmethod
+    def make_key(model: str, payload: Dict[str, Any]) -> str:
+        """Same request identity as the response cache: model + request body"""
+        return LLMResponseCache.make_key(model, payload)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    self._entries[record["k"]] = record["r"]
+        except (OSError, EOFError, zlib.error, json.JSONDecodeError, KeyError) as e:
+            # A crash mid-append leaves a truncated last member; keep everything read so far
+            logger.warning(f"Replay store {self.path} is partially unreadable, loaded {len(self._entries)} entries: {e}")
+        logger.info(f"Loaded {len(self._entries)} recorded LLM responses from {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self._entries.get(key)
+        self.stats["hits" if response is not None else "misses"] += 1
+        return response
+
+    async def replay(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the recorded response for key after the configured synthetic latency"""
+        await self.synthetic_delay()
+        return self.lookup(key)
+
+    async def synthetic_delay(self):
+        delay = self.latency + random.uniform(-self.latency_jitter, self.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def record(self, key: str, response: Dict[str, Any]):
+        """Remember a live response and append it to the store file"""
+        if self._entries.get(key) == response:
+            return # Identical re-recording; keep the file compact
+        self._entries[key] = response
+        line = json.dumps({"k": key, "r": response}, separators=(",", ":"))
+        try:
+            await asyncio.to_thread(self._append, line)
+            self.stats["recorded"] += 1
+        except OSError as e:
+            logger.warning(f"Failed to record LLM response to {self.path}: {e}")
+
+    def _append(self, line: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._write_lock:
+            # Each append is its own gzip member; gzip readers concatenate them transparently
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries)}
@@ -0,0 +1,244 @@
+"""
+Local stub server speaking the Gemini generateContent / streamGenerateContent wire format.
+Serves responses from a ReplayStore when one was recorded for the request, otherwise a
+deterministic synthetic answer, so the agent can run end to end without network access.
+
+Run from the project root, then point llm.api_url at it (see config/offline.json):
+    python -m adapters.llm_stub_server --port 8765 --store .cache/llm_replay.jsonl.gz
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+from typing import Awaitable, Callable, Dict, List, Any, Optional
+
+from aiohttp import web
+
+from adapters.llm_replay import ReplayStore
+from utils.schema import validate_schema
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STUB_PLAN = {
+    "understanding": "Offline stub plan: create a small Python module.",
+    "files": ["stub_output.py"],
+    "steps": [
+        {
+            "type": "code_generation",
+            "description": "Create stub_output.py",
+            "requirements": "Create a greet(name) function returning a greeting string.",
+            "file_path": "stub_output.py",
+            "params": {}
+        }
+    ]
+}
+
+STUB_CODE = '''def greet(name: str) -> str:
+    """Return a greeting for name."""
+    return f"Hello, {name}!"
+
+
+if __name__ == "__main__":
+    print(greet("world"))
+'''
+
+STUB_ANALYSIS = {
+    "language": "python",
+    "imports": [],
+    "functions": [{"name": "greet", "signature": "greet(name: str) -> str", "purpose": "Build a greeting"}],
+    "classes": [],
+    "main_flow": "Prints a greeting when run as a script.",
+    "issues": [],
+    "uses_async": False
+}
+
+def synthesize_text(payload: Dict[str, Any]) -> str:
+    """Pick a canned answer from the shape of the prompt LLMAdapter built"""
+    contents = payload.get("contents") or [{}]
+    system_text = "".join(part.get("text", "") for part in contents[0].get("parts", []))
+    prompt_text = "".join(part.get("text", "") for part in contents[-1].get("parts", []))
+
+    if "clean, correct code" in system_text:
+        return STUB_CODE
+    if '"understanding"' in prompt_text and '"steps"' in prompt_text:
+        return json.dumps(STUB_PLAN, indent=2) # create_plan / refine_plan
+    if "valid, properly formatted JSON" in system_text:
+        batch_paths = re.findall(r"^\s*### File: (.+?) \(", prompt_text, re.MULTILINE)
+        if batch_paths: # analyze_many: one keyed entry per file
+            return json.dumps({"analyses": [{"file_path": path, **STUB_ANALYSIS} for path in batch_paths]})
+        return json.dumps(STUB_ANALYSIS)
+    return "This is an offline stub response."
+
+def example_from_schema(schema: Dict[str, Any]) -> Any:
+    """Smallest value that satisfies a response schema"""
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        properties = schema.get("properties", {})
+        return {name: example_from_schema(properties[name]) for name in schema.get("required", [])}
+    if kind == "ARRAY":
+        return []
+    if kind == "STRING":
+        return schema.get("enum", ["stub"])[0]
+    if kind == "BOOLEAN":
+        return False
+    return 0
+
+def schema_problems(schema: Dict[str, Any], path: str = "responseSchema") -> List[str]:
+    """Mirror the API's rejection of schemas it cannot serve (unknown types, property-less objects)"""
+    kind = schema.get("type")
+    if kind not in ("OBJECT", "ARRAY", "STRING", "INTEGER", "NUMBER", "BOOLEAN"):
+        return [f"{path}: unsupported type {kind!r}"]
+    problems = []
+    if kind == "OBJECT":
+        properties = schema.get("properties") or {}
+        if not properties:
+            problems.append(f"{path}: OBJECT type should have non-empty properties")
+        problems.extend(f"{path}.required: unknown property '{name}'" for name in schema.get("required", []) if name not in properties)
+        for name, sub_schema in properties.items():
+            problems.extend(schema_problems(sub_schema, f"{path}.properties.{name}"))
+    elif kind == "ARRAY":
+        problems.extend(schema_problems(schema.get("items") or {}, f"{path}.items"))
+    return problems
+
+def synthesize_structured(payload: Dict[str, Any], schema: Dict[str, Any]) -> str:
+    """Synthetic answer that is guaranteed to satisfy the request's responseSchema"""
+    try:
+        value = json.loads(synthesize_text(payload))
+        if not validate_schema(value, schema):
+            return json.dumps(value)
+    except json.JSONDecodeError:
+        pass
+    return json.dumps(example_from_schema(schema))
+
+def make_response(text: str) -> Dict[str, Any]:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "modelVersion": "stub"
+    }
+
+def usage_metadata(payload: Dict[str, Any], text: str) -> Dict[str, int]:
+    """Rough token counts (4 characters per token) in the API's usageMetadata shape"""
+    prompt_chars = sum(len(part.get("text", "")) for content in payload.get("contents", []) for part in content.get("parts", []))
+    prompt_tokens, response_tokens = prompt_chars // 4 + 1, len(text) // 4 + 1
+    return {"promptTokenCount": prompt_tokens, "candidatesTokenCount": response_tokens, "totalTokenCount": prompt_tokens + response_tokens}
+
+GEMINI_ROUTE = "/{version}/models/{model_action}"
+
+class StubLLMServer:
+    def __init__(self, store: Optional[ReplayStore] = None, latency: float = 0.0, latency_jitter: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0,
+                 handler: Optional[Callable[[web.Request], Awaitable[web.StreamResponse]]] = None, route: str = GEMINI_ROUTE):
+        self.store = store
+        self.handler = handler # Scripted responses (tests) instead of replayed / synthesized ones
+        self.route = route # e.g. "/v1/chat/completions" for an OpenAI-compatible handler
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self.peers: set = set() # Distinct client connections seen
+        self.stats = {"requests": 0, "replayed": 0, "synthesized": 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def api_url(self, model: str = "stub") -> str:
+        return f"{self.base_url}/v1/models/{model}:generateContent"
+
+    async def start(self) -> "StubLLMServer":
+        app = web.Application()
+        app.router.add_post(self.route, self._dispatch)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1] # Resolve port 0 to the bound port
+        logger.info(f"Stub LLM server listening on {self.base_url}")
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "StubLLMServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def _respond_to(self, model: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.store is not None:
+            recorded = self.store.lookup(ReplayStore.make_key(model, payload))
+            if recorded is not None:
+                self.stats["replayed"] += 1
+                return recorded
+        self.stats["synthesized"] += 1
+        schema = payload.get("generationConfig", {}).get("responseSchema")
+        text = synthesize_structured(payload, schema) if schema else synthesize_text(payload)
+        return {**make_response(text), "usageMetadata": usage_metadata(payload, text)}
+
+    async def _dispatch(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        return await (self.handler or self._handle)(request)
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        model, _, action = request.match_info["model_action"].partition(":")
+        if action not in ("generateContent", "streamGenerateContent"):
+            return web.json_response({"error": {"code": 404, "message": f"Unknown method '{action}'"}}, status=404)
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"error": {"code": 400, "message": "Invalid JSON payload"}}, status=400)
+
+        schema = payload.get("generationConfig", {}).get("responseSchema")
+        problems = schema_problems(schema) if schema else []
+        if problems:
+            return web.json_response({"error": {"code": 400, "message": "; ".join(problems), "status": "INVALID_ARGUMENT"}}, status=400)
+
+        delay = self.latency + random.uniform(-self.latency_jitter, self.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        result = self._respond_to(model, payload)
+
+        if action == "generateContent":
+            return web.json_response(result)
+
+        # streamGenerateContent?alt=sse: one event per line of the answer
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        candidate = (result.get("candidates") or [{}])[0]
+        text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+        lines = text.splitlines(keepends=True) or [""]
+        for index, line in enumerate(lines):
+            event = make_response(line)
+            if index == len(lines) - 1 and "usageMetadata" in result:
+                event["usageMetadata"] = result["usageMetadata"] # Final counts ride on the last chunk
+            await response.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+        await response.write_eof()
+        return response
+
+async def serve(args: argparse.Namespace):
+    store = ReplayStore(args.store) if args.store else None
+    server = StubLLMServer(store, latency=args.latency, latency_jitter=args.jitter, host=args.host, port=args.port)
+    await server.start()
+    print(f"Stub LLM server on {server.api_url('gemini-2.0-flash')} (Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local generateContent stub for offline runs")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--store", type=str, help="Replay store recorded with llm.replay.mode = record")
+    parser.add_argument("--latency", type=float, default=0.0, help="Synthetic latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- latency jitter in seconds")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,163 @@
+"""
+Per-call LLM telemetry.
+Every generate()/generate_streaming() call produces one LLMCallRecord: where its time went (waiting for the rate
+limiter and a pooled connection, connection setup, time to first byte, total), prompt and response tokens from the
+provider's usage metadata, estimated cost, and which component made it for which task. Records are kept in an
+LLMLedger that can be queried per task and is dumped to JSON with the task's execution results.
+"""
+import asyncio
+import contextvars
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from adapters.rate_limiter import request_priority
+
+_current_call: contextvars.ContextVar[Optional["LLMCallRecord"]] = contextvars.ContextVar("llm_call", default=None)
+
+@dataclass
+class LLMCallRecord:
+    task_id: Optional[str]
+    component: str # call_type of the caller: "plan", "analysis", "generate", ...
+    model: str
+    stream: bool
+    priority: str = "normal"
+    started_at: float = field(default_factory=time.time)
+    source: str = "api" # "api", "cache", "replay" or "coalesced" (shared a concurrent identical request)
+    attempts: int = 0 # HTTP requests made, retries, hedges and continuations included
+    queue_wait: float = 0.0 # Seconds queued for the rate limiter and for a pooled connection
+    connect: float = 0.0 # Seconds opening connections (0 when a pooled one was reused)
+    ttfb: Optional[float] = None # Seconds from sending the first request to its response headers
+    total: float = 0.0
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    cost: float = 0.0 # USD, from telemetry.prices
+    status: str = "ok" # "ok", "error" or "cancelled"
+    error: Optional[str] = None
+
+def current_call() -> Optional[LLMCallRecord]:
+    return _current_call.get()
+
+def note_source(source: str):
+    """Where the current call's answer came from, when not from the API"""
+    record = _current_call.get()
+    if record is not None:
+        record.source = source
+
+def note_attempt(queue_wait: float):
+    """An HTTP request is about to be sent, after queue_wait seconds in the rate limiter"""
+    record = _current_call.get()
+    if record is not None:
+        record.attempts += 1
+        record.queue_wait += queue_wait
+
+def note_response(ttfb: float):
+    record = _current_call.get()
+    if record is not None and record.ttfb is None:
+        record.ttfb = ttfb
+
+def note_usage(usage: Optional[Tuple[int, int]]):
+    """Add (prompt_tokens, response_tokens) from one response (continuations add up)"""
+    record = _current_call.get()
+    if record is not None and usage:
+        record.prompt_tokens += usage[0]
+        record.response_tokens += usage[1]
+
+def _add_time(attribute: str, started: float):
+    record = _current_call.get()
+    if record is not None:
+        setattr(record, attribute, getattr(record, attribute) + time.monotonic() - started)
+
+async def _on_queued_start(session, ctx, params):
+    ctx.queued = time.monotonic()
+
+async def _on_queued_end(session, ctx, params):
+    _add_time("queue_wait", ctx.queued)
+
+async def _on_connect_start(session, ctx, params):
+    ctx.connecting = time.monotonic()
+
+async def _on_connect_end(session, ctx, params):
+    _add_time("connect", ctx.connecting)
+
+def trace_config() -> aiohttp.TraceConfig:
+    """aiohttp hooks that add connection-pool queueing and connection setup to the current call"""
+    config = aiohttp.TraceConfig()
+    config.on_connection_queued_start.append(_on_queued_start)
+    config.on_connection_queued_end.append(_on_queued_end)
+    config.on_connection_create_start.append(_on_connect_start)
+    config.on_connection_create_end.append(_on_connect_end)
+    return config
+
+class LLMLedger:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.prices: Dict[str, Dict[str, float]] = config.get("prices", {}) # model -> USD per 1M "prompt"/"response" tokens
+        self.results_dir: Optional[str] = config.get("results_dir") # Where the agent dumps each task's results
+        self.task_id: Optional[str] = None # Set by the agent for the task being run
+        self._records: Deque[LLMCallRecord] = deque(maxlen=config.get("max_records", 10000))
+
+    async def observe(self, call: Awaitable[Any], model: str, component: Optional[str], stream: bool) -> Any:
+        """Await one LLM call, recording it in the ledger"""
+        if not self.enabled:
+            return await call
+        record = LLMCallRecord(self.task_id, component or "other", model, stream, request_priority.get())
+        token = _current_call.set(record)
+        start = time.monotonic()
+        try:
+            result = await call
+            if isinstance(result, dict) and "error" in result:
+                record.status, record.error = "error", str(result["error"])[:200]
+            return result
+        except asyncio.CancelledError:
+            record.status = "cancelled"
+            raise
+        except Exception as e:
+            record.status, record.error = "error", str(e)[:200]
+            raise
+        finally:
+            _current_call.reset(token)
+            record.total = time.monotonic() - start
+            if record.source == "api" and record.attempts == 0 and record.status != "cancelled":
+                record.source = "coalesced" # Another caller's identical request answered this one
+            record.cost = self._cost(record)
+            self._records.append(record)
+
+    def _cost(self, record: LLMCallRecord) -> float:
+        price = self.prices.get(record.model)
+        if not price:
+            return 0.0
+        return (record.prompt_tokens * price.get("prompt", 0.0) + record.response_tokens * price.get("response", 0.0)) / 1e6
+
+    def records(self, task_id: Optional[str] = None) -> List[LLMCallRecord]:
+        """Calls made for task_id (all calls when None)"""
+        return [record for record in self._records if task_id is None or record.task_id == task_id]
+
+    def tasks(self) -> List[Optional[str]]:
+        return list(dict.fromkeys(record.task_id for record in self._records))
+
+    def summary(self, task_id: Optional[str] = None) -> Dict[str, Any]:
+        """Totals for task_id, overall and per component"""
+        def totals(records: List[LLMCallRecord]) -> Dict[str, Any]:
+            return {
+                "calls": len(records),
+                "errors": sum(record.status != "ok" for record in records),
+                "cached": sum(record.source in ("cache", "coalesced") for record in records),
+                "seconds": round(sum(record.total for record in records), 3),
+                "queue_wait": round(sum(record.queue_wait for record in records), 3),
+                "prompt_tokens": sum(record.prompt_tokens for record in records),
+                "response_tokens": sum(record.response_tokens for record in records),
+                "cost": round(sum(record.cost for record in records), 6),
+            }
+        records = self.records(task_id)
+        components = dict.fromkeys(record.component for record in records)
+        return {**totals(records),
+                "by_component": {name: totals([r for r in records if r.component == name]) for name in components}}
+
+    def report(self, task_id: Optional[str] = None) -> Dict[str, Any]:
+        """JSON-ready summary plus every call, for task_id (all calls when None)"""
+        return {"task_id": task_id, "summary": self.summary(task_id), "calls": [asdict(record) for record in self.records(task_id)]}
@@ -0,0 +1,180 @@
+"""
+Model cascade router.
+Sends each call type to a configured model tier (cheap first) and escalates up the tier order
+when the answer fails validation: unparseable or schema-violating JSON, a plan without steps,
+or code that does not parse. Exposes the LLMAdapter interface, so components take either.
+"""
+import re
+import time
+from typing import Dict, List, Optional, Any, Union, Callable
+
+from adapters.llm_adapter import LLMAdapter
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ESCALATION_NOTICE = "\n\n# --- {reason}; escalating to {model} ---\n\n" # Streamed between tier attempts
+
+def _tier_config(base: Dict[str, Any], tier: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """The base llm config with a tier's model (and optional overrides) swapped in"""
+    overrides = {"model": tier} if isinstance(tier, str) else dict(tier)
+    config = {key: value for key, value in base.items() if key != "routing"}
+    config.update(overrides)
+    model = config.get("model", base.get("model", "gemini-2.0-flash"))
+    same_provider = config.get("provider", "gemini") == base.get("provider", "gemini")
+    for url_key in ("api_url", "stream_api_url"):
+        if url_key in base and url_key not in overrides:
+            if same_provider:
+                config[url_key] = re.sub(r"/models/[^/:]+:", f"/models/{model}:", base[url_key])
+            else:
+                del config[url_key] # e.g. a local chat-completions tier: use its own URL or the provider default
+    if not same_provider:
+        for key_field in ("api_key", "api_keys"):
+            if key_field not in overrides:
+                config.pop(key_field, None) # Never send one provider's key to another
+    return config
+
+def check_result(result: Any, call_type: Optional[str], validate: Optional[Callable[[Any], Optional[str]]] = None) -> Optional[str]:
+    """Why a response should be escalated, or None if it is acceptable (transport errors are never escalated)"""
+    if isinstance(result, dict) and "error" in result:
+        return f"invalid response: {result['error']}" if "raw_response" in result else None
+    if call_type in ("plan", "refine") and isinstance(result, dict) and not result.get("steps") and not result.get("reply"):
+        return "plan has no steps"
+    if validate is not None:
+        return validate(result)
+    return None
+
+class ModelRouter:
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        routing = config.get("routing", {})
+        tiers = routing.get("tiers") or {"default": config.get("model", "gemini-2.0-flash")}
+        self.tiers: Dict[str, LLMAdapter] = {name: LLMAdapter(_tier_config(config, tier)) for name, tier in tiers.items()}
+        self.order: List[str] = [name for name in routing.get("order", list(tiers)) if name in self.tiers]
+        self.order += [name for name in self.tiers if name not in self.order]
+        self.routes: Dict[str, str] = routing.get("routes", {})
+
+        base_model = config.get("model", "gemini-2.0-flash")
+        matching = [name for name in self.order if self.tiers[name].model == base_model]
+        self.default_tier = routing.get("default_tier") or (matching[0] if matching else self.order[0])
+        if self.default_tier not in self.tiers:
+            raise ValueError(f"Unknown default tier '{self.default_tier}', expected one of {list(self.tiers)}")
+        unknown = {tier for tier in self.routes.values() if tier not in self.tiers}
+        if unknown:
+            raise ValueError(f"Routes reference unknown tiers {sorted(unknown)}, expected one of {list(self.tiers)}")
+
+        # Tiers share one response cache, replay store and call ledger (keys and records already include the model)
+        primary = self.tiers[self.default_tier]
+        for adapter in self.tiers.values():
+            adapter.response_cache = primary.response_cache
+            adapter.replay_store = primary.replay_store
+            adapter.ledger = primary.ledger
+
+        self.tier_stats = {name: {"calls": 0, "latency": 0.0, "validation_failures": 0, "escalations": 0} for name in self.tiers}
+        self.route_stats: Dict[str, Dict[str, int]] = {}
+        logger.info(f"Model routing: {[(name, self.tiers[name].model) for name in self.order]}, routes={self.routes}")
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything not routed (model, config, size_output_tokens, response_cache, ...) comes from the default tier
+        if name in ("tiers", "default_tier"):
+            raise AttributeError(name)
+        return getattr(self.tiers[self.default_tier], name)
+
+    @property
+    def json_stats(self) -> Dict[str, int]:
+        return self._sum_stats("json_stats")
+
+    @property
+    def truncation_stats(self) -> Dict[str, int]:
+        return self._sum_stats("truncation_stats")
+
+    def _sum_stats(self, attribute: str) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for adapter in self.tiers.values():
+            for key, value in getattr(adapter, attribute).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def adapter_for(self, call_type: Optional[str]) -> LLMAdapter:
+        """The first-choice adapter for a call type"""
+        return self.tiers[self._ladder(call_type)[0]]
+
+    def _ladder(self, call_type: Optional[str]) -> List[str]:
+        """Tiers to try for a call type: its routed tier, then every stronger tier in order"""
+        first = self.routes.get(call_type or "", self.default_tier)
+        return self.order[self.order.index(first):]
+
+    def _record(self, tier: str, call_type: Optional[str], elapsed: float, reason: Optional[str], escalated: bool):
+        stats = self.tier_stats[tier]
+        stats["calls"] += 1
+        stats["latency"] += elapsed
+        if reason:
+            stats["validation_failures"] += 1
+        if escalated:
+            stats["escalations"] += 1
+        route = self.route_stats.setdefault(call_type or "default", {"calls": 0, "escalations": 0})
+        route["calls"] += 1
+        route["escalations"] += int(escalated)
+
+    async def _cascade(self, call_type: Optional[str], validate: Optional[Callable[[Any], Optional[str]]],
+                       attempt: Callable[[LLMAdapter], Any], on_escalate: Optional[Callable[[str, str], None]] = None) -> Any:
+        ladder = self._ladder(call_type)
+        for position, tier in enumerate(ladder):
+            adapter = self.tiers[tier]
+            start = time.monotonic()
+            result = await attempt(adapter)
+            reason = check_result(result, call_type, validate)
+            escalate = reason is not None and position + 1 < len(ladder)
+            self._record(tier, call_type, time.monotonic() - start, reason, escalate)
+            if not escalate:
+                if reason:
+                    logger.warning(f"{call_type or 'call'} still failed validation on the strongest tier ({adapter.model}): {reason}")
+                return result
+            next_model = self.tiers[ladder[position + 1]].model
+            logger.info(f"Escalating {call_type or 'call'} from {adapter.model} to {next_model}: {reason}")
+            if on_escalate:
+                on_escalate(reason, next_model)
+
+    async def generate(self, prompt: str, formated_output: Optional[str] = None, use_cache: bool = True,
+                       response_schema: Optional[Dict[str, Any]] = None, max_output_tokens: Optional[int] = None,
+                       call_type: Optional[str] = None,
+                       validate: Optional[Callable[[Any], Optional[str]]] = None,
+                       priority: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+        """LLMAdapter.generate on the call type's tier, escalating while validation fails"""
+        return await self._cascade(call_type, validate, lambda adapter: adapter.generate(
+            prompt, formated_output, use_cache=use_cache, response_schema=response_schema,
+            max_output_tokens=max_output_tokens, call_type=call_type, priority=priority))
+
+    async def generate_streaming(self, prompt: str, formated_output: Optional[str] = None,
+                                 on_chunk: Optional[Callable[[str], None]] = None, use_cache: bool = True,
+                                 max_output_tokens: Optional[int] = None, call_type: Optional[str] = None,
+                                 validate: Optional[Callable[[Any], Optional[str]]] = None,
+                                 priority: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+        """LLMAdapter.generate_streaming with escalation; a notice chunk separates the attempts"""
+        def on_escalate(reason: str, model: str):
+            if on_chunk:
+                on_chunk(ESCALATION_NOTICE.format(reason=reason, model=model))
+        return await self._cascade(call_type, validate, lambda adapter: adapter.generate_streaming(
+            prompt, formated_output, on_chunk=on_chunk, use_cache=use_cache,
+            max_output_tokens=max_output_tokens, call_type=call_type, priority=priority), on_escalate)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-tier latency, escalation, hedging, retry and key pool stats, plus escalations per call type"""
+        tiers = {}
+        for name in self.order:
+            stats = self.tier_stats[name]
+            calls = stats["calls"]
+            tiers[name] = {
+                "model": self.tiers[name].model,
+                **stats,
+                "avg_latency": round(stats["latency"] / calls, 3) if calls else 0.0,
+                "escalation_rate": round(stats["escalations"] / calls, 3) if calls else 0.0,
+                "hedging": self.tiers[name].hedging.get_stats(),
+                "retry": self.tiers[name].retry.get_stats(),
+                "key_pool": self.tiers[name].key_pool.get_stats(),
+            }
+        return {"tiers": tiers, "routes": self.route_stats}
+
+    async def close(self):
+        for adapter in self.tiers.values():
+            await adapter.close()
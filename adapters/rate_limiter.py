@@ -0,0 +1,338 @@
+"""
+Adaptive, 429-aware rate limiting for LLM requests.
+One limiter per (model, api key): a token bucket for request rate plus an AIMD concurrency window.
+Waiting requests are served by priority class (interactive, normal, background) with aging, so
+background work is deferred behind calls a user is waiting on but never starves.
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITIES = {"interactive": 0, "normal": 1, "background": 2} # Lower rank is served first
+
+# Priority of LLM calls made from the current task (inherited by tasks it spawns)
+request_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_request_priority", default="normal")
+
+@contextlib.contextmanager
+def llm_priority(priority: Optional[str]) -> Iterator[None]:
+    """Run LLM calls made inside the block (and tasks created in it) at the given priority class; None keeps the current one"""
+    if priority is None:
+        yield
+        return
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', expected one of {list(PRIORITIES)}")
+    token = request_priority.set(priority)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+class _Waiter:
+    def __init__(self, priority: str, enqueued: float):
+        self.priority = priority
+        self.rank = PRIORITIES[priority]
+        self.enqueued = enqueued
+        self.loop = asyncio.get_running_loop()
+        self.wakeup: Optional[asyncio.Future] = None
+
+    def effective_rank(self, now: float, aging: float) -> int:
+        """Rank after aging: every `aging` seconds in the queue moves a waiter up one class"""
+        if aging <= 0:
+            return self.rank
+        return max(0, self.rank - int((now - self.enqueued) // aging))
+
+    def seconds_to_promotion(self, now: float, aging: float) -> Optional[float]:
+        """Seconds until aging next moves this waiter up a class (None once it ranks first)"""
+        if aging <= 0 or self.effective_rank(now, aging) == 0:
+            return None
+        return aging - (now - self.enqueued) % aging
+
+class AdaptiveRateLimiter:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, name: str = "llm"):
+        config = config or {}
+        self.name = name
+        self.requests_per_minute = float(config.get("requests_per_minute", 10))
+        self.burst = float(config.get("burst", max(1.0, self.requests_per_minute)))
+        self.min_concurrency = float(config.get("min_concurrency", 1))
+        self.max_concurrency = float(config.get("max_concurrency", 8))
+        self.concurrency_limit = float(config.get("initial_concurrency", 5))
+        self.latency_target = float(config.get("latency_target", 15.0)) # Seconds; slower responses shrink the window
+        self.increase_step = float(config.get("increase_step", 1.0)) # Additive increase per window of successes
+        self.decrease_factor = float(config.get("decrease_factor", 0.5)) # Multiplicative decrease on 429
+        self.latency_decrease_factor = float(config.get("latency_decrease_factor", 0.9))
+        self.default_retry_after = float(config.get("default_retry_after", 10.0))
+        self.priority_aging = float(config.get("priority_aging", 15.0)) # Seconds queued per class promotion
+        self.background_share = float(config.get("background_share", 0.5)) # Max fraction of the window for background
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0 # Set from Retry-After; no request starts before this
+        self._in_flight = 0
+        self._in_flight_by_class = {priority: 0 for priority in PRIORITIES}
+        self._queue: List[_Waiter] = [] # Requests waiting for a slot and a token, in arrival order
+
+        self.stats = {"requests": 0, "throttled": 0, "slow": 0, "wait_seconds": 0.0}
+        self.class_stats = {priority: {"requests": 0, "wait_seconds": 0.0, "max_wait": 0.0, "promoted": 0} for priority in PRIORITIES}
+
+    # --- Token bucket ---
+    def _refill(self, now: float):
+        rate_per_second = self.requests_per_minute / 60.0
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * rate_per_second)
+        self._last_refill = now
+
+    def _seconds_until_token(self, now: float) -> float:
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / (self.requests_per_minute / 60.0)
+
+    # --- Slots ---
+    async def acquire(self, priority: Optional[str] = None) -> str:
+        """
+        Wait for both a concurrency slot and a rate token, served in priority order.
+        priority defaults to the caller's llm_priority() class; returns the class used.
+        """
+        priority = priority or request_priority.get()
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {list(PRIORITIES)}")
+        start = time.monotonic()
+        waiter = _Waiter(priority, start)
+        self._queue.append(waiter)
+        try:
+            while not self._try_grant(waiter):
+                waiter.wakeup = waiter.loop.create_future()
+                # Only the request next in line with a free slot waits on the token bucket; the rest wait to be
+                # woken, or until aging promotes them
+                now = time.monotonic()
+                next_in_line = self._next_in_line()
+                if next_in_line is waiter:
+                    delay = self._seconds_until_token(now) if self._in_flight < int(self.concurrency_limit) else None
+                else:
+                    self._wake(next_in_line) # Aging may have handed it the turn while it waits untimed
+                    delay = waiter.seconds_to_promotion(now, self.priority_aging)
+                try:
+                    await asyncio.wait_for(waiter.wakeup, timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+            self._notify()
+            raise
+
+        waited = time.monotonic() - start
+        self.stats["requests"] += 1
+        self.stats["wait_seconds"] += waited
+        class_stats = self.class_stats[priority]
+        class_stats["requests"] += 1
+        class_stats["wait_seconds"] += waited
+        class_stats["max_wait"] = max(class_stats["max_wait"], waited)
+        return priority
+
+    def _class_allowed(self, priority: str) -> bool:
+        """Background work may hold only part of the window, keeping slots free for interactive calls"""
+        if priority != "background":
+            return True
+        return self._in_flight_by_class["background"] < max(1, int(self.concurrency_limit * self.background_share))
+
+    def _next_in_line(self) -> Optional[_Waiter]:
+        """Best waiter whose class may start: lowest aged rank, then arrival order"""
+        now = time.monotonic()
+        best = None
+        for waiter in list(self._queue):
+            if waiter.loop.is_closed():
+                self._queue.remove(waiter) # Left behind by a loop that has since shut down
+                continue
+            if not self._class_allowed(waiter.priority):
+                continue
+            if best is None or waiter.effective_rank(now, self.priority_aging) < best.effective_rank(now, self.priority_aging):
+                best = waiter
+        return best
+
+    def _try_grant(self, waiter: _Waiter) -> bool:
+        now = time.monotonic()
+        if self._in_flight >= int(self.concurrency_limit) or self._next_in_line() is not waiter:
+            return False
+        if self._seconds_until_token(now) > 0:
+            return False
+        self._tokens -= 1
+        self._queue.remove(waiter)
+        self._in_flight += 1
+        self._in_flight_by_class[waiter.priority] += 1
+        if waiter.effective_rank(now, self.priority_aging) < waiter.rank:
+            self.class_stats[waiter.priority]["promoted"] += 1
+        self._notify() # The next waiter may be able to start too
+        return True
+
+    def _release_slot(self, priority: str = "normal"):
+        self._in_flight = max(0, self._in_flight - 1)
+        self._in_flight_by_class[priority] = max(0, self._in_flight_by_class[priority] - 1)
+        self._notify()
+
+    def _notify(self):
+        """Wake queued requests so they re-check whether it is their turn"""
+        for waiter in self._queue:
+            self._wake(waiter)
+
+    @staticmethod
+    def _wake(waiter: Optional[_Waiter]):
+        if waiter is not None and waiter.wakeup is not None and not waiter.wakeup.done() and not waiter.loop.is_closed():
+            waiter.wakeup.set_result(None)
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False, retry_after: Optional[float] = None,
+                priority: str = "normal"):
+        """Free the slot and feed the observed outcome into the AIMD window"""
+        if throttled:
+            self.on_throttle(retry_after)
+        elif latency is not None:
+            self.on_latency(latency)
+        self._release_slot(priority)
+
+    # --- AIMD feedback ---
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """429: halve the window and pause new requests until Retry-After has elapsed"""
+        self.stats["throttled"] += 1
+        pause = retry_after if retry_after is not None else self.default_retry_after
+        self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+        self._tokens = 0 # Do not burst straight back into the quota wall
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * self.decrease_factor)
+        logger.warning(f"[{self.name}] Throttled by API; pausing {pause:.1f}s, concurrency -> {self.concurrency_limit:.2f}")
+
+    def on_latency(self, latency: float):
+        """Grow the window additively while fast, shrink it gently when responses slow down"""
+        if latency > self.latency_target:
+            self.stats["slow"] += 1
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * self.latency_decrease_factor)
+        else:
+            # Classic AIMD: +increase_step per full window of successful requests
+            self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + self.increase_step / max(self.concurrency_limit, 1.0))
+            self._notify()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def available_tokens(self) -> float:
+        """Rate tokens in the bucket right now (0 while paused by Retry-After)"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return 0.0
+        self._refill(now)
+        return self._tokens
+
+    def has_capacity(self) -> bool:
+        """True if a request could start right now without queueing (used to skip optional hedges)"""
+        return (not self._queue and self._in_flight < int(self.concurrency_limit)
+                and self._seconds_until_token(time.monotonic()) <= 0)
+
+    def request(self, priority: Optional[str] = None) -> "RateLimitedRequest":
+        """Async context manager wrapping acquire/release with latency measurement"""
+        return RateLimitedRequest(self, priority)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "in_flight": self._in_flight,
+            "tokens": round(self._tokens, 2),
+            "blocked_for": max(0.0, self._blocked_until - time.monotonic()),
+            "priorities": {
+                priority: {
+                    **stats,
+                    "in_flight": self._in_flight_by_class[priority],
+                    "queued": sum(waiter.priority == priority for waiter in self._queue),
+                    "avg_wait": round(stats["wait_seconds"] / stats["requests"], 3) if stats["requests"] else 0.0,
+                }
+                for priority, stats in self.class_stats.items()
+            },
+        }
+
+class RateLimitedRequest:
+    """Holds a limiter slot for one API call; call throttled() when the API answers 429"""
+
+    def __init__(self, limiter: AdaptiveRateLimiter, priority: Optional[str] = None):
+        self.limiter = limiter
+        self.priority = priority # None: the llm_priority() class active when the request starts
+        self._start = 0.0
+        self.queue_wait = 0.0 # Seconds spent in acquire()
+        self._latency: Optional[float] = None
+        self._throttled = False
+        self._retry_after: Optional[float] = None
+
+    def responded(self):
+        """Freeze the latency sample at response headers (streams would otherwise count generation time)"""
+        if self._latency is None:
+            self._latency = time.monotonic() - self._start
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Seconds from the slot being granted to the response headers (None until responded)"""
+        return self._latency
+
+    def throttled(self, retry_after: Optional[float] = None):
+        self._throttled = True
+        self._retry_after = retry_after
+
+    async def __aenter__(self) -> "RateLimitedRequest":
+        queued = time.monotonic()
+        self.priority = await self.limiter.acquire(self.priority)
+        self._start = time.monotonic()
+        self.queue_wait = self._start - queued
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.responded()
+        self.limiter.release(
+            latency=self._latency,
+            throttled=self._throttled,
+            retry_after=self._retry_after,
+            priority=self.priority
+        )
+        return False
+
+# --- Registry: one limiter per (model, api key) ---
+_limiters: Dict[Tuple[str, str], AdaptiveRateLimiter] = {}
+_limiter_configs: Dict[Tuple[str, str], Dict[str, Any]] = {} # Settings each shared limiter was created with
+
+def get_rate_limiter(model: str, api_key: Optional[str], config: Optional[Dict[str, Any]] = None) -> AdaptiveRateLimiter:
+    """
+    Return the shared limiter for this model/key pair, creating it on first use. The first config wins: a later,
+    different one (a router tier or adapter on the same model and key) is logged and ignored.
+    """
+    key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:12] # Never keep raw keys around as dict keys
+    registry_key = (model, key_id)
+    if registry_key not in _limiters:
+        _limiters[registry_key] = AdaptiveRateLimiter(config, name=f"{model}/{key_id}")
+        _limiter_configs[registry_key] = dict(config or {})
+    elif config is not None and dict(config) != _limiter_configs[registry_key]:
+        logger.warning(f"Rate limiter {model}/{key_id} already exists with settings {_limiter_configs[registry_key]}; "
+                       f"ignoring {dict(config)} (the quota is shared per model and API key)")
+    return _limiters[registry_key]
+
+def parse_retry_after(headers: Any, body: Optional[str] = None) -> Optional[float]:
+    """Read a retry delay from the Retry-After header or Gemini's RetryInfo ("retryDelay": "37s")"""
+    value = headers.get("Retry-After") if headers else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if body:
+        match = re.search(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"', body)
+        if match:
+            return float(match.group(1))
+    return None
@@ -1,24 +1,217 @@
 """
-Redis adapter for context and memory management
+Redis adapter for context and memory management.
+Storage is a Redis server or, with backend "sqlite", an embedded SQLite database (adapters/sqlite_store.py) that
+serves the same commands; backend "auto" uses Redis and falls back to SQLite when the server cannot be reached,
+either when the adapter is created or at connect().
 """
+import asyncio
+import contextlib
+import contextvars
+import socket
 import redis.asyncio as redis
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any, Tuple
 import json
 from utils.logger import get_logger
+from utils.cancellation import time_remaining
 import hashlib
 import time
 from utils.schema import Step  # Import Step class
+from adapters.redis_codec import ValueCodec
+from adapters.redis_l1 import MISSING, L1Cache
+from adapters.sqlite_store import SQLiteStore
+
+# Pipeline of the open RedisAdapter.batch() block, with the adapter that opened it
+_batch: contextvars.ContextVar[Optional[Tuple["RedisAdapter", Any]]] = contextvars.ContextVar("redis_batch", default=None)
 
 class RedisAdapter:
     def __init__(self, config: Dict[str, Any]):
-        self.client = redis.Redis(
-            host=config.get("host", "localhost"),
-            port=config.get("port", 6379),
+        self.backend = config.get("backend", "redis") # "redis", "sqlite" or "auto"
+        self.sqlite_path = config.get("sqlite_path", ".cache/storage.db")
+        self.logger = get_logger(__name__)
+        host, port = config.get("host", "localhost"), config.get("port", 6379)
+        # "auto" probes the server here so every entry point gets the fallback, not only callers of connect()
+        use_sqlite = self.backend == "sqlite" or (
+            self.backend == "auto" and not self._reachable(host, port, config.get("probe_timeout", 0.5)))
+        self.client = SQLiteStore(self.sqlite_path) if use_sqlite else redis.Redis(
+            host=host,
+            port=port,
             db=config.get("db", 0),
             decode_responses=True
         )
-        self.logger = get_logger(__name__)
+        self.db = config.get("db", 0)
         self.namespace = config.get("namespace", "ai_agent")
+        self.timeout = config.get("timeout", 5.0) # Seconds per command; the caller's deadline can shorten it
+        self.stats = {"round_trips": 0, "commands": 0} # A pipeline or MGET is one round trip for many commands
+        self._reindexed = False # Whether context keys written before the indexes existed have been indexed
+        self.index_max_entries = config.get("index_max_entries", 10000) # Per index; the oldest entries are trimmed
+        self.codec = ValueCodec(config.get("compression")) # Large values are stored compressed
+        self.l1 = L1Cache(config.get("l1"), self.namespace) # Contexts and file metadata read recently
+        self._listener: Optional[asyncio.Task] = None # Follows invalidations for the L1 cache
+        self._connected = use_sqlite
+        if use_sqlite:
+            self.l1.enabled = False # Local reads are cheap, and there is no pub/sub to keep processes coherent
+
+    @property
+    def storage(self) -> str:
+        """Where data is kept: "redis" or "sqlite" (after an "auto" fallback too)"""
+        return "sqlite" if isinstance(self.client, SQLiteStore) else "redis"
+
+    def _reachable(self, host: str, port: int, timeout: float) -> bool:
+        """Whether the Redis server accepts TCP connections (a quick probe for backend "auto")"""
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError as e:
+            self.logger.warning(f"Cannot reach Redis at {host}:{port} ({str(e)}); using the SQLite store at {self.sqlite_path}")
+            return False
+
+    async def connect(self) -> bool:
+        """
+        Check that storage is reachable (once). With backend "auto", a Redis server that accepted the probe when the
+        adapter was created but does not answer now is replaced by the SQLite store so caching and resumable state
+        keep working.
+        """
+        if self._connected:
+            return True
+        try:
+            await self._bounded(self.client.ping())
+            self._connected = True
+        except Exception as e:
+            if self.backend != "auto":
+                self.logger.error(f"Cannot reach Redis: {str(e)}")
+                return False
+            self.logger.warning(f"Cannot reach Redis ({str(e)}); using the SQLite store at {self.sqlite_path}")
+            try:
+                await self.client.close()
+            except Exception:
+                pass
+            self.client = SQLiteStore(self.sqlite_path)
+            self.l1.enabled = False
+            self._connected = True
+        return True
+
+    async def _bounded(self, command: Awaitable[Any], commands: int = 1) -> Any:
+        """Await one round trip to Redis, giving up at the command timeout or the caller's cancel-scope deadline"""
+        self.stats["round_trips"] += 1
+        self.stats["commands"] += commands
+        return await asyncio.wait_for(command, timeout=time_remaining(self.timeout))
+
+    def _dumps(self, data: Any, **kwargs) -> str:
+        return self.codec.encode(json.dumps(data, **kwargs))
+
+    def _loads(self, value: str) -> Any:
+        return json.loads(self.codec.decode(value))
+
+    def _file_key(self, file_path: str) -> str:
+        return f"{self.namespace}:file:{hashlib.sha256(file_path.encode()).hexdigest()}"
+
+    async def _cached_values(self, keys: List[str], fetch: Callable[[List[str]], Awaitable[List[Optional[str]]]]) -> Dict[str, Optional[str]]:
+        """Stored values of Redis keys, from the L1 cache where possible; fetch() reads the rest in one round trip"""
+        self._ensure_listener()
+        values = {key: self.l1.get(key) for key in keys}
+        missing = [key for key, value in values.items() if value is MISSING]
+        if missing:
+            generation = self.l1.generation
+            for key, value in zip(missing, await fetch(missing)):
+                self.l1.put(key, value, generation)
+                values[key] = value
+        return values
+
+    async def _get_strings(self, keys: List[str]) -> List[Optional[str]]:
+        if len(keys) == 1:
+            return [await self._bounded(self.client.get(keys[0]))]
+        return await self._bounded(self.client.mget(keys), len(keys))
+
+    async def _get_metadata_fields(self, keys: List[str]) -> List[Optional[str]]:
+        if len(keys) == 1:
+            return [await self._bounded(self.client.hget(keys[0], "metadata"))]
+        return await self._pipelined(lambda pipeline: [pipeline.hget(key, "metadata") for key in keys])
+
+    def _invalidation(self, key: str) -> List[Callable[[Any], Any]]:
+        """Drop a key about to be written from the L1 cache; in channel mode, the publish telling other processes"""
+        self.l1.invalidate(key)
+        if self.l1.enabled and self.l1.invalidation == "channel":
+            return [lambda client: client.publish(self.l1.channel, key)]
+        return []
+
+    def _ensure_listener(self):
+        if self.l1.enabled and self.l1.invalidation != "none" and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        """Apply invalidations from other processes (and our own writes) to the L1 cache, resubscribing on errors"""
+        delay = 0.5
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub()
+                if self.l1.invalidation == "keyspace":
+                    await pubsub.psubscribe(f"__keyspace@{self.db}__:{self.namespace}:*")
+                else:
+                    await pubsub.subscribe(self.l1.channel)
+                self.l1.clear() # Anything cached before the subscription may have missed an invalidation
+                self.l1.live, delay = True, 0.5
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.l1.invalidate(message["data"])
+                    elif message["type"] == "pmessage":
+                        self.l1.invalidate(message["channel"].split(":", 1)[1])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Redis invalidation subscription lost, bypassing the L1 cache: {str(e)}")
+            finally:
+                self.l1.live = False
+                self.l1.clear()
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _pipelined(self, queue: Callable[[Any], None]) -> List[Any]:
+        """Queue reads on a pipeline and send them in one round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        queue(pipeline)
+        if not len(pipeline):
+            return []
+        return await self._bounded(pipeline.execute(), len(pipeline))
+
+    async def _write(self, *commands: Callable[[Any], Any]):
+        """Send writes now (several in one pipelined round trip), or queue them on the enclosing batch() pipeline"""
+        current = _batch.get()
+        if current is not None and current[0] is self:
+            for command in commands:
+                command(current[1])
+        elif len(commands) == 1:
+            await self._bounded(commands[0](self.client))
+        else:
+            await self._pipelined(lambda pipeline: [command(pipeline) for command in commands])
+
+    @contextlib.asynccontextmanager
+    async def batch(self) -> AsyncIterator[None]:
+        """
+        Group writes: store_context, store_execution_state, track_file and track_code_snippet calls inside the
+        block are queued on one pipeline and sent in a single round trip when it exits (dropped if it raises).
+        Reads inside the block go straight to Redis and do not see the queued writes.
+        """
+        current = _batch.get()
+        if current is not None and current[0] is self:
+            yield # Nested: the outermost block sends everything
+            return
+        pipeline = self.client.pipeline(transaction=False)
+        token = _batch.set((self, pipeline))
+        try:
+            yield
+        finally:
+            _batch.reset(token)
+        if len(pipeline):
+            try:
+                await self._bounded(pipeline.execute(), len(pipeline))
+            except Exception as e:
+                self.logger.error(f"Error flushing {len(pipeline)} batched Redis writes: {str(e)}")
         
     async def store_context(self, key: str, data: Any, ttl: Optional[int] = None) -> bool:
         """Store context data in Redis with namespace"""
@@ -31,34 +224,78 @@ class RedisAdapter:
                 raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
                 
             full_key = f"{self.namespace}:context:{key}"
-            serialized = json.dumps(data, default=default_serializer)
+            serialized = self._dumps(data, default=default_serializer)
             if ttl:
-                await self.client.setex(full_key, ttl, serialized)
+                # Expiring entries are caches read by exact key; they are not indexed
+                await self._write(lambda client: client.setex(full_key, ttl, serialized), *self._invalidation(full_key))
             else:
-                await self.client.set(full_key, serialized)
+                await self._write(lambda client: client.set(full_key, serialized),
+                                  *self._index_writes(key, data, time.time()), *self._invalidation(full_key))
             return True
         except Exception as e:
             self.logger.error(f"Error storing context: {str(e)}")
             return False
+
+    def _index_keys(self, key: str, data: Any) -> List[str]:
+        """Sorted sets listing a context key by write time: one per ':'-separated prefix, plus its file's"""
+        parts = key.split(":")
+        indexes = [self._prefix_index(":".join(parts[:i])) for i in range(1, len(parts))]
+        if isinstance(data, dict) and isinstance(data.get("file_path"), str):
+            indexes.append(f"{self._file_key(data['file_path'])}:contexts")
+        return indexes
+
+    def _index_writes(self, key: str, data: Any, score: float, nx: bool = False) -> List[Callable[[Any], Any]]:
+        """ZADD a context key to its indexes, trimming each to the newest index_max_entries"""
+        writes = []
+        for index in self._index_keys(key, data):
+            writes.append(lambda client, index=index: client.zadd(index, {key: score}, nx=nx))
+            writes.append(lambda client, index=index: client.zremrangebyrank(index, 0, -self.index_max_entries - 1))
+        return writes
+
+    def _prefix_index(self, prefix: str) -> str:
+        return f"{self.namespace}:index:{prefix}"
             
     async def get_context(self, key: str) -> Optional[Dict]:
         """Retrieve context data from Redis with namespace"""
         try:
             full_key = f"{self.namespace}:context:{key}"
-            data = await self.client.get(full_key)
-            if not data:
-                return None
+            data = (await self._cached_values([full_key], self._get_strings))[full_key]
+            return self._parse_context(data)
+        except Exception as e:
+            self.logger.error(f"Error retrieving context: {str(e)}")
+            return None
 
-            parsed = json.loads(data)
+    def _parse_context(self, data: Optional[str]) -> Optional[Any]:
+        if not data:
+            return None
+
+        parsed = self._loads(data)
 
-            # If 'steps' is present, rehydrate Step objects
-            if isinstance(parsed, dict) and 'steps' in parsed:
-                parsed['steps'] = [Step.from_dict(step) for step in parsed['steps']]
+        # If 'steps' is present, rehydrate Step objects
+        if isinstance(parsed, dict) and 'steps' in parsed:
+            parsed['steps'] = [Step.from_dict(step) for step in parsed['steps']]
 
-            return parsed
+        return parsed
+
+    async def get_contexts(self, keys: List[str]) -> Dict[str, Optional[Any]]:
+        """Retrieve several context entries in one MGET round trip (None for missing or unreadable entries)"""
+        if not keys:
+            return {}
+        try:
+            full_keys = [f"{self.namespace}:context:{key}" for key in keys]
+            cached = await self._cached_values(full_keys, self._get_strings)
+            values = [cached[full_key] for full_key in full_keys]
         except Exception as e:
-            self.logger.error(f"Error retrieving context: {str(e)}")
-            return None
+            self.logger.error(f"Error retrieving contexts: {str(e)}")
+            return {key: None for key in keys}
+        results: Dict[str, Optional[Any]] = {}
+        for key, data in zip(keys, values):
+            try:
+                results[key] = self._parse_context(data)
+            except Exception as e:
+                self.logger.error(f"Error parsing context {key}: {str(e)}")
+                results[key] = None
+        return results
             
     async def store_execution_state(self, task_id: str, state: Dict) -> bool:
         """Store execution state for a task with extended metadata"""
@@ -84,7 +321,8 @@ class RedisAdapter:
                 "timestamp": int(time.time()),
                 "task_id": task_id
             }
-            await self.client.set(state_key, json.dumps(full_state))
+            serialized = self._dumps(full_state)
+            await self._write(lambda client: client.set(state_key, serialized))
             return True
         except Exception as e:
             self.logger.error(f"Error storing execution state: {str(e)}")
@@ -94,9 +332,9 @@ class RedisAdapter:
         """Retrieve execution state for a task"""
         try:
             state_key = f"{self.namespace}:execution:{task_id}"
-            data = await self.client.get(state_key)
+            data = await self._bounded(self.client.get(state_key))
             if data:
-                full_state = json.loads(data)
+                full_state = self._loads(data)
                 return full_state.get("state")
             return None
         except Exception as e:
@@ -107,9 +345,9 @@ class RedisAdapter:
     async def track_file(self, file_path: str, metadata: Dict) -> bool:
         try:
             # Convert metadata to JSON string
-            metadata_str = json.dumps(metadata)
-            file_key = f"{self.namespace}:file:{hashlib.sha256(file_path.encode()).hexdigest()}"
-            await self.client.hset(file_key, "metadata", metadata_str)
+            metadata_str = self._dumps(metadata)
+            file_key = self._file_key(file_path)
+            await self._write(lambda client: client.hset(file_key, "metadata", metadata_str), *self._invalidation(file_key))
             return True
         except Exception as e:
             self.logger.error(f"Error tracking file: {str(e)}")
@@ -118,14 +356,24 @@ class RedisAdapter:
     async def get_file_metadata(self, file_path: str) -> Optional[Dict]:
         """Get metadata for a file with enhanced lookup"""
         try:
-            file_key = f"{self.namespace}:file:{hashlib.sha256(file_path.encode()).hexdigest()}"
-            data = await self.client.hgetall(file_key)
-            if data and data.get("metadata"):
-                return json.loads(data["metadata"])
+            file_key = self._file_key(file_path)
+            data = (await self._cached_values([file_key], self._get_metadata_fields))[file_key]
+            if data:
+                return self._loads(data)
             return None
         except Exception as e:
             self.logger.error(f"Error getting file metadata: {str(e)}")
             return None
+
+    async def get_files_metadata(self, file_paths: List[str]) -> Dict[str, Optional[Dict]]:
+        """Metadata for several files in one pipelined round trip"""
+        try:
+            file_keys = {path: self._file_key(path) for path in file_paths}
+            values = await self._cached_values(list(file_keys.values()), self._get_metadata_fields)
+            return {path: self._loads(values[key]) if values[key] else None for path, key in file_keys.items()}
+        except Exception as e:
+            self.logger.error(f"Error getting files metadata: {str(e)}")
+            return {path: None for path in file_paths}
             
     async def track_code_snippet(self, snippet_hash: str, metadata: Dict) -> bool:
         """Track a code snippet and its metadata with relationships"""
@@ -135,17 +383,18 @@ class RedisAdapter:
             # Store full metadata
             full_metadata = {
                 "hash": snippet_hash,
-                "metadata": metadata,
+                "metadata": self._dumps(metadata), # Hash fields hold strings
                 "timestamp": int(time.time())
             }
             
-            # Store in Redis
-            await self.client.hset(snippet_key, mapping=full_metadata)
-            
-            # If the snippet is associated with a file, create relationship
-            if "file_path" in metadata:
-                file_key = f"{self.namespace}:file:{hashlib.sha256(metadata['file_path'].encode()).hexdigest()}"
-                await self.client.sadd(f"{file_key}:snippets", snippet_key)
+            # Store in Redis, with the file relationship, in one round trip
+            async with self.batch():
+                await self._write(lambda client: client.hset(snippet_key, mapping=full_metadata))
+
+                # If the snippet is associated with a file, create relationship
+                if "file_path" in metadata:
+                    file_key = self._file_key(metadata['file_path'])
+                    await self._write(lambda client: client.sadd(f"{file_key}:snippets", snippet_key))
                 
             return True
         except Exception as e:
@@ -156,51 +405,152 @@ class RedisAdapter:
         """Get a code snippet by its hash with metadata"""
         try:
             snippet_key = f"{self.namespace}:snippet:{snippet_hash}"
-            data = await self.client.hgetall(snippet_key)
+            data = await self._bounded(self.client.hgetall(snippet_key))
             if data and data.get("metadata"):
-                return json.loads(data["metadata"])
+                return self._loads(data["metadata"])
             return None
         except Exception as e:
             self.logger.error(f"Error getting code snippet: {str(e)}")
             return None
             
     async def get_related_snippets(self, file_path: str) -> List[Dict]:
-        """Get all code snippets related to a file"""
+        """Get all code snippets related to a file (two round trips however many snippets there are)"""
         try:
-            file_key = f"{self.namespace}:file:{hashlib.sha256(file_path.encode()).hexdigest()}"
-            snippet_keys = await self.client.smembers(f"{file_key}:snippets")
-            
-            snippets = []
-            for key in snippet_keys:
-                data = await self.client.hgetall(key)
-                if data and data.get("metadata"):
-                    snippets.append(data["metadata"])
-                    
-            return snippets
+            snippet_keys = await self._bounded(self.client.smembers(f"{self._file_key(file_path)}:snippets"))
+            values = await self._pipelined(lambda pipeline: [pipeline.hget(key, "metadata") for key in snippet_keys])
+            return [self._loads(value) for value in values if value]
         except Exception as e:
             self.logger.error(f"Error getting related snippets: {str(e)}")
             return []
             
     async def search_context(self, query: str, limit: int = 10) -> List[Dict]:
-        """Search through stored context using pattern matching"""
+        """
+        Context entries matching a query. A query is either
+        - a key prefix of whole ':'-separated segments, e.g. "improvement:app/main.py" (a trailing ":*" is ignored):
+          the newest entries stored under it, from the prefix index. Entries written before the indexes existed are
+          found by a SCAN for keys containing the query until reindex_contexts() has run; after that a prefix query
+          only sees indexed entries, so substrings of keys ("main.py") no longer match.
+        - a Redis glob pattern with '*', '?' or '[' elsewhere, e.g. "*:app/main.py:*": always a SCAN of the context
+          keys, which costs a pass over the keyspace.
+        """
+        prefix = query.rstrip("*").strip(":")
+        if not prefix or any(char in prefix for char in "*?["):
+            return await self._scan_context(query, limit)
+        results, _ = await self.query_context(prefix=prefix, limit=limit)
+        if not results and not await self._is_reindexed():
+            results = await self._scan_context(f"*{prefix}*", limit)
+        return results
+
+    async def query_context(self, prefix: Optional[str] = None, file_path: Optional[str] = None, limit: int = 10,
+                            cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+        """
+        One page of context entries, newest first, from the index of a key prefix (whole ':'-separated segments)
+        or of the file named by the entries' "file_path". Returns (entries, cursor); pass the cursor back for
+        the next page, it is None after the last one.
+        """
+        index = f"{self._file_key(file_path)}:contexts" if file_path else self._prefix_index(prefix.strip(":"))
         try:
-            pattern = f"{self.namespace}:context:*{query}*"
-            keys = await self.client.keys(pattern)
-            
+            if cursor:
+                # The cursor is the (score, key) of the last entry returned: entries sharing its score follow it in
+                # descending key order, as ZREVRANGEBYSCORE sorts them, then come the older ones
+                score, _, last = cursor.partition(":")
+                ties, older = await self._pipelined(lambda pipeline: [
+                    pipeline.zrevrangebyscore(index, score, score, withscores=True),
+                    pipeline.zrevrangebyscore(index, f"({score}", "-inf", start=0, num=limit, withscores=True)])
+                members = ([member for member in ties if member[0] < last] + older)[:limit]
+            else:
+                members = await self._bounded(self.client.zrevrangebyscore(index, "+inf", "-inf", start=0, num=limit, withscores=True))
+            if not members:
+                return [], None
+            keys = [key for key, _ in members]
+            values = await self._bounded(self.client.mget([f"{self.namespace}:context:{key}" for key in keys]), len(keys))
+            results, stale = [], []
+            for key, data in zip(keys, values):
+                if data is None:
+                    stale.append(key) # Expired or overwritten with a TTL
+                    continue
+                try:
+                    results.append(self._loads(data))
+                except ValueError:
+                    continue
+            if stale:
+                await self._bounded(self.client.zrem(index, *stale))
+            return results, f"{members[-1][1]!r}:{members[-1][0]}" if len(members) == limit else None
+        except Exception as e:
+            self.logger.error(f"Error querying context index {index}: {str(e)}")
+            return [], None
+
+    async def _scan_context(self, pattern: str, limit: int) -> List[Dict]:
+        """Glob search of the context keys with SCAN, for queries the indexes do not cover"""
+        try:
+            keys: List[str] = []
+            cursor = 0
+            while len(keys) < limit:
+                cursor, found = await self._bounded(self.client.scan(cursor, match=f"{self.namespace}:context:{pattern}", count=1000))
+                keys.extend(found)
+                if not cursor:
+                    break
+            keys = keys[:limit]
+            if not keys:
+                return []
+
             results = []
-            for key in keys[:limit]:
-                data = await self.client.get(key)
+            for data in await self._bounded(self.client.mget(keys), len(keys)):
                 if data:
                     try:
-                        results.append(json.loads(data))
-                    except json.JSONDecodeError:
+                        results.append(self._loads(data))
+                    except ValueError:
                         continue
                         
             return results
         except Exception as e:
             self.logger.error(f"Error searching context: {str(e)}")
             return []
+
+    async def _is_reindexed(self) -> bool:
+        if not self._reindexed:
+            try:
+                self._reindexed = bool(await self._bounded(self.client.exists(f"{self.namespace}:meta:contexts_reindexed")))
+            except Exception as e:
+                self.logger.error(f"Error checking context index state: {str(e)}")
+        return self._reindexed
+
+    async def reindex_contexts(self) -> int:
+        """
+        Index the context entries written before the indexes existed and stop the SCAN fallback of search_context.
+        Entries are scored by their "timestamp" field where they have one; the others (whose write time is unknown)
+        get distinct scores just before the current time. Entries with a TTL stay unindexed.
+        Returns how many entries were indexed.
+        """
+        prefix = f"{self.namespace}:context:"
+        indexed, cursor, now = 0, 0, time.time()
+        while True:
+            cursor, keys = await self._bounded(self.client.scan(cursor, match=f"{prefix}*", count=1000))
+            values = await self._pipelined(lambda pipeline: [command for key in keys for command in (pipeline.get(key), pipeline.ttl(key))])
+            async with self.batch():
+                for full_key, data, ttl in zip(keys, values[::2], values[1::2]):
+                    if data is None or ttl != -1:
+                        continue
+                    try:
+                        parsed = self._loads(data)
+                    except ValueError:
+                        parsed = None
+                    key = full_key[len(prefix):]
+                    stamp = parsed.get("timestamp") if isinstance(parsed, dict) else None
+                    score = stamp if isinstance(stamp, (int, float)) and not isinstance(stamp, bool) else now - indexed * 0.001
+                    await self._write(*self._index_writes(key, parsed, score, nx=True))
+                    indexed += 1
+            if not cursor:
+                break
+        await self._bounded(self.client.set(f"{self.namespace}:meta:contexts_reindexed", int(now)))
+        self._reindexed = True
+        self.logger.info(f"Indexed {indexed} context entries")
+        return indexed
             
     async def close(self):
         """Close the Redis connection"""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
         await self.client.close()
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Compression of large values stored by RedisAdapter.
+Values at or above a size threshold are compressed and stored with a self-describing header naming the codec,
+so compressed and plain values (including everything written before compression existed) can be read side by side.
+The Redis client decodes responses to str, so compressed bytes are stored base64-encoded after the header.
+"""
+import base64
+import binascii
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+HEADER = "\x1f" # Cannot start a JSON document, so plain values are never mistaken for compressed ones
+
+class Codec:
+    """A compression algorithm: register_codec() an instance to make it available by name"""
+    name = ""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+class ZlibCodec(Codec):
+    name = "zlib"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+_codecs: Dict[str, Codec] = {"zlib": ZlibCodec()}
+
+def register_codec(codec: Codec):
+    _codecs[codec.name] = codec
+
+def get_codec(name: str) -> Codec:
+    if name not in _codecs:
+        raise ValueError(f"Unknown compression codec: {name}")
+    return _codecs[name]
+
+class ValueCodec:
+    """Encodes values for storage (compressing the large ones) and decodes whatever is read back"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.threshold = config.get("threshold", 1024) # Bytes; smaller values are stored as they are
+        self.codec = get_codec(config.get("codec", "zlib"))
+        if "level" in config and isinstance(self.codec, ZlibCodec):
+            self.codec = ZlibCodec(config["level"])
+        self.stats = {"compressed": 0, "skipped": 0, "decompressed": 0,
+                      "raw_bytes": 0, "stored_bytes": 0, "compress_seconds": 0.0, "decompress_seconds": 0.0}
+
+    def encode(self, value: str) -> str:
+        raw = value.encode()
+        if not self.enabled or len(raw) < self.threshold:
+            return value
+        start = time.perf_counter()
+        packed = base64.b64encode(self.codec.compress(raw)).decode("ascii")
+        self.stats["compress_seconds"] += time.perf_counter() - start
+        stored = f"{HEADER}{self.codec.name}:{packed}"
+        if len(stored) >= len(raw):
+            self.stats["skipped"] += 1 # Incompressible: not worth the decode cost
+            return value
+        self.stats["compressed"] += 1
+        self.stats["raw_bytes"] += len(raw)
+        self.stats["stored_bytes"] += len(stored)
+        return stored
+
+    def decode(self, value: Optional[str]) -> Optional[str]:
+        if not value or not value.startswith(HEADER):
+            return value # Plain value
+        name, _, packed = value[1:].partition(":")
+        start = time.perf_counter()
+        try:
+            raw = get_codec(name).decompress(base64.b64decode(packed))
+        except (binascii.Error, zlib.error) as e:
+            raise ValueError(f"Corrupt {name} value: {e}") from e
+        self.stats["decompress_seconds"] += time.perf_counter() - start
+        self.stats["decompressed"] += 1
+        return raw.decode()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Stats plus the compression ratio (raw / stored bytes) of the values compressed so far"""
+        stored = self.stats["stored_bytes"]
+        return {**self.stats, "ratio": round(self.stats["raw_bytes"] / stored, 2) if stored else None}
@@ -0,0 +1,72 @@
+"""
+In-process read-through cache in front of Redis.
+Keeps recently read values (file metadata, quality_config, code_patterns, ...) for a short TTL so repeated lookups
+skip the round trip. Processes sharing a Redis stay coherent through invalidation messages: in "channel" mode every
+write made through a RedisAdapter publishes the key it changed; in "keyspace" mode the server's keyspace
+notifications are followed instead (the server needs notify-keyspace-events set to at least "K$gh"), which also
+covers writes made by other clients and expirations. Entries are only served while the subscription is live;
+whenever it drops the cache is cleared and bypassed until it is back.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+MISSING = object() # Lookup result when the key is not cached (None is a cacheable "no such key")
+
+class L1Cache:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, namespace: str = "ai_agent"):
+        config = config or {}
+        self.enabled = config.get("enabled", True)
+        self.max_entries = config.get("max_entries", 1024)
+        self.ttl = config.get("ttl", 30) # Seconds; bounds staleness if an invalidation is ever lost
+        self.invalidation = config.get("invalidation", "channel") # "channel", "keyspace" or "none" (single process)
+        self.channel = config.get("channel", f"{namespace}:invalidate")
+        self.live = self.invalidation == "none" # Set while the invalidation subscription is up
+        self.generation = 0 # Bumped by every invalidation, so a read that raced one does not cache its result
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict() # Redis key -> (expires_at, value)
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0, "evictions": 0, "resets": 0}
+
+    def get(self, key: str) -> Any:
+        """The cached value of a Redis key, or MISSING"""
+        if not self.enabled:
+            return MISSING
+        if not self.live:
+            self.stats["bypassed"] += 1
+            return MISSING
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+            del self._entries[key]
+        self.stats["misses"] += 1
+        return MISSING
+
+    def put(self, key: str, value: Any, generation: int):
+        """Cache a value read when the cache was at generation (dropped if an invalidation came in since)"""
+        if not self.enabled or not self.live or generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key: str):
+        self.generation += 1
+        if self._entries.pop(key, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        self.generation += 1
+        if self._entries:
+            self.stats["resets"] += 1
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus derived hit rate"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries), "live": self.live}
@@ -0,0 +1,163 @@
+"""
+Retries for LLM requests.
+Errors are classified as retryable (429, 5xx, timeouts, dropped connections) or fatal (other 4xx such as
+auth or schema errors); retryable ones are retried with full-jitter exponential backoff within a deadline.
+A circuit breaker fails fast while the API keeps failing, then lets a single trial request through.
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from utils.cancellation import time_remaining
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+def is_retryable_status(status: Optional[int]) -> bool:
+    return status in RETRYABLE_STATUSES or (status is not None and status >= 500)
+
+def is_retryable_exception(exc: BaseException) -> bool:
+    """Timeouts and broken connections are worth retrying; malformed requests and URLs are not"""
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionError))
+
+def error_result(message: str, status: Optional[int] = None, retryable: bool = False) -> Dict[str, Any]:
+    """The adapter's {"error": ...} dict, annotated so the retry layer can classify it"""
+    return {"error": message, "status": status, "retryable": retryable}
+
+class CircuitBreaker:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, name: str = "llm"):
+        config = config or {}
+        self.name = name
+        self.failure_threshold = int(config.get("failure_threshold", 5)) # Consecutive failed requests (retries exhausted) that open the circuit
+        self.reset_timeout = float(config.get("reset_timeout", 30.0)) # Seconds open before a trial request
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.stats = {"opened": 0, "short_circuited": 0}
+
+    def allow(self) -> bool:
+        """Whether a request may go out now; in half-open state only one trial at a time"""
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.stats["short_circuited"] += 1
+                return False
+            self.state = "half_open"
+            logger.info(f"[{self.name}] Circuit half-open; sending a trial request")
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                self.stats["short_circuited"] += 1
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"[{self.name}] Circuit closed; API is answering again")
+        self.state = "closed"
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+                logger.warning(f"[{self.name}] Circuit open after {self._failures} failures; failing fast for {self.reset_timeout:.0f}s")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """An answer that says nothing about API health (4xx, throttling): just end a trial"""
+        if self.state == "half_open":
+            self.record_success()
+
+    def release_trial(self):
+        """A request ended without an outcome (cancelled); let the next one be the trial"""
+        self._trial_in_flight = False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if self.state == "open" else 0.0
+
+class RetryPolicy:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, name: str = "llm"):
+        config = config or {}
+        self.name = name
+        self.enabled = config.get("enabled", True)
+        self.max_attempts = max(1, int(config.get("max_attempts", 4)))
+        self.base_delay = float(config.get("base_delay", 0.5))
+        self.max_delay = float(config.get("max_delay", 8.0))
+        self.deadline = float(config.get("deadline", 60.0)) # Seconds across all attempts of one request
+        self.breaker = CircuitBreaker(config.get("circuit_breaker", {}), name=name)
+        self.stats = {"retries": 0, "recovered": 0, "gave_up": 0, "fatal": 0}
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform over [0, min(max_delay, base_delay * 2^attempt)]"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def observe(self, retryable: bool, status: Optional[int], failed: bool):
+        """Feed one request's final outcome (after retries) to the circuit breaker"""
+        if not failed:
+            self.breaker.record_success()
+        elif retryable and status != 429:
+            self.breaker.record_failure() # Outage signal; 429 is the rate limiter's business
+        else:
+            self.breaker.record_neutral()
+
+    def next_delay(self, attempt: int, started: float) -> Optional[float]:
+        """Backoff before attempt+1, or None when out of attempts or the deadline would be passed"""
+        if not self.enabled or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        remaining = time_remaining()
+        if remaining is not None and delay >= remaining:
+            return None # The caller's cancel scope would end before the retry could finish
+        return delay
+
+    async def run(self, attempt: Callable[[], Awaitable[Dict[str, Any]]],
+                  is_error: Callable[[Any], bool]) -> Dict[str, Any]:
+        """Run attempt() until it succeeds, fails fatally, or attempts/deadline run out"""
+        if not self.breaker.allow():
+            return error_result(f"Circuit open: LLM API failing, retry in {self.breaker.retry_in():.0f}s")
+        started = time.monotonic()
+        try:
+            result = await self._attempts(attempt, is_error, started)
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        failed = is_error(result)
+        self.observe(failed and bool(result.get("retryable")), result.get("status") if failed else None, failed)
+        return result
+
+    async def _attempts(self, attempt: Callable[[], Awaitable[Dict[str, Any]]],
+                        is_error: Callable[[Any], bool], started: float) -> Dict[str, Any]:
+        number = 0
+        while True:
+            result = await attempt()
+            if not is_error(result):
+                if number:
+                    self.stats["recovered"] += 1
+                return result
+            if not result.get("retryable"):
+                self.stats["fatal"] += 1
+                return result
+            delay = self.next_delay(number, started)
+            if delay is None:
+                self.stats["gave_up"] += 1
+                logger.error(f"[{self.name}] Giving up after {number + 1} attempts: {result['error']}")
+                return result
+            self.stats["retries"] += 1
+            logger.warning(f"[{self.name}] Retryable error ({result['error'][:120]}); retry {number + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            number += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, **self.breaker.stats, "circuit": self.breaker.state}
@@ -0,0 +1,61 @@
+"""
+Single-flight coalescing of concurrent identical async calls.
+The first caller for a key starts the work; later callers for the same key await the same result.
+"""
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {"started": 0, "coalesced": 0, "abandoned": 0}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once per key at a time and share its result with every concurrent caller.
+        Cancelling one caller does not cancel the shared work; it is only cancelled once no callers remain.
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task, key=key, flight=flight: self._forget(key, flight))
+            self.stats["started"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.debug(f"Coalesced duplicate in-flight request {key[:12]} ({flight.waiters} already waiting)")
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                # Last interested caller left: stop the shared work too, and wait for it to unwind
+                # so its connection and rate-limit slot are released before the caller moves on
+                flight.task.cancel()
+                self.stats["abandoned"] += 1
+                await asyncio.wait({flight.task})
+            raise
+        finally:
+            flight.waiters -= 1
+
+        # Followers get their own copy so one caller mutating a parsed JSON result cannot affect another
+        return result if leader else copy.deepcopy(result)
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,236 @@
+"""
+Embedded SQLite storage for RedisAdapter.
+Implements the Redis commands RedisAdapter uses (strings with expiry, hashes, sets, sorted sets, SCAN and
+non-transactional pipelines) on a local SQLite database in WAL mode, so contexts, file metadata, the analysis
+cache and execution state survive across runs without a Redis server: single-machine runs and CI.
+Values are returned as str, as from a Redis client with decode_responses=True. There is no pub/sub.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS strings (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL);
+CREATE TABLE IF NOT EXISTS hashes (key TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (key, field));
+CREATE TABLE IF NOT EXISTS sets (key TEXT NOT NULL, member TEXT NOT NULL, PRIMARY KEY (key, member));
+CREATE TABLE IF NOT EXISTS zsets (key TEXT NOT NULL, member TEXT NOT NULL, score REAL NOT NULL, PRIMARY KEY (key, member));
+CREATE INDEX IF NOT EXISTS zsets_by_score ON zsets (key, score);
+"""
+_TABLES = ("strings", "hashes", "sets", "zsets")
+_LIVE = "(expires_at IS NULL OR expires_at > ?)" # Expired strings are ignored until purged
+
+# Commands available as coroutines on SQLiteStore and as queued calls on its pipelines
+_COMMANDS = {"ping", "get", "set", "setex", "mget", "exists", "ttl", "delete", "keys", "scan", "hset", "hget",
+             "hgetall", "sadd", "smembers", "zadd", "zrevrangebyscore", "zrem", "zremrangebyrank",
+             "publish"}
+
+def _score_bound(bound: Any) -> Tuple[float, bool]:
+    """(score, exclusive) from a Redis range bound: a number, "+inf", "-inf" or "(<number>" """
+    text = str(bound)
+    if text.startswith("("):
+        return float(text[1:]), True
+    return float(text), False
+
+class SQLitePipeline:
+    """
+    Queues commands and runs them in one round trip to the store's thread. As on a non-transactional Redis
+    pipeline, each command succeeds or fails on its own: a failing command is undone, the others are kept, and
+    execute() raises the first error (or, with raise_on_error=False, returns it in place of that command's result).
+    """
+
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+        self.command_stack: List[Tuple[Callable, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name not in _COMMANDS:
+            raise AttributeError(name)
+        command = getattr(self.store, f"_{name}")
+
+        def queue(*args, **kwargs):
+            self.command_stack.append((command, args, kwargs))
+            return self
+        return queue
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        commands, self.command_stack = self.command_stack, []
+        results = await self.store._run(lambda: [self.store._isolated(command, args, kwargs) for command, args, kwargs in commands])
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+class SQLiteStore:
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection used from one worker thread: commands are serialized, as on a Redis connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL") # Readers in other processes do not block the writer
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("DELETE FROM strings WHERE expires_at <= ?", (time.time(),))
+
+    def __getattr__(self, name: str):
+        if name not in _COMMANDS:
+            raise AttributeError(name)
+        command = getattr(self, f"_{name}")
+
+        async def call(*args, **kwargs):
+            return await self._run(lambda: command(*args, **kwargs))
+        return call
+
+    def pipeline(self, transaction: bool = True) -> SQLitePipeline:
+        return SQLitePipeline(self)
+
+    async def _run(self, work: Callable[[], Any]) -> Any:
+        """Run work in one transaction on the store's thread"""
+        def transaction():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+        return await asyncio.get_running_loop().run_in_executor(self._executor, transaction)
+
+    def _isolated(self, command: Callable, args: tuple, kwargs: dict) -> Any:
+        """Run one pipelined command in a savepoint: its result, or the error that undid just this command"""
+        self._conn.execute("SAVEPOINT command")
+        try:
+            result = command(*args, **kwargs)
+        except Exception as e:
+            self._conn.execute("ROLLBACK TO command")
+            result = e
+        self._conn.execute("RELEASE command")
+        return result
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._conn.close)
+        self._executor.shutdown(wait=False)
+
+    # --- Commands (run on the store's thread) ---
+    def _ping(self) -> bool:
+        return True
+
+    def _set(self, key: str, value: Any) -> bool:
+        self._conn.execute("INSERT OR REPLACE INTO strings (key, value, expires_at) VALUES (?, ?, NULL)", (key, str(value)))
+        return True
+
+    def _setex(self, key: str, ttl: int, value: Any) -> bool:
+        self._conn.execute("INSERT OR REPLACE INTO strings (key, value, expires_at) VALUES (?, ?, ?)",
+                           (key, str(value), time.time() + ttl))
+        return True
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(f"SELECT value FROM strings WHERE key = ? AND {_LIVE}", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def _mget(self, keys: List[str]) -> List[Optional[str]]:
+        found = dict(self._conn.execute(
+            f"SELECT key, value FROM strings WHERE key IN ({','.join('?' * len(keys))}) AND {_LIVE}", (*keys, time.time())))
+        return [found.get(key) for key in keys]
+
+    def _exists(self, *keys: str) -> int:
+        return sum(bool(self._keys_like(key, "=")) for key in keys)
+
+    def _ttl(self, key: str) -> int:
+        row = self._conn.execute(f"SELECT expires_at FROM strings WHERE key = ? AND {_LIVE}", (key, time.time())).fetchone()
+        if row is None:
+            return -1 if self._keys_like(key, "=") else -2
+        return -1 if row[0] is None else max(int(row[0] - time.time()), 0)
+
+    def _delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            deleted += bool(self._keys_like(key, "="))
+            for table in _TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+        return deleted
+
+    def _keys_like(self, pattern: str, operator: str = "GLOB") -> List[str]:
+        """Live keys of every type matching a Redis glob (operator GLOB) or equal to a key (operator =)"""
+        queries = [f"SELECT key FROM strings WHERE key {operator} ? AND {_LIVE}"]
+        queries += [f"SELECT key FROM {table} WHERE key {operator} ?" for table in _TABLES[1:]]
+        params = [pattern, time.time()] + [pattern] * (len(_TABLES) - 1)
+        return [row[0] for row in self._conn.execute(" UNION ".join(queries), params)]
+
+    def _keys(self, pattern: str = "*") -> List[str]:
+        return self._keys_like(pattern)
+
+    def _scan(self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None) -> Tuple[int, List[str]]:
+        """SCAN over string keys (the only ones RedisAdapter scans), with the rowid as cursor"""
+        rows = self._conn.execute(
+            f"SELECT rowid, key FROM strings WHERE rowid > ? AND key GLOB ? AND {_LIVE} ORDER BY rowid LIMIT ?",
+            (cursor, match or "*", time.time(), count or 10)).fetchall()
+        next_cursor = rows[-1][0] if len(rows) == (count or 10) else 0
+        return next_cursor, [key for _, key in rows]
+
+    def _hset(self, key: str, field: Optional[str] = None, value: Any = None, mapping: Optional[Dict[str, Any]] = None) -> int:
+        items = {**({field: value} if field is not None else {}), **(mapping or {})}
+        existing = {row[0] for row in self._conn.execute("SELECT field FROM hashes WHERE key = ?", (key,))}
+        self._conn.executemany("INSERT OR REPLACE INTO hashes (key, field, value) VALUES (?, ?, ?)",
+                               [(key, name, str(item)) for name, item in items.items()])
+        return len(set(items) - existing)
+
+    def _hget(self, key: str, field: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM hashes WHERE key = ? AND field = ?", (key, field)).fetchone()
+        return row[0] if row else None
+
+    def _hgetall(self, key: str) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT field, value FROM hashes WHERE key = ?", (key,)))
+
+    def _sadd(self, key: str, *members: str) -> int:
+        before = self._conn.total_changes
+        self._conn.executemany("INSERT OR IGNORE INTO sets (key, member) VALUES (?, ?)", [(key, member) for member in members])
+        return self._conn.total_changes - before
+
+    def _smembers(self, key: str) -> set:
+        return {row[0] for row in self._conn.execute("SELECT member FROM sets WHERE key = ?", (key,))}
+
+    def _zadd(self, key: str, mapping: Dict[str, float], nx: bool = False) -> int:
+        before = self._conn.total_changes
+        conflict = "DO NOTHING" if nx else "DO UPDATE SET score = excluded.score"
+        self._conn.executemany(f"INSERT INTO zsets (key, member, score) VALUES (?, ?, ?) ON CONFLICT (key, member) {conflict}",
+                               [(key, member, score) for member, score in mapping.items()])
+        return self._conn.total_changes - before
+
+    def _zrevrangebyscore(self, key: str, max: Any, min: Any, start: Optional[int] = None, num: Optional[int] = None,
+                          withscores: bool = False) -> list:
+        (top, top_open), (bottom, bottom_open) = _score_bound(max), _score_bound(min)
+        rows = self._conn.execute(
+            f"SELECT member, score FROM zsets WHERE key = ? AND score {'<' if top_open else '<='} ? "
+            f"AND score {'>' if bottom_open else '>='} ? ORDER BY score DESC, member DESC LIMIT ? OFFSET ?",
+            (key, top, bottom, -1 if num is None else num, start or 0)).fetchall()
+        return [tuple(row) for row in rows] if withscores else [row[0] for row in rows]
+
+    def _zrem(self, key: str, *members: str) -> int:
+        before = self._conn.total_changes
+        self._conn.executemany("DELETE FROM zsets WHERE key = ? AND member = ?", [(key, member) for member in members])
+        return self._conn.total_changes - before
+
+    def _zremrangebyrank(self, key: str, start: int, stop: int) -> int:
+        """Remove the members ranked start..stop (inclusive, negative from the end) in ascending score order"""
+        size = self._conn.execute("SELECT COUNT(*) FROM zsets WHERE key = ?", (key,)).fetchone()[0]
+        start, stop = max(start + size if start < 0 else start, 0), min(stop + size if stop < 0 else stop, size - 1)
+        if start > stop:
+            return 0
+        before = self._conn.total_changes
+        self._conn.execute("DELETE FROM zsets WHERE key = ? AND member IN (SELECT member FROM zsets WHERE key = ? "
+                           "ORDER BY score, member LIMIT ? OFFSET ?)", (key, key, stop - start + 1, start))
+        return self._conn.total_changes - before
+
+    def _publish(self, channel: str, message: str) -> int:
+        return 0 # No subscribers: RedisAdapter turns its L1 cache off on this backend
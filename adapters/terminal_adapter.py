@@ -3,24 +3,48 @@
 Terminal adapter for the AI Coding Agent with async support
 """
 import asyncio
+import os
+import signal
 from typing import Dict, List, Optional, Any
 from utils.logger import get_logger  # Updated import
+from utils.cancellation import time_remaining
 
 class TerminalAdapter:
     def __init__(self):
         self.logger = get_logger(__name__)  # Updated logger retrieval
     
-    async def execute(self, command: str, cwd: Optional[str] = None) -> Dict[str, Any]:
-        """Execute a terminal command asynchronously and return the result."""
+    async def execute(self, command: str, cwd: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Execute a terminal command asynchronously and return the result.
+        The command is killed if the caller is cancelled or timeout (or the cancel scope's deadline) passes.
+        """
         self.logger.info(f"Executing terminal command: {command}")
+        timeout = time_remaining(timeout)
         try:
             process = await asyncio.create_subprocess_shell(
                 command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                cwd=cwd
+                cwd=cwd,
+                start_new_session=os.name == "posix" # Own process group, so a kill reaches the command's children too
             )
-            stdout, stderr = await process.communicate()
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._kill(process)
+                await process.wait()
+                self.logger.warning(f"Command timed out after {timeout:.1f}s and was killed: {command}")
+                return {
+                    "success": False,
+                    "return_code": process.returncode,
+                    "error": f"Command timed out after {timeout:.1f} seconds",
+                    "stdout": "",
+                    "stderr": f"Command timed out after {timeout:.1f} seconds"
+                }
+            except asyncio.CancelledError:
+                self._kill(process) # Abandoned: do not leave the command running in the background
+                self.logger.warning(f"Command cancelled and killed: {command}")
+                raise
             
             # Convert bytes to string
             stdout_str = stdout.decode('utf-8', errors='replace')
@@ -44,4 +68,16 @@ class TerminalAdapter:
                 "error": str(e),
                 "stdout": "",
                 "stderr": str(e)
-            }
\ No newline at end of file
+            }
+
+    def _kill(self, process: asyncio.subprocess.Process):
+        """Kill a running command along with anything it started"""
+        if process.returncode is not None:
+            return
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
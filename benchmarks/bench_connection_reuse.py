@@ -0,0 +1,52 @@
+"""
+Benchmark: TCP connection reuse of LLMAdapter against a local generateContent stub.
+
+Run from the project root:
+    python benchmarks/bench_connection_reuse.py --calls 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from adapters.llm_adapter import LLMAdapter
+from adapters.llm_stub_server import StubLLMServer
+
+async def run(calls: int, pooled: bool) -> dict:
+    server = await StubLLMServer().start()
+    adapter = LLMAdapter({
+        "api_key": "bench",
+        "api_url": server.api_url(),
+        # The production limit is 10 requests/minute; lift it so only the transport is measured
+        "rate_limit": {"requests_per_minute": 600_000, "burst": 10_000},
+        "cache": {"enabled": False}, # Every call must reach the server
+    })
+    start = time.perf_counter()
+    try:
+        for _ in range(calls):
+            await adapter.generate("ping")
+            if not pooled:
+                await adapter.close() # Emulates the old session-per-call behaviour
+    finally:
+        await adapter.close()
+        await server.stop()
+    elapsed = time.perf_counter() - start
+    return {"mode": "pooled" if pooled else "per-call", "calls": calls, "connections": len(server.peers), "seconds": elapsed}
+
+async def main_async(calls: int):
+    for pooled in (False, True):
+        stats = await run(calls, pooled)
+        reused = stats["calls"] - stats["connections"]
+        print(f"{stats['mode']:>9}: {stats['calls']} calls, {stats['connections']} connections "
+              f"({reused} reused), {stats['seconds'] * 1000 / stats['calls']:.2f} ms/call")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count connection reuse for LLMAdapter")
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.calls))
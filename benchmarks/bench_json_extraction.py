@@ -0,0 +1,77 @@
+"""
+Benchmark: extracting JSON from large LLM responses, old multi-strategy parsing vs the single-pass scanner.
+
+Run from the project root:
+    python benchmarks/bench_json_extraction.py --steps 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from utils.json_scanner import JSONScanner, find_json
+
+def legacy_parse(text: str):
+    """The previous _parse_json_response: direct, markdown split, first {/last }, then JSON lines"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    if "```json" in text:
+        try:
+            return json.loads(text.split("```json")[1].split("```")[0].strip())
+        except json.JSONDecodeError:
+            pass
+    try:
+        return json.loads(text[text.find('{'):text.rfind('}') + 1])
+    except Exception:
+        pass
+    try:
+        return [json.loads(line) for line in text.split('\n') if line.strip()]
+    except Exception:
+        return None
+
+def make_responses(steps: int) -> dict:
+    plan = {"understanding": "Refactor {the} module", "files": [f"pkg/mod_{i}.py" for i in range(steps)],
+            "steps": [{"type": "code_generation", "description": f"Write {{handler}} #{i} with \"quotes\" and ``` fences",
+                       "file_path": f"pkg/mod_{i}.py", "requirements": "def f(x): return {'a': [x]}"} for i in range(steps)]}
+    body = json.dumps(plan, indent=2)
+    return {
+        "bare": body,
+        "fenced": f"Here is the plan:\n```json\n{body}\n```\nLet me know if you want changes.",
+        "prose": f"Fill in {{name}} later. The plan: {body}\nNote: keys use {{braces}}.",
+    }
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def stream(text: str, chunk_size: int):
+    scanner = JSONScanner()
+    for i in range(0, len(text), chunk_size):
+        scanner.feed(text[i:i + chunk_size])
+    return scanner.match.value if scanner.match else None
+
+def main(steps: int, repeat: int, chunk_size: int):
+    for name, text in make_responses(steps).items():
+        expected = find_json(text).value
+        legacy_ok = legacy_parse(text) == expected
+        print(f"{name:>6} ({len(text) / 1e6:.2f} MB): "
+              f"legacy {timed(lambda: legacy_parse(text), repeat):7.2f} ms{'' if legacy_ok else ' (wrong result)'}, "
+              f"find_json {timed(lambda: find_json(text), repeat):7.2f} ms, "
+              f"streamed in {chunk_size}-char chunks {timed(lambda: stream(text, chunk_size), repeat):7.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time JSON extraction from large LLM responses")
+    parser.add_argument("--steps", type=int, default=2000, help="Plan steps in the generated response")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=256, help="Stream chunk size for the incremental scanner")
+    args = parser.parse_args()
+    main(args.steps, args.repeat, args.chunk_size)
@@ -0,0 +1,204 @@
+"""
+Benchmark: Redis round trips of RedisAdapter bulk reads and batched writes vs the previous per-key loops.
+
+Uses the Redis server at --host/--port when one is reachable, otherwise an in-memory client that sleeps --rtt
+milliseconds per round trip. Run from the project root:
+    python benchmarks/bench_redis_round_trips.py --snippets 200 --rtt 1
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import sys
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from adapters.redis_adapter import RedisAdapter
+
+class SimulatedPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.command_stack = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.command_stack.append((name, args, kwargs))
+            return self
+        return queue
+
+    def __len__(self):
+        return len(self.command_stack)
+
+    async def execute(self):
+        await asyncio.sleep(self.client.rtt)
+        commands, self.command_stack = self.command_stack, []
+        return [getattr(self.client, f"_{name}")(*args, **kwargs) for name, args, kwargs in commands]
+
+class SimulatedRedis:
+    """Just enough of redis.asyncio.Redis for the adapter, with a fixed latency per round trip"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return SimulatedPipeline(self)
+
+    def __getattr__(self, name):
+        command = getattr(self, f"_{name}")
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self.rtt)
+            return command(*args, **kwargs)
+        return call
+
+    def _set(self, key, value):
+        self.data[key] = value
+
+    def _setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def _keys(self, pattern):
+        return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    def _hset(self, key, field=None, value=None, mapping=None):
+        self.data.setdefault(key, {}).update(mapping or {field: value})
+
+    def _hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def _hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def _sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    def _smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def _exists(self, key):
+        return int(key in self.data)
+
+    def _zadd(self, key, mapping, nx=False):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def _zrevrangebyscore(self, key, max, min, start=0, num=None, withscores=False):
+        def bound(value):
+            return float(str(value).lstrip("(")), str(value).startswith("(")
+        (top, top_open), (bottom, bottom_open) = bound(max), bound(min)
+        members = sorted(((m, s) for m, s in self.data.get(key, {}).items()
+                          if (s < top or (s == top and not top_open)) and (s > bottom or (s == bottom and not bottom_open))),
+                         key=lambda item: (item[1], item[0]), reverse=True)[start:None if num is None else start + num]
+        return members if withscores else [m for m, _ in members]
+
+    def _zrem(self, key, *members):
+        for member in members:
+            self.data.get(key, {}).pop(member, None)
+
+    def _zremrangebyrank(self, key, start, stop):
+        ranked = sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        for member, _ in ranked[start:len(ranked) if stop == -1 else stop + 1]:
+            del self.data[key][member]
+
+    def _publish(self, channel, message):
+        return 0
+
+    def _delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def close(self):
+        pass
+
+async def legacy_related_snippets(adapter: RedisAdapter, file_path: str) -> list:
+    """The previous get_related_snippets: SMEMBERS, then one HGETALL per snippet"""
+    snippets = []
+    for key in await adapter._bounded(adapter.client.smembers(f"{adapter._file_key(file_path)}:snippets")):
+        data = await adapter._bounded(adapter.client.hgetall(key))
+        if data and data.get("metadata"):
+            snippets.append(data["metadata"])
+    return snippets
+
+async def legacy_search_context(adapter: RedisAdapter, query: str, limit: int) -> list:
+    """The previous search_context: KEYS, then one GET per key"""
+    results = []
+    for key in (await adapter._bounded(adapter.client.keys(f"{adapter.namespace}:context:*{query}*")))[:limit]:
+        data = await adapter._bounded(adapter.client.get(key))
+        if data:
+            results.append(json.loads(data))
+    return results
+
+async def legacy_writes(adapter: RedisAdapter, count: int):
+    """store_context and track_file one command at a time, as before batch()"""
+    for i in range(count):
+        await adapter._bounded(adapter.client.set(f"{adapter.namespace}:context:bench-write-{i}", json.dumps({"i": i})))
+        await adapter._bounded(adapter.client.hset(adapter._file_key(f"pkg/mod_{i}.py"), "metadata", json.dumps({"i": i})))
+
+async def batched_writes(adapter: RedisAdapter, count: int):
+    async with adapter.batch():
+        for i in range(count):
+            await adapter.store_context(f"bench-write-{i}", {"i": i})
+            await adapter.track_file(f"pkg/mod_{i}.py", {"i": i})
+
+async def measure(adapter: RedisAdapter, name: str, call) -> tuple:
+    before = adapter.stats["round_trips"]
+    start = time.perf_counter()
+    result = await call
+    return name, adapter.stats["round_trips"] - before, time.perf_counter() - start, result
+
+async def connect(host: str, port: int, rtt: float) -> tuple:
+    adapter = RedisAdapter({"host": host, "port": port, "namespace": "bench_round_trips"})
+    try:
+        await asyncio.wait_for(adapter.client.ping(), timeout=1)
+        return adapter, f"redis://{host}:{port}"
+    except Exception:
+        await adapter.close()
+        adapter.client = SimulatedRedis(rtt / 1000)
+        return adapter, f"simulated client, {rtt:g} ms per round trip"
+
+async def run(snippets: int, limit: int, rtt: float, host: str, port: int):
+    adapter, target = await connect(host, port, rtt)
+    print(f"Target: {target}")
+    try:
+        async with adapter.batch():
+            for i in range(snippets):
+                await adapter.track_code_snippet(f"bench-{i}", {"file_path": "pkg/big.py", "line": i})
+                await adapter.store_context(f"bench-ctx:{i}", {"i": i, "body": "x" * 200})
+
+        rows = [
+            await measure(adapter, "get_related_snippets (legacy)", legacy_related_snippets(adapter, "pkg/big.py")),
+            await measure(adapter, "get_related_snippets", adapter.get_related_snippets("pkg/big.py")),
+            await measure(adapter, "search_context (legacy)", legacy_search_context(adapter, "bench-ctx", limit)),
+            await measure(adapter, "search_context", adapter.search_context("bench-ctx", limit)),
+            await measure(adapter, f"{snippets}x store_context+track_file (legacy)", legacy_writes(adapter, snippets)),
+            await measure(adapter, f"{snippets}x store_context+track_file in batch()", batched_writes(adapter, snippets)),
+        ]
+        for name, round_trips, seconds, result in rows:
+            size = f", {len(result)} results" if isinstance(result, list) else ""
+            print(f"{name:>52}: {round_trips:5d} round trips, {seconds * 1000:8.1f} ms{size}")
+    finally:
+        if not isinstance(adapter.client, SimulatedRedis):
+            keys = await adapter.client.keys(f"{adapter.namespace}:*")
+            if keys:
+                await adapter.client.delete(*keys)
+        await adapter.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count Redis round trips of bulk reads and batched writes")
+    parser.add_argument("--snippets", type=int, default=200, help="Snippets and context entries to create")
+    parser.add_argument("--limit", type=int, default=100, help="search_context result limit")
+    parser.add_argument("--rtt", type=float, default=1.0, help="Simulated milliseconds per round trip without a server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    asyncio.run(run(args.snippets, args.limit, args.rtt, args.host, args.port))
@@ -462,6 +462,36 @@ PROMPTS = {
           "uses_async": boolean,
           "specific_focus_details": {{}} // Populate if focus was specific
         }}
+        """,
+        "analyze_many": """
+        Analyze each of the following files independently and provide a structured breakdown per file.
+        Focus: {analysis_focus}
+
+        {files}
+
+        For every file, extract the same information as a single-file analysis:
+        language, imports, functions/classes (names, parameters, basic purpose), main execution flow,
+        potential issues, and whether async/await is used. If the focus is specific, populate
+        "specific_focus_details" for that aspect.
+
+        Return exactly one entry per file, using the file path exactly as given after "### File:".
+        Format the response as JSON only:
+        {{
+          "analyses": [
+            {{
+              "file_path": "path/as/given",
+              "language": "detected_language",
+              "analysis_focus": "{analysis_focus}",
+              "imports": ["list", "of", "imports"],
+              "functions": [ {{"name": "func_name", "signature": "params", "purpose": "brief"}}, ... ],
+              "classes": [ {{"name": "class_name", "methods": ["method1", "..."]}}, ... ],
+              "main_flow": "summary_of_execution",
+              "issues": ["list", "of", "potential_issues"],
+              "uses_async": boolean,
+              "specific_focus_details": {{}}
+            }}
+          ]
+        }}
         """
     },
     # Improvement prompts remain the same as before
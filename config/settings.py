@@ -17,11 +17,16 @@ def load_config(config_path: str) -> Dict[str, Any]:
     with open(config_path, 'r', encoding='utf-8') as f:
         config = json.load(f)
     
-    # Add environment variables
-    if "llm" in config and "api_key" not in config["llm"]:
+    # Add environment variables (the only place they are read)
+    llm_config = config.setdefault("llm", {})
+    if not llm_config.get("api_key"):
         api_key_env = os.environ.get("GEMINI_API_KEY")
         if api_key_env:
-            config["llm"]["api_key"] = api_key_env #set the api key from the environment variable
+            llm_config["api_key"] = api_key_env #set the api key from the environment variable
+    if not llm_config.get("api_keys"):
+        api_keys_env = os.environ.get("GEMINI_API_KEYS") # Comma-separated pool of keys
+        if api_keys_env:
+            llm_config["api_keys"] = [key.strip() for key in api_keys_env.split(",") if key.strip()]
     
     return config
 
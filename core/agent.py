@@ -1208,13 +1208,14 @@
 
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Callable, Tuple
 import os
 import hashlib
 import time
 import json
 import re # Import regex
 import pathlib # For path operations
+import signal
 
 # Assuming components are in respective directories relative to project root
 try:
@@ -1224,8 +1225,12 @@ try:
     from core.file_manager import FileManager
     from core.dependency_manager import DependencyManager
     from core.improvement_engine import ImprovementEngine
+    from core.speculation import SpeculativeSteps
     from adapters.terminal_adapter import TerminalAdapter
     from adapters.llm_adapter import LLMAdapter
+    from adapters.model_router import ModelRouter
+    from adapters.rate_limiter import llm_priority
+    from utils.cancellation import CancelScope, OperationCancelled, cancellation_reason
     from adapters.redis_adapter import RedisAdapter
     from utils.schema import Plan, Step, StepResult, CodeAnalysis
     from utils.helpers import save_json, compute_file_hash, extract_language_from_path, sanitize_path
@@ -1246,7 +1251,11 @@ class Agent:
 
         # --- Adapter Initialization ---
         try:
-            self.llm = LLMAdapter(config["llm"])
+            # Model cascade: cheap tiers first, escalating on validation failures (llm.routing)
+            if config["llm"].get("routing", {}).get("enabled", False):
+                self.llm = ModelRouter(config["llm"])
+            else:
+                self.llm = LLMAdapter(config["llm"])
         except KeyError as e:
             self.logger.error(f"LLM configuration missing key: {e}")
             raise ValueError(f"LLM configuration missing key: {e}") from e
@@ -1255,18 +1264,32 @@ class Agent:
              raise RuntimeError(f"Failed to initialize LLMAdapter: {e}") from e
 
         self.terminal = TerminalAdapter()
+        # Cancellation scopes: Ctrl-C (see cancel()) or a deadline stops in-flight LLM, Redis and terminal work at once
+        cancellation_config = config.get("cancellation", {})
+        self.task_timeout = cancellation_config.get("task_timeout") # Seconds; None for no deadline
+        self.step_timeout = cancellation_config.get("step_timeout")
+        self._task_scope: Optional[CancelScope] = None
+        self._interrupts_handled = False # Whether Ctrl-C is routed to cancel() by an event loop signal handler
+        # Generate the next step's code while the user reviews the current one (speculation.enabled)
+        self.speculation = SpeculativeSteps(config.get("speculation", {}).get("enabled", False))
+        # Render generated code as it streams in (streamGenerateContent) instead of waiting for the full file
+        self.stream_code = bool(config["llm"].get("stream", False))
 
         # Conditionally initialize Redis if configured
         self.redis = None
         if config.get("redis"):
             try:
                 self.redis = RedisAdapter(config["redis"])
-                self.logger.info("Redis adapter initialized.")
+                self.logger.info(f"Redis adapter initialized (backend: {self.redis.backend}).")
             except Exception as e:
                 self.logger.warning(f"Failed to initialize Redis adapter: {e}. Proceeding without Redis.")
                 self.cli_ui.print_warning("Could not connect to Redis. State and caching will be limited.")
         else:
-             self.logger.info("Redis not configured. State and caching will be limited.")
+             self.logger.info("Redis not configured (set redis.backend to \"sqlite\" for local storage). State and caching will be limited.")
+
+        # Share Redis with the LLM response cache as its slowest tier
+        if self.redis:
+            self.llm.response_cache.attach_redis(self.redis)
 
         # --- Core Component Initialization ---
         self.working_directory = config.get("working_directory")
@@ -1447,6 +1470,7 @@ class Agent:
         self.execution_results = {} # Reset results for the current run
         self.execution_state = {"current_step_index": 0, "step_results": {}} # Reset internal state tracker
 
+        self.llm.ledger.task_id = self.task_id # LLM calls from here on are attributed to this task
         self.logger.info(f"Set new task (ID: {self.task_id}) from {source}: {task_description[:100]}...")
 
         # Attempt to load state ONLY AFTER task_id is set
@@ -1519,15 +1543,18 @@ class Agent:
             self.cli_ui.display_code(existing_code[:500] + "..." if len(existing_code) > 500 else existing_code, language=language, file_path=relative_path)
             self.cli_ui.print_message(f"Modification requested: [italic]{modification_request}[/]")
 
-            self.cli_ui.print_thinking("Generating modifications...")
             context = {"file_path": relative_path}
             # Pass CodeAnalysis object directly if available
-            modified_code = await self.code_generator.modify(
-                existing_code=existing_code,
-                modifications=modification_request,
-                analysis=analysis, # Pass the object
-                # language=language,
-                context=context
+            modified_code = await self._generate_code(
+                lambda on_chunk: self.code_generator.modify(
+                    existing_code=existing_code,
+                    modifications=modification_request,
+                    analysis=analysis, # Pass the object
+                    # language=language,
+                    context=context,
+                    on_chunk=on_chunk
+                ),
+                language, relative_path, "Generating modifications..."
             )
 
 
@@ -1539,7 +1566,7 @@ class Agent:
                  return False
 
             self.cli_ui.display_code(modified_code, language=language, file_path=relative_path)
-            edit_choice = self.cli_ui.ask_edit_confirmation(relative_path, action="apply modifications to")
+            edit_choice = await self._ask(self.cli_ui.ask_edit_confirmation, relative_path, action="apply modifications to")
 
             if edit_choice == 'cancel':
                 self.cli_ui.print_message("Modification cancelled by user.", style="yellow")
@@ -1547,7 +1574,7 @@ class Agent:
             elif edit_choice == 'edit':
                 try:
                     await self.file_manager.write_file(abs_path, modified_code)
-                    self.cli_ui.prompt_manual_edit(abs_path)
+                    await self._ask(self.cli_ui.prompt_manual_edit, abs_path)
                     modified_code = await self.file_manager.read_file(abs_path)
                     self.cli_ui.print_message("Code updated from file after manual edit.", style="dim")
                     self.logger.info(f"User manually edited {abs_path} during direct modification.")
@@ -1562,7 +1589,7 @@ class Agent:
                 success = await self.file_manager.write_file(abs_path, modified_code)
                 if success:
                     self.cli_ui.print_message(f"Successfully modified {relative_path}.", style="bold green")
-                    await self._update_dependencies_and_analyze(relative_path, modified_code) # Use relative path
+                    await self._update_dependencies_and_analyze(relative_path, modified_code, priority="background") # Use relative path
                     return True
                 else:
                     self.cli_ui.print_error(f"Failed to write changes to {relative_path}.")
@@ -1584,9 +1611,88 @@ class Agent:
             return False
 
 
+    async def _generate_code(self, request, language: str, file_path: str, thinking_message: str):
+        """
+        Run a CodeGenerator call, rendering the code live while it streams when streaming is enabled.
+        `request` receives an on_chunk callback (None when not streaming) and returns the generator coroutine.
+        """
+        if not self.stream_code:
+            self.cli_ui.print_thinking(thinking_message)
+            with llm_priority("interactive"):
+                return await request(None)
+        self.cli_ui.print_message(thinking_message, style="dim")
+        with self.cli_ui.stream_code(language=language, file_path=file_path) as renderer, llm_priority("interactive"):
+            code = await request(renderer.on_chunk)
+        if renderer.time_to_first_token is not None:
+            self.logger.info(f"Streamed code for {file_path}: time to first token {renderer.time_to_first_token:.2f}s")
+        return code
+
     # --- Interactive Execution Logic ---
     async def run_interactive(self, initial_input: str) -> Dict[str, Any]:
-        """Main interactive entry point for a single task."""
+        """Main interactive entry point for a single task, run inside a cancel scope (see cancel())."""
+        self._handle_interrupts()
+        try:
+            async with CancelScope(timeout=self.task_timeout, name="task") as scope:
+                self._task_scope = scope
+                results = await self._run_interactive(initial_input)
+        except OperationCancelled as e:
+            self.logger.warning(f"Task {self.task_id} cancelled: {e.reason}")
+            self.cli_ui.print_error(f"\nTask cancelled: {e.reason}")
+            results = {
+                "task_id": self.task_id,
+                "results": {idx: res.__dict__ for idx, res in self.execution_results.items()},
+                "success": False,
+                "cancelled": e.reason
+            }
+        finally:
+            self._release_interrupts()
+            self.speculation.discard("task finished")
+            self._task_scope = None
+        results.setdefault("llm_calls", self.llm.ledger.report(self.task_id))
+        self._dump_results(results)
+        return results
+
+    def _dump_results(self, results: Dict[str, Any]):
+        """Write a task's execution results and LLM call ledger to <telemetry.results_dir>/<task_id>.json"""
+        results_dir = self.llm.ledger.results_dir
+        if not results_dir or not results.get("task_id"):
+            return
+        path = os.path.join(results_dir, f"{results['task_id']}.json")
+        try:
+            os.makedirs(results_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, default=str)
+            self.logger.info(f"Task results and LLM call ledger written to {path}")
+        except OSError as e:
+            self.logger.warning(f"Could not write task results to {path}: {e}")
+
+    def cancel(self, reason: str = "cancelled by user"):
+        """Cancel the running task; its in-flight LLM requests, Redis commands and terminal commands stop immediately"""
+        if self._task_scope:
+            self._task_scope.cancel(reason)
+
+    def _handle_interrupts(self):
+        """Route Ctrl-C to cancel() while a task runs (not where the event loop cannot handle signals)"""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT, self._on_interrupt)
+            self._interrupts_handled = True
+        except (NotImplementedError, RuntimeError, ValueError): # Windows event loops, or not the main thread
+            self._interrupts_handled = False
+
+    def _release_interrupts(self):
+        """Give Ctrl-C back to Python's default handler: a second Ctrl-C interrupts the whole session as usual"""
+        if self._interrupts_handled:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
+            self._interrupts_handled = False
+
+    def _on_interrupt(self):
+        self._release_interrupts()
+        self.cli_ui.print_warning("\nCancelling the task (press Ctrl-C again to exit)...")
+        self.cancel("interrupted by user (Ctrl-C)")
+
+    async def _run_interactive(self, initial_input: str) -> Dict[str, Any]:
+        if self.redis and not await self.redis.connect():
+            self.cli_ui.print_warning("Could not connect to Redis. State and caching will be limited.")
         # Set task and attempt to load state based on initial input's hash
         await self.set_task(initial_input, source="User Input") # This now handles loading state if available
         task_start_time = time.time()
@@ -1694,10 +1800,11 @@ class Agent:
             try:
                 context_for_planner = {"working_directory": self.working_directory}
                 # Pass the final task_description (could be from user or file)
-                plan_response = await self.planner.create_plan(
-                    task_description=task_description,
-                    context=context_for_planner
-                )
+                with llm_priority("interactive"): # The user is waiting on the plan
+                    plan_response = await self.planner.create_plan(
+                        task_description=task_description,
+                        context=context_for_planner
+                    )
 
                 # Handle plan_response (Plan object or conversational string)
                 if isinstance(plan_response, str):
@@ -1749,7 +1856,8 @@ class Agent:
             "task_source": task_description_source,
             "results": {idx: res.__dict__ for idx, res in self.execution_results.items()},
             "success": plan_succeeded,
-            "duration_seconds": duration
+            "duration_seconds": duration,
+            "llm_calls": self.llm.ledger.report(self.task_id)
         }
         # Store final state including results
         await self._store_execution_state() # Store final state
@@ -1781,12 +1889,21 @@ class Agent:
         return None # Step is valid
 
     async def execute_step_interactive(self, step_idx: int, step: Step) -> StepResult:
-        """Execute a single step with interactive prompts."""
+        """Execute a single step with interactive prompts; work still running when it ends is cancelled."""
+        try:
+            async with CancelScope(timeout=self.step_timeout, name=f"step {step_idx + 1}"):
+                return await self._execute_step_interactive(step_idx, step)
+        except OperationCancelled as e: # This step's own deadline; the result was recorded on the way out
+            self.logger.warning(f"Step {step_idx + 1} cancelled: {e.reason}")
+            return self.execution_results.get(step_idx) or StepResult(status="failed", error=f"Step cancelled: {e.reason}")
+
+    async def _execute_step_interactive(self, step_idx: int, step: Step) -> StepResult:
         async with self.semaphore:
             # self.cli_ui.display_step_start(step_idx, step)
             step_start_time = time.time()
             # Default result if something goes very wrong before assignment
             result: StepResult = StepResult(status="failed", error="Step execution did not initialize properly")
+            cancelled = False
 
             try:
                 try:
@@ -1853,24 +1970,29 @@ class Agent:
                         overwrite_confirmed = True
                         if exists:
                             self.logger.warning(f"Target file for generation already exists: {abs_file_path}")
-                            overwrite_confirmed = self.cli_ui.ask_confirmation(f"File '[bold]{relative_file_path}[/]' already exists. Overwrite?")
+                            overwrite_confirmed = await self._ask(self.cli_ui.ask_confirmation, f"File '[bold]{relative_file_path}[/]' already exists. Overwrite?")
                         if not overwrite_confirmed:
                             self.logger.info(f"User skipped overwriting file: {abs_file_path}")
                             result = StepResult(status="skipped", note="User chose not to overwrite existing file.", file=relative_file_path)
                         else:
                             # Proceed with generation
-                            self.cli_ui.print_thinking("Generating code...")
+                            language = extract_language_from_path(abs_file_path)
                             context = { "task": self.current_task, "target_file_path": relative_file_path, "step_description": step.description }
-                            code = await self.code_generator.generate(step.requirements or "Generate code based on context.", context)
+                            code = await self._take_speculation(step_idx, step)
+                            if code is None:
+                                code = await self._generate_code(
+                                    lambda on_chunk: self.code_generator.generate(step.requirements or "Generate code based on context.", context, on_chunk=on_chunk),
+                                    language, relative_file_path, "Generating code..."
+                                )
 
                             if isinstance(code, dict) and 'error' in code:
                                  result = StepResult(status="failed", error=f"LLM Error: {code['error']}", file=relative_file_path)
                             elif not isinstance(code, str):
                                  result = StepResult(status="failed", error=f"LLM returned unexpected type: {type(code)}", file=relative_file_path)
                             else: # Code generated successfully
-                                language = extract_language_from_path(abs_file_path)
                                 self.cli_ui.display_code(code, language=language, file_path=relative_file_path)
-                                edit_choice = self.cli_ui.ask_edit_confirmation(relative_file_path)
+                                self._start_speculation(step_idx + 1)
+                                edit_choice = await self._ask(self.cli_ui.ask_edit_confirmation, relative_file_path)
 
                                 write_to_file = False # Flag to control if writing should proceed
                                 edit_failed = False # Flag if manual edit had an error
@@ -1881,7 +2003,7 @@ class Agent:
                                 elif edit_choice == 'edit':
                                     try:
                                         await self.file_manager.write_file(abs_file_path, code) # Write temp version for editing
-                                        self.cli_ui.prompt_manual_edit(abs_file_path) # Ask user to edit
+                                        await self._ask(self.cli_ui.prompt_manual_edit, abs_file_path) # Ask user to edit
                                         code = await self.file_manager.read_file(abs_file_path) # Re-read potentially modified code
                                         self.logger.info(f"Reloaded code from {relative_file_path} after manual edit.")
                                         write_to_file = True # Proceed to final write (which overwrites with potentially edited content)
@@ -1909,7 +2031,7 @@ class Agent:
                                         result = StepResult(status="completed", file=relative_file_path, result={"file_hash": file_hash}, note=note)
                                         try:
                                             # Update dependencies only AFTER successful write
-                                            await self._update_dependencies_and_analyze(relative_file_path, code)
+                                            await self._update_dependencies_and_analyze(relative_file_path, code, priority="background")
                                         except Exception as analysis_e:
                                             self.logger.warning(f"Post-write analysis/dependency update failed for {relative_file_path}: {analysis_e}")
                                             # Log the warning but the step is still considered completed
@@ -1939,17 +2061,22 @@ class Agent:
                             self.cli_ui.display_code(existing_code[:500] + "...", language=language, file_path=relative_file_path)
                             analysis, _ = await self._update_dependencies_and_analyze(relative_file_path, existing_code) # Analyze before modification
 
-                            self.cli_ui.print_thinking("Generating code modifications based on plan...")
                             modifications = step.requirements or "Modify the code based on the plan and context."
                             # Pass CodeAnalysis object if available
                             # modified_code = await self.code_generator.modify(
                             #     existing_code=existing_code, modifications=modifications, analysis=analysis, language=language,
                             #     context={"task": self.current_task, "step_description": step.description}
                             # )
-                            modified_code = await self.code_generator.modify(
-                                existing_code=existing_code, modifications=modifications, analysis=analysis,
-                                context={"task": self.current_task, "step_description": step.description}
-                            )
+                            modified_code = await self._take_speculation(step_idx, step)
+                            if modified_code is None:
+                                modified_code = await self._generate_code(
+                                    lambda on_chunk: self.code_generator.modify(
+                                        existing_code=existing_code, modifications=modifications, analysis=analysis,
+                                        context={"task": self.current_task, "step_description": step.description},
+                                        on_chunk=on_chunk
+                                    ),
+                                    language, relative_file_path, "Generating code modifications based on plan..."
+                                )
                             
                             self.logger.debug(f"Step {step_idx + 1}: modified_code type = '{type(modified_code)}'")
                             self.logger.debug(f"Step {step_idx + 1}: modified_code value = '{modified_code}'")
@@ -1961,7 +2088,8 @@ class Agent:
                             else: # Modification generated
                                 self.logger.debug(f"Step {step_idx + 1}: Reached display_code")
                                 self.cli_ui.display_code(modified_code, language=language, file_path=relative_file_path)
-                                edit_choice = self.cli_ui.ask_edit_confirmation(relative_file_path, action="apply modifications to")
+                                self._start_speculation(step_idx + 1)
+                                edit_choice = await self._ask(self.cli_ui.ask_edit_confirmation, relative_file_path, action="apply modifications to")
                                 # INSERT THE NEW LINE HERE
                                 result = StepResult(status="pending", file=relative_file_path)
                                 self.logger.debug(f"Step {step_idx + 1}: edit_choice = '{edit_choice}'")
@@ -1971,7 +2099,7 @@ class Agent:
                                     if edit_choice == 'edit':
                                         try:
                                             await self.file_manager.write_file(abs_file_path, modified_code)
-                                            self.cli_ui.prompt_manual_edit(abs_file_path)
+                                            await self._ask(self.cli_ui.prompt_manual_edit, abs_file_path)
                                             modified_code = await self.file_manager.read_file(abs_file_path)
                                         except Exception as e:
                                              result = StepResult(status="failed", error=f"Error during manual edit: {e}", file=relative_file_path)
@@ -1987,7 +2115,7 @@ class Agent:
                                             note = "Applied via manual edit" if edit_choice == 'edit' else None
                                             result = StepResult(status="completed", file=relative_file_path, result={"file_hash": file_hash}, note=note)
                                             # Run analysis AFTER successful write
-                                            await self._update_dependencies_and_analyze(relative_file_path, modified_code)
+                                            await self._update_dependencies_and_analyze(relative_file_path, modified_code, priority="background")
                                         except Exception as e:
                                             self.logger.error(f"Error writing modified file {abs_file_path} in step {step_idx+1}: {e}", exc_info=True)
                                             result = StepResult(status="failed", error=f"Failed to write modified file '{relative_file_path}': {e}", file=relative_file_path)
@@ -1998,7 +2126,7 @@ class Agent:
                 elif step.type == "terminal_command":
                     command = step.command
                     self.cli_ui.display_command(command)
-                    if not self.cli_ui.ask_confirmation(f"Execute the above command in '[bold]{self.working_directory}[/]'?"):
+                    if not await self._ask(self.cli_ui.ask_confirmation, f"Execute the above command in '[bold]{self.working_directory}[/]'?"):
                          result = StepResult(status="skipped", note="User chose not to execute command.")
                     else:
                         self.cli_ui.print_thinking(f"Executing: {command}")
@@ -2025,6 +2153,11 @@ class Agent:
                     self.logger.error(f"Reached unknown step type execution block in step {step_idx+1}: {step.type}")
                     result = StepResult(status="failed", error=f"Internal error: Unknown step type '{step.type}'")
 
+            except asyncio.CancelledError:
+                # Ctrl-C (routed to Agent.cancel()) or a deadline: record the step as failed, then let the cancellation through
+                result = StepResult(status="failed", error=f"Step cancelled: {cancellation_reason() or 'interrupted'}")
+                cancelled = True
+                raise
             except Exception as e: # Catch-all for unexpected errors during step execution logic
                  self.logger.error(f"Critical unexpected error executing step {step_idx+1}: {str(e)}", exc_info=True)
                  result = StepResult(status="failed", error=f"Unexpected Agent Error during step execution: {str(e)}")
@@ -2039,8 +2172,108 @@ class Agent:
                 self.execution_state["step_results"][str(step_idx)] = result.__dict__ # Update persistent state store
                 await self._store_execution_state() # Save state after each step attempt
                 self.cli_ui.display_step_result(step_idx, result) # Display result to user
-                return result
+                if not cancelled: # Returning from finally would swallow the cancellation
+                    return result
+
+
+    # --- Speculative generation of the next step ---
+    def _speculation_inputs(self, step: Step) -> Optional[Tuple[Any, ...]]:
+        """Everything a code step's output depends on, or None for steps that are not speculated on"""
+        if step.type not in ("code_generation", "code_modification") or not step.file_path:
+            return None
+        try:
+            abs_path = self.file_manager._resolve_path(step.file_path)
+        except Exception:
+            return None
+        if not abs_path.startswith(os.path.abspath(self.working_directory)):
+            return None
+        return (self.current_task, step.type, step.file_path, step.description, step.requirements, compute_file_hash(abs_path))
+
+    def _start_speculation(self, step_idx: int):
+        """Start generating step_idx's code in the background while the user reviews the step before it"""
+        if not self.speculation.enabled or not self.current_plan or step_idx >= len(self.current_plan.steps):
+            return
+        step = self.current_plan.steps[step_idx]
+        inputs = self._speculation_inputs(step)
+        if inputs is None or (step.type == "code_modification" and not inputs[-1]):
+            return # Nothing to modify yet; the step will report the missing file itself
+        # Bound to the task's scope: outlives this step, but not the task
+        spawn = self._task_scope.spawn if self._task_scope else asyncio.ensure_future
+        self.speculation.start(step_idx, inputs, self._speculative_code(step), spawn)
+
+    async def _speculative_code(self, step: Step) -> Any:
+        """The generate/modify request the step itself would make, without streaming"""
+        abs_path = self.file_manager._resolve_path(step.file_path)
+        with llm_priority("background"): # May be thrown away; never ahead of calls the user is waiting on
+            if step.type == "code_generation":
+                context = {"task": self.current_task, "target_file_path": step.file_path, "step_description": step.description}
+                return await self.code_generator.generate(step.requirements or "Generate code based on context.", context)
+            existing_code = await self.file_manager.read_file(abs_path)
+            analysis = await self.code_analyzer.analyze(existing_code, step.file_path)
+            return await self.code_generator.modify(
+                existing_code=existing_code, modifications=step.requirements or "Modify the code based on the plan and context.",
+                analysis=analysis, context={"task": self.current_task, "step_description": step.description}
+            )
 
+    async def _take_speculation(self, step_idx: int, step: Step) -> Optional[Any]:
+        """Code speculated for this step if its inputs are unchanged, else None (generate as usual)"""
+        if not self.speculation.enabled:
+            return None
+        code = await self.speculation.take(step_idx, self._speculation_inputs(step), lambda result: not isinstance(result, str))
+        if code is not None:
+            self.cli_ui.print_message("Using code generated while the previous step was being reviewed.", style="dim")
+        return code
+
+    async def _ask(self, prompt: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking prompt. While a speculation runs it goes to a worker thread, so the event loop keeps serving
+        the speculation and Ctrl-C. Otherwise it blocks the loop, whose signal handler could not run until the prompt
+        returns: Ctrl-C is handed back to Python for the prompt, and interrupting it cancels the task.
+        """
+        if self.speculation.running:
+            return await asyncio.to_thread(prompt, *args, **kwargs)
+        handled = self._interrupts_handled
+        if handled:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGINT) # Restores Python's KeyboardInterrupt
+        try:
+            return prompt(*args, **kwargs)
+        except KeyboardInterrupt:
+            if not handled or self._task_scope is None:
+                raise
+            handled = self._interrupts_handled = False # Stays with Python's handler: a second Ctrl-C exits
+            self.cli_ui.print_warning("\nCancelling the task (press Ctrl-C again to exit)...")
+            self.cancel("interrupted by user (Ctrl-C)")
+            await asyncio.sleep(0) # The cancellation is delivered here
+            raise OperationCancelled(self._task_scope.reason)
+        finally:
+            if handled:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGINT, self._on_interrupt)
+
+    async def _prefetch_analyses(self, steps: List[Step]):
+        """Warm the Redis analysis cache for files the plan will analyze or modify, batching LLM calls"""
+        if not self.redis:
+            return # Without the cache the per-step analyze() calls could not reuse the results
+        files_by_focus: Dict[str, Dict[str, str]] = {}
+        for step in steps:
+            if step.type not in ("code_modification", "code_analysis") or not step.file_path:
+                continue
+            focus = (step.requirements or "general") if step.type == "code_analysis" else "general"
+            try:
+                abs_path = self.file_manager._resolve_path(step.file_path)
+                if not abs_path.startswith(os.path.abspath(self.working_directory)) or not await self.file_manager.file_exists(abs_path):
+                    continue
+                relative_path = os.path.relpath(abs_path, self.working_directory)
+                files_by_focus.setdefault(focus, {})[relative_path] = await self.file_manager.read_file(abs_path)
+            except Exception as e:
+                self.logger.debug(f"Skipping analysis prefetch for {step.file_path}: {e}")
+        for focus, files in files_by_focus.items():
+            if len(files) < 2:
+                continue # A single file gains nothing from batching; the step analyzes it as before
+            try:
+                with llm_priority("background"): # Only warms the cache; never ahead of calls the user waits on
+                    await self.code_analyzer.analyze_many(files, analysis_focus=focus)
+            except Exception as e:
+                self.logger.warning(f"Analysis prefetch failed for focus '{focus}': {e}")
 
     async def execute_plan_interactive(self, plan: Plan) -> bool:
         """Execute a plan interactively, step by step, supporting resumption."""
@@ -2056,18 +2289,20 @@ class Agent:
         start_index = self.execution_state.get("current_step_index", 0)
         if start_index > 0:
              self.logger.info(f"Attempting to resume plan execution from step {start_index + 1}.")
-             if not self.cli_ui.ask_confirmation(f"Resume execution from step {start_index + 1}? (Choose No to start from beginning)"):
+             if not await self._ask(self.cli_ui.ask_confirmation, f"Resume execution from step {start_index + 1}? (Choose No to start from beginning)"):
                   self.logger.info("User chose not to resume, restarting plan from step 1.")
                   start_index = 0
                   self.execution_state["current_step_index"] = 0
                   self.execution_results = {} # Clear results if not resuming
                   self.execution_state["step_results"] = {}
                   await self._store_execution_state() # Save cleared state
-        elif not self.cli_ui.ask_confirmation("Proceed with executing this plan from the beginning?"):
+        elif not await self._ask(self.cli_ui.ask_confirmation, "Proceed with executing this plan from the beginning?"):
             self.logger.warning("User chose not to execute the plan.")
             self.cli_ui.print_message("Plan execution cancelled by user.", style="yellow")
             return False # Indicate plan was cancelled
 
+        await self._prefetch_analyses(plan.steps[start_index:])
+
         all_steps_succeeded_so_far = True
         for i in range(start_index, len(plan.steps)):
             step = plan.steps[i]
@@ -2078,7 +2313,7 @@ class Agent:
             if step_result.status == "failed":
                 self.logger.warning(f"Step {i+1} failed. Stopping plan execution.")
                 all_steps_succeeded_so_far = False
-                if self.cli_ui.ask_confirmation("A step failed. Attempt to refine the plan and continue?"):
+                if await self._ask(self.cli_ui.ask_confirmation, "A step failed. Attempt to refine the plan and continue?"):
                     self.logger.info("User chose to refine the plan after failure.")
                     # refinement call returns the success status of the *refined* plan execution
                     return await self.refine_and_retry_plan_interactive()
@@ -2125,11 +2360,12 @@ class Agent:
 
             # Call the planner's refine method
             # This method should exist in Planner class and accept these arguments
-            refined_plan_response = await self.planner.refine_plan_with_results(
-                 initial_plan_json=json.dumps(initial_plan_dict, default=str),
-                 results_json=json.dumps(results_dict_for_llm, default=str),
-                 feedback="A step failed during execution. Please revise the plan to fix the issue and achieve the original goal."
-            )
+            with llm_priority("interactive"):
+                refined_plan_response = await self.planner.refine_plan_with_results(
+                     initial_plan_json=json.dumps(initial_plan_dict, default=str),
+                     results_json=json.dumps(results_dict_for_llm, default=str),
+                     feedback="A step failed during execution. Please revise the plan to fix the issue and achieve the original goal."
+                )
 
             # Handle response (string error or dict plan)
             if isinstance(refined_plan_response, str):
@@ -2178,7 +2414,8 @@ class Agent:
 
 
     # --- Dependency & Analysis Helper ---
-    async def _update_dependencies_and_analyze(self, file_path: str, code: Optional[str] = None) -> tuple[Optional[CodeAnalysis], List[str]]:
+    async def _update_dependencies_and_analyze(self, file_path: str, code: Optional[str] = None,
+                                               priority: Optional[str] = None) -> tuple[Optional[CodeAnalysis], List[str]]:
         """Helper to update dependencies and perform basic analysis after file change. Uses relative path."""
         analysis: Optional[CodeAnalysis] = None
         dependencies: List[str] = []
@@ -2219,7 +2456,8 @@ class Agent:
 
                  # Perform Code Analysis using relative path
                  try:
-                     analysis = await self.code_analyzer.analyze(code, relative_path) # Use relative path
+                     with llm_priority(priority): # Post-write analyses run as background work
+                         analysis = await self.code_analyzer.analyze(code, relative_path) # Use relative path
                      self.logger.debug(f"Performed analysis for {relative_path}")
                      # Display only if issues found? Less noise.
                      # self.cli_ui.display_analysis_summary(analysis)
@@ -2261,6 +2499,26 @@ class Agent:
     async def cleanup(self):
         """Perform cleanup actions when the agent exits."""
         self.logger.info("Performing agent cleanup...")
+        self.logger.info(f"LLM response cache stats: {self.llm.response_cache.get_stats()}")
+        self.logger.info(f"LLM JSON parse stats: {self.llm.json_stats}")
+        self.logger.info(f"LLM truncation stats: {self.llm.truncation_stats}")
+        if isinstance(self.llm, ModelRouter):
+            self.logger.info(f"LLM routing stats: {self.llm.get_stats()}")
+        else:
+            self.logger.info(f"LLM hedging stats: {self.llm.hedging.get_stats()}")
+            self.logger.info(f"LLM retry stats: {self.llm.retry.get_stats()}")
+            self.logger.info(f"LLM key pool stats: {self.llm.key_pool.get_stats()}")
+        if self.speculation.enabled:
+            self.logger.info(f"Speculation stats: {self.speculation.get_stats()}")
+        self.logger.info(f"LLM call ledger: {self.llm.ledger.summary()}")
+        if self.redis:
+            self.logger.info(f"Redis round trips: {self.redis.stats}, compression: {self.redis.codec.get_stats()}, "
+                             f"L1 cache: {self.redis.l1.get_stats()}")
+        try:
+            await self.llm.close()
+            self.logger.info("LLM HTTP session closed.")
+        except Exception as e:
+            self.logger.error(f"Error closing LLM HTTP session: {e}")
         if self.redis:
             try:
                 await self.redis.close()
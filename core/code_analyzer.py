@@ -186,15 +186,17 @@
 """
 Code analyzer for the AI Coding Agent with async support and Redis integration
 """
+import asyncio
 import json
 import hashlib
 from typing import Dict, List, Any, Optional
 from adapters.llm_adapter import LLMAdapter
 from adapters.redis_adapter import RedisAdapter
 from config.prompts import PROMPTS
-from utils.schema import CodeAnalysis # Ensure schema is imported
+from utils.schema import CodeAnalysis, CODE_ANALYSIS_SCHEMA, CODE_ANALYSES_SCHEMA # Ensure schema is imported
 from utils.helpers import extract_language_from_path
 from utils.logger import get_logger
+from utils.prompt_budget import PromptBuilder, estimate_tokens
 import time
 import os # Import os for path operations
 
@@ -222,25 +224,12 @@ class CodeAnalyzer:
             language = extract_language_from_path(relative_file_path)
 
         # --- Caching Logic ---
-        cached_analysis = None
+        cache_key = None
         if self.redis and relative_file_path:
-            # Cache key incorporates code hash and focus for more specific caching
-            code_hash = hashlib.sha256(code.encode()).hexdigest()
-            cache_key = f"analysis_cache:{relative_file_path}:{code_hash}:{analysis_focus}"
-            try:
-                 cached_data = await self.redis.get_context(cache_key)
-                 if cached_data and isinstance(cached_data, dict):
-                     self.logger.debug(f"Using cached analysis for {relative_file_path}, Focus: {analysis_focus}")
-                     # Ensure the cached data can be used to create a CodeAnalysis object
-                     try:
-                         cached_analysis = CodeAnalysis(**cached_data)
-                         return cached_analysis # Return cached result
-                     except TypeError as te:
-                          self.logger.warning(f"Cached analysis data mismatch for {cache_key}: {te}. Re-analyzing.")
-                          cached_analysis = None # Invalidate cache if schema mismatch
-            except Exception as e:
-                 self.logger.error(f"Error retrieving cached analysis for {cache_key}: {e}")
-                 cached_analysis = None # Proceed without cache on error
+            cache_key = self._cache_key(relative_file_path, code, analysis_focus)
+            cached_analysis = await self._get_cached_analysis(cache_key)
+            if cached_analysis:
+                return cached_analysis # Return cached result
 
         # --- LLM Analysis ---
         self.logger.debug(f"Performing LLM analysis for {relative_file_path or 'code snippet'}, Focus: {analysis_focus}")
@@ -250,7 +239,8 @@ class CodeAnalyzer:
             analysis_focus=analysis_focus,
         )
 
-        analysis_dict_from_llm = await self.llm.generate(prompt, formated_output="json")
+        analysis_dict_from_llm = await self.llm.generate(prompt, formated_output="json", response_schema=CODE_ANALYSIS_SCHEMA,
+                                                        call_type="analysis")
 
         # Handle potential LLM errors or invalid responses
         if isinstance(analysis_dict_from_llm, dict) and 'error' in analysis_dict_from_llm:
@@ -269,14 +259,128 @@ class CodeAnalyzer:
 
         return validated_analysis
 
+    async def analyze_many(self, files: Dict[str, str], analysis_focus: str = "general",
+                           max_batch_tokens: Optional[int] = None) -> Dict[str, CodeAnalysis]:
+        """
+        Analyze several files with as few LLM calls as possible.
+        Args:
+            files (Dict[str, str]): Relative file path -> code content.
+            analysis_focus (str): Focus applied to every file.
+            max_batch_tokens (Optional[int]): Prompt budget per batch; defaults to the model's prompt budget.
+        Returns:
+            Dict[str, CodeAnalysis]: One analysis per input path. Entries the batched response is missing
+            or got wrong are re-analyzed with single-file calls.
+        """
+        results: Dict[str, CodeAnalysis] = {}
+        pending: Dict[str, str] = {}
+        cache_keys = {file_path: self._cache_key(file_path, code, analysis_focus) for file_path, code in files.items()}
+        cached_data = await self.redis.get_contexts(list(cache_keys.values())) if self.redis else {} # One MGET for all files
+        for file_path, code in files.items():
+            cached = self._cached_analysis(cache_keys[file_path], cached_data.get(cache_keys[file_path]))
+            if cached:
+                results[file_path] = cached
+            else:
+                pending[file_path] = code
+
+        budget = max_batch_tokens or PromptBuilder.for_adapter(self.llm, "analysis").budget
+        batches = self._pack_batches(pending, analysis_focus, budget)
+        self.logger.info(f"Analyzing {len(files)} files: {len(results)} cached, {len(pending)} in {len(batches)} LLM call(s)")
+
+        batch_results = await asyncio.gather(*(self._analyze_batch(batch, analysis_focus) for batch in batches))
+        for batch_result in batch_results:
+            results.update(batch_result)
+        return {file_path: results[file_path] for file_path in files} # Preserve caller order
+
+    def _render_batch_file(self, file_path: str, code: str) -> str:
+        return f"### File: {file_path} ({extract_language_from_path(file_path)})\n```\n{code}\n```"
+
+    def _pack_batches(self, files: Dict[str, str], analysis_focus: str, budget: int) -> List[Dict[str, str]]:
+        """Greedily fill batches up to the token budget; files that do not fit alone get their own batch"""
+        overhead = estimate_tokens(PROMPTS["code_analyzer"]["analyze_many"].format(files="", analysis_focus=analysis_focus))
+        batches: List[Dict[str, str]] = []
+        current: Dict[str, str] = {}
+        used = overhead
+        for file_path, code in files.items():
+            tokens = estimate_tokens(self._render_batch_file(file_path, code))
+            if current and used + tokens > budget:
+                batches.append(current)
+                current, used = {}, overhead
+            current[file_path] = code
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _analyze_batch(self, batch: Dict[str, str], analysis_focus: str) -> Dict[str, CodeAnalysis]:
+        """One LLM call for the whole batch, single-file calls for anything it did not answer properly"""
+        if len(batch) == 1:
+            file_path, code = next(iter(batch.items()))
+            return {file_path: await self.analyze(code, file_path, analysis_focus)}
+
+        prompt = PROMPTS["code_analyzer"]["analyze_many"].format(
+            files="\n\n".join(self._render_batch_file(path, code) for path, code in batch.items()),
+            analysis_focus=analysis_focus,
+        )
+        response = await self.llm.generate(prompt, formated_output="json", response_schema=CODE_ANALYSES_SCHEMA,
+                                         call_type="analysis")
+
+        entries = response.get("analyses") if isinstance(response, dict) else response
+        if isinstance(response, dict) and "error" in response:
+            self.logger.warning(f"Batched analysis failed, falling back to single-file calls: {response['error']}")
+            entries = []
+        elif not isinstance(entries, list):
+            self.logger.warning("Batched analysis returned no 'analyses' array, falling back to single-file calls")
+            entries = []
+
+        results: Dict[str, CodeAnalysis] = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or entry.get("file_path") not in batch or entry["file_path"] in results:
+                continue # Unknown, duplicate or malformed entry
+            file_path = entry["file_path"]
+            analysis = self._validate_analysis(entry, extract_language_from_path(file_path), requested_focus=analysis_focus)
+            results[file_path] = analysis
+        if self.redis and results:
+            async with self.redis.batch(): # Cache every answered file in one round trip
+                for file_path, analysis in results.items():
+                    code = batch[file_path]
+                    await self._store_analysis_in_redis(self._cache_key(file_path, code, analysis_focus), file_path, code, analysis)
+
+        missing = [path for path in batch if path not in results]
+        if missing:
+            self.logger.info(f"Batched analysis missed {len(missing)}/{len(batch)} files; analyzing them individually")
+            singles = await asyncio.gather(*(self.analyze(batch[path], path, analysis_focus) for path in missing))
+            results.update(zip(missing, singles))
+        return results
+
+    def _cache_key(self, file_path: str, code: str, analysis_focus: str) -> str:
+        # Cache key incorporates code hash and focus for more specific caching
+        code_hash = hashlib.sha256(code.encode()).hexdigest()
+        return f"analysis_cache:{file_path}:{code_hash}:{analysis_focus}"
+
+    async def _get_cached_analysis(self, cache_key: str) -> Optional[CodeAnalysis]:
+        """Return the cached analysis for cache_key, or None on a miss or unusable entry"""
+        try:
+             return self._cached_analysis(cache_key, await self.redis.get_context(cache_key))
+        except Exception as e:
+             self.logger.error(f"Error retrieving cached analysis for {cache_key}: {e}")
+        return None # Proceed without cache on miss or error
+
+    def _cached_analysis(self, cache_key: str, cached_data: Any) -> Optional[CodeAnalysis]:
+        """CodeAnalysis from a cache entry, or None when it is missing or unusable"""
+        if cached_data and isinstance(cached_data, dict):
+            self.logger.debug(f"Using cached analysis for {cache_key}")
+            # Ensure the cached data can be used to create a CodeAnalysis object
+            try:
+                return CodeAnalysis(**cached_data)
+            except TypeError as te:
+                self.logger.warning(f"Cached analysis data mismatch for {cache_key}: {te}. Re-analyzing.")
+        return None
+
     async def _store_analysis_in_redis(self, cache_key: str, file_path: str, code: str, analysis: CodeAnalysis):
         """Store analysis results in Redis with proper indexing using relative path."""
         if not self.redis: return
         try:
             analysis_dict = analysis.__dict__ # Convert dataclass to dict for storage
-            # Store using the specific cache key (includes hash and focus)
-            await self.redis.store_context(cache_key, analysis_dict, ttl=3600) # Cache for 1 hour example
-
             # Optionally, update general file metadata (without focus) if needed
             file_hash = hashlib.sha256(code.encode()).hexdigest()
             general_metadata = {
@@ -285,7 +389,10 @@ class CodeAnalyzer:
                 'language': analysis.language,
                 'timestamp': int(time.time())
             }
-            await self.redis.track_file(file_path, general_metadata) # Update general file tracking
+            async with self.redis.batch(): # Both writes in one round trip
+                # Store using the specific cache key (includes hash and focus)
+                await self.redis.store_context(cache_key, analysis_dict, ttl=3600) # Cache for 1 hour example
+                await self.redis.track_file(file_path, general_metadata) # Update general file tracking
 
             # Store code snippet (consider size implications)
             # snippet_hash = hashlib.sha256(code.encode()).hexdigest()
@@ -317,6 +424,13 @@ class CodeAnalyzer:
             "specific_focus_details": analysis_dict.get("specific_focus_details", {})
         }
 
+        # Structured responses carry focus details as [{"key": ..., "value": ...}] pairs
+        details = validated_data["specific_focus_details"]
+        if isinstance(details, list):
+            validated_data["specific_focus_details"] = {
+                item["key"]: item.get("value") for item in details if isinstance(item, dict) and "key" in item
+            }
+
         # Basic type validation (ensure lists/dicts are correct type, fallback to empty)
         if not isinstance(validated_data["imports"], list): validated_data["imports"] = []
         if not isinstance(validated_data["functions"], list): validated_data["functions"] = []
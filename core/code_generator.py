@@ -1,21 +1,27 @@
 """
 Code generator for the AI Coding Agent with async support
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable
 from adapters.llm_adapter import LLMAdapter
 from adapters.redis_adapter import RedisAdapter
 from config.prompts import PROMPTS
-from utils.helpers import format_code, extract_language_from_path
+from utils.helpers import format_code, extract_language_from_path, check_syntax
 from utils.schema import CodeAnalysis
-import json
+from utils.prompt_budget import PromptBuilder, PromptPart, estimate_tokens
+from utils.logger import get_logger
 
 class CodeGenerator:
     def __init__(self, llm_adapter: LLMAdapter, redis_adapter: Optional[RedisAdapter] = None):
         self.llm = llm_adapter
         self.redis = redis_adapter
+        self.logger = get_logger(__name__)
+        # One budget per call type: a ModelRouter may send generate and modify calls to different models
+        self.prompt_builders = {call_type: PromptBuilder.for_adapter(llm_adapter, call_type) for call_type in ("generate", "modify")}
+        self.last_prompt_report: Optional[Dict[str, Any]] = None # Tokens per section of the latest prompt
         
-    async def generate(self, requirements: str, context: Optional[Dict[str, Any]] = None) -> str:
-        """Generate code with enhanced context awareness"""
+    async def generate(self, requirements: str, context: Optional[Dict[str, Any]] = None,
+                       on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """Generate code with enhanced context awareness. If on_chunk is given, the response is streamed through it."""
         # Get additional context from Redis if available
         redis_context = {}
         if self.redis and context and context.get("task_id"):
@@ -30,28 +36,34 @@ class CodeGenerator:
                 if similar_snippets:
                     redis_context["similar_code"] = similar_snippets
         
-        full_context = {
-            **(context or {}),
-            **redis_context
-        }
+        # Caller context outranks anything recalled from Redis; similar code is trimmed first
+        parts = [PromptPart("context", key, value, priority=60) for key, value in (context or {}).items()]
+        if "task" in redis_context:
+            parts.append(PromptPart("context", "task", redis_context["task"], priority=40))
+        if "similar_code" in redis_context:
+            parts.append(PromptPart("context", "similar_code", redis_context["similar_code"], priority=10))
         
-        prompt = PROMPTS["code_generator"]["generate"].format(
-            requirements=requirements,
-            context=json.dumps(full_context, indent=2) if full_context else "No additional context"
+        prompt = self._build_prompt(
+            "generate",
+            PROMPTS["code_generator"]["generate"],
+            {"requirements": requirements},
+            parts,
+            {"context": "No additional context"}
         )
         
-        code = await self.llm.generate(prompt, formated_output="code")
-        
         # Determine the language from context or requirements
         language = "unknown"
         if context and "file_path" in context:
             language = extract_language_from_path(context["file_path"])
         
+        code = await self._request_code(prompt, on_chunk, call_type="generate", language=language)
+        
         # Format the code according to language conventions
         return format_code(code, language)
     
-    async def modify(self, existing_code: str, modifications: str, analysis: Optional[CodeAnalysis] = None, context: Optional[Dict[str, Any]] = None) -> str:
-        """Modify existing code with full context awareness"""
+    async def modify(self, existing_code: str, modifications: str, analysis: Optional[CodeAnalysis] = None, context: Optional[Dict[str, Any]] = None,
+                     on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """Modify existing code with full context awareness. If on_chunk is given, the response is streamed through it."""
         # Get additional context from Redis if available
         redis_context = {}
         if self.redis and isinstance(analysis, CodeAnalysis) and hasattr(analysis, "file_path"):
@@ -65,41 +77,66 @@ class CodeGenerator:
             if related_snippets:
                 redis_context["related_code"] = related_snippets
         
-            # Now handle context here if available
-        if context:
-            redis_context.update(context)
-        
-        # Convert CodeAnalysis object to dictionary if needed
-        analysis_str = ""
+        # The existing code and the requested change are never trimmed; analysis and context are
+        parts = []
         if analysis:
             if isinstance(analysis, CodeAnalysis):
-                analysis_dict = {
-                    "language": analysis.language,
-                    "imports": analysis.imports,
-                    "functions": analysis.functions,
-                    "classes": analysis.classes,
-                    "main_flow": analysis.main_flow,
-                    "issues": analysis.issues,
-                    "uses_async": analysis.uses_async,
-                    **redis_context
-                }
-                analysis_str = f"Code Analysis: {json.dumps(analysis_dict, indent=2)}"
+                # Signatures and issues are what the model needs most; the flow summary can be cut
+                parts.extend([
+                    PromptPart("analysis", "language", analysis.language, priority=90),
+                    PromptPart("analysis", "imports", analysis.imports, priority=70),
+                    PromptPart("analysis", "functions", analysis.functions, priority=70, droppable=False),
+                    PromptPart("analysis", "classes", analysis.classes, priority=70, droppable=False),
+                    PromptPart("analysis", "main_flow", analysis.main_flow, priority=50),
+                    PromptPart("analysis", "issues", analysis.issues, priority=80),
+                    PromptPart("analysis", "uses_async", analysis.uses_async, priority=90),
+                ])
             else:
-                analysis_str = f"Code Analysis: {analysis}"
+                parts.append(PromptPart("analysis", "analysis", str(analysis), priority=50))
+        if "file_history" in redis_context:
+            parts.append(PromptPart("analysis", "file_history", redis_context["file_history"], priority=20))
+        if "related_code" in redis_context:
+            parts.append(PromptPart("analysis", "related_code", redis_context["related_code"], priority=10))
+        parts.extend(PromptPart("context", key, value, priority=60) for key, value in (context or {}).items())
         
-        prompt = PROMPTS["code_generator"]["modify"].format(
-            existing_code=existing_code,
-            modifications=modifications,
-            analysis=analysis_str,
-            language=analysis.language if isinstance(analysis, CodeAnalysis) else "unknown",
-            context=context if context else "No additional context"
+        prompt = self._build_prompt(
+            "modify",
+            PROMPTS["code_generator"]["modify"],
+            {
+                "existing_code": existing_code,
+                "modifications": modifications,
+                "language": analysis.language if isinstance(analysis, CodeAnalysis) else "unknown",
+            },
+            parts,
+            {"analysis": "", "context": "No additional context"}
         )
         
-        modified_code = await self.llm.generate(prompt, formated_output="code")
-        
+        # The rewrite is at least as long as the file; size the output limit so it is not cut off
+        max_output_tokens = self.llm.size_output_tokens(estimate_tokens(existing_code))
         # Format the code according to language conventions
         language = "unknown"
         if analysis and hasattr(analysis, "language"):
             language = analysis.language
         
-        return format_code(modified_code, language)
\ No newline at end of file
+        modified_code = await self._request_code(prompt, on_chunk, max_output_tokens, call_type="modify", language=language)
+        
+        return format_code(modified_code, language)
+
+    def _build_prompt(self, call_type: str, template: str, required: Dict[str, str], parts: List[PromptPart],
+                      empty_text: Dict[str, str]) -> str:
+        """Assemble a prompt within the token budget of the model serving call_type and remember the per-section report"""
+        built = self.prompt_builders[call_type].build(template, required, parts, empty_text)
+        self.last_prompt_report = built.report()
+        self.logger.info(f"Code prompt ~{built.total_tokens} tokens (budget {built.budget}): {built.section_tokens}")
+        return built.prompt
+
+    async def _request_code(self, prompt: str, on_chunk: Optional[Callable[[str], None]] = None,
+                            max_output_tokens: Optional[int] = None, call_type: Optional[str] = None,
+                            language: str = "unknown"):
+        """Request code from the LLM, streaming chunks to on_chunk when provided; code that does not parse is escalated"""
+        validate = lambda code: check_syntax(code, language)
+        if on_chunk:
+            return await self.llm.generate_streaming(prompt, formated_output="code", on_chunk=on_chunk,
+                                                     max_output_tokens=max_output_tokens, call_type=call_type, validate=validate)
+        return await self.llm.generate(prompt, formated_output="code", max_output_tokens=max_output_tokens,
+                                       call_type=call_type, validate=validate)
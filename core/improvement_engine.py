@@ -1,6 +1,7 @@
 """
 Continuous improvement engine with quality metrics and refinement loop
 """
+import asyncio
 import json
 import time
 from typing import Dict, List, Optional
@@ -43,7 +44,7 @@ class ImprovementEngine:
             historical_metrics=json.dumps(historical_metrics) if historical_metrics else "No historical metrics available"
         )
         
-        metrics = await self.llm.generate(prompt, formated_output="json")
+        metrics = await self.llm.generate(prompt, formated_output="json", call_type="improvement")
         
         # Store metrics in Redis if we have a file path
         if self.redis and hasattr(analysis, 'file_path'):
@@ -77,16 +78,17 @@ class ImprovementEngine:
         # Get previous improvement plans from Redis
         previous_plans = []
         if self.redis and hasattr(analysis, 'file_path'):
-            previous_plans = await self.redis.search_context(f"improve:{analysis.file_path}:*")
+            previous_plans = await self.redis.search_context(f"improvement:{analysis.file_path}")
         
         # Get similar files' improvement plans
         similar_improvements = []
         if self.redis and hasattr(analysis, 'file_path'):
             file_metadata = await self.redis.get_file_metadata(analysis.file_path)
             if file_metadata and 'similar_files' in file_metadata:
-                for similar_file in file_metadata['similar_files']:
-                    similar_plans = await self.redis.search_context(f"improve:{similar_file}:*")
-                    similar_improvements.extend(similar_plans)
+                similar_plans = await asyncio.gather(*(self.redis.search_context(f"improvement:{similar_file}")
+                                                       for similar_file in file_metadata['similar_files']))
+                for plans in similar_plans:
+                    similar_improvements.extend(plans)
         
         prompt = PROMPTS.get("improvement", {}).get("improvement_plan", "").format(
             code=code,
@@ -97,7 +99,7 @@ class ImprovementEngine:
             similar_improvements=json.dumps(similar_improvements) if similar_improvements else "No similar improvements found"
         )
         
-        return await self.llm.generate(prompt, formated_output="json")
+        return await self.llm.generate(prompt, formated_output="json", call_type="improvement")
         
     async def refine_code(self, code: str, improvement_plan: List[Dict], context: Dict = None) -> str:
         """Refine code with full context awareness"""
@@ -127,7 +129,7 @@ class ImprovementEngine:
             code=code
         )
         
-        refined_code = await self.llm.generate(prompt, formated_output="code")
+        refined_code = await self.llm.generate(prompt, formated_output="code", call_type="improvement")
         
         # Store the refinement in Redis if we have a file path
         if self.redis and context.get('file_path'):
@@ -137,10 +137,17 @@ import logging # Import logging
 from typing import Dict, List, Any, Optional, Union
 from adapters.llm_adapter import LLMAdapter
 from adapters.redis_adapter import RedisAdapter
-from utils.schema import Plan, Step
+from utils.schema import Plan, Step, PLAN_RESPONSE_SCHEMA
+from utils.json_scanner import iter_json
 from config.prompts import PROMPTS
 from utils.logger import get_logger
 
+# Appended to create_plan in structured-output mode, where a bare conversational string is not possible
+STRUCTURED_REPLY_NOTE = (
+    "\n\nIf Case 2 applies, put your conversational answer in \"reply\" and return empty \"files\" and \"steps\"."
+)
+CONVERSATIONAL_FALLBACK = "I can help with coding tasks. Please describe what you'd like me to build, analyze, or modify."
+
 class Planner:
     def __init__(self, llm_adapter: LLMAdapter, redis_adapter: Optional[RedisAdapter] = None):
         self.llm = llm_adapter
@@ -162,8 +169,13 @@ class Planner:
         )
 
         # Generate response using LLM
-        # Let the LLM decide whether to return JSON plan or conversational string based on the prompt instructions
-        llm_response = await self.llm.generate(prompt, formated_output=None) # Get raw response first
+        if getattr(self.llm, "structured_output", False):
+            # Schema-constrained: the adapter returns a validated dict; conversational answers arrive in "reply"
+            prompt += STRUCTURED_REPLY_NOTE
+            llm_response = await self.llm.generate(prompt, response_schema=PLAN_RESPONSE_SCHEMA, call_type="plan")
+        else:
+            # Let the LLM decide whether to return JSON plan or conversational string based on the prompt instructions
+            llm_response = await self.llm.generate(prompt, formated_output=None, call_type="plan") # Get raw response first
 
         # --- Response Processing ---
         if not llm_response or isinstance(llm_response, dict) and 'error' in llm_response:
@@ -173,15 +185,22 @@ class Planner:
 
         # Try parsing as JSON (plan)
         try:
-            # Attempt to find JSON block even if there's surrounding text (more robust)
-            json_start = llm_response.find('{')
-            json_end = llm_response.rfind('}') + 1
             plan_json = None
-            if json_start != -1 and json_end > json_start:
-                 plan_json_str = llm_response[json_start:json_end]
-                 try:
-                      plan_json = json.loads(plan_json_str)
-                 except json.JSONDecodeError:
+            if isinstance(llm_response, dict):
+                 # Structured response, already parsed and validated against the Plan schema
+                 if not llm_response.get("steps"):
+                      self.logger.info("Planner replied conversationally (structured response without steps).")
+                      return (llm_response.get("reply") or CONVERSATIONAL_FALLBACK).strip()
+                 plan_json = llm_response
+                 plan_json_str = llm_response = json.dumps(plan_json)
+            else:
+                 # Find the plan object even if there's surrounding text: the first object with steps, else the first object
+                 objects = [match for match in iter_json(llm_response) if isinstance(match.value, dict)]
+                 match = next((m for m in objects if "steps" in m.value), objects[0] if objects else None)
+                 if match is not None:
+                      plan_json_str = llm_response[match.start:match.end]
+                      plan_json = match.value
+                 elif '{' in llm_response:
                       self.logger.warning(f"Found JSON-like structure but failed to parse. Treating as conversational. Response: {llm_response[:200]}...")
                       # Fall through to treat as conversational
 
@@ -253,7 +272,8 @@ class Planner:
                  feedback=feedback
              )
              # Use formated_output="json" as refine_plan prompt specifically requests JSON
-             refined_plan_response = await self.llm.generate(prompt, formated_output="json")
+             refined_plan_response = await self.llm.generate(prompt, formated_output="json", response_schema=PLAN_RESPONSE_SCHEMA,
+                                                             call_type="refine")
 
              # Check for LLM errors
              if isinstance(refined_plan_response, dict) and 'error' in refined_plan_response:
@@ -0,0 +1,73 @@
+"""
+Speculative step execution.
+While the user reviews step N, code for step N+1 is generated in the background. The speculation records the
+inputs it was generated from (step definition, target file contents); when step N+1 starts, the result is used
+only if those inputs are unchanged, e.g. step N did not write, and the user did not hand-edit, that file.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Dict, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class Speculation:
+    step_idx: int
+    inputs: Tuple[Any, ...]
+    task: asyncio.Task
+
+class SpeculativeSteps:
+    """At most one step generated ahead of the one under review"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._current: Optional[Speculation] = None
+        self.stats = {"started": 0, "used": 0, "discarded": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._current is not None and not self._current.task.done()
+
+    def start(self, step_idx: int, inputs: Tuple[Any, ...], coro: Coroutine[Any, Any, Any],
+              spawn: Callable[[Coroutine[Any, Any, Any]], asyncio.Task] = asyncio.ensure_future):
+        """Start coro for step_idx unless that step is already being speculated on (spawn binds it to a cancel scope)"""
+        if self._current is not None and self._current.step_idx == step_idx and self._current.inputs == inputs:
+            coro.close()
+            return
+        self.discard("superseded")
+        self._current = Speculation(step_idx, inputs, spawn(coro))
+        self.stats["started"] += 1
+        logger.debug(f"Speculatively generating step {step_idx + 1}")
+
+    async def take(self, step_idx: int, inputs: Tuple[Any, ...], is_error: Callable[[Any], bool]) -> Optional[Any]:
+        """The speculated result for step_idx if its inputs still match and it succeeded; None to generate normally"""
+        speculation, self._current = self._current, None
+        if speculation is None:
+            return None
+        if speculation.step_idx != step_idx or speculation.inputs != inputs:
+            self._drop(speculation, "inputs changed")
+            return None
+        await asyncio.wait({speculation.task}) # Waiting on the task directly would raise its cancellation in the caller
+        if speculation.task.cancelled() or speculation.task.exception() is not None or is_error(speculation.task.result()):
+            self.stats["failed"] += 1
+            logger.info(f"Speculative result for step {step_idx + 1} failed; generating normally")
+            return None
+        self.stats["used"] += 1
+        return speculation.task.result()
+
+    def discard(self, reason: str):
+        """Drop (and cancel) the current speculation"""
+        speculation, self._current = self._current, None
+        if speculation is not None:
+            self._drop(speculation, reason)
+
+    def _drop(self, speculation: Speculation, reason: str):
+        speculation.task.cancel()
+        self.stats["discarded"] += 1
+        logger.info(f"Discarded speculative result for step {speculation.step_idx + 1}: {reason}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        finished = self.stats["used"] + self.stats["discarded"] + self.stats["failed"]
+        return {**self.stats, "hit_rate": round(self.stats["used"] / finished, 3) if finished else 0.0}
@@ -219,17 +219,8 @@ async def main_async():
         logger.info(f"Overriding LLM model with: {args.model}")
 
 
-    # Check for API Key
-    if "llm" not in config: config["llm"] = {} # Ensure llm config section exists
-    if not config.get("llm", {}).get("api_key"):
-         api_key_env = os.environ.get("GEMINI_API_KEY")
-         if api_key_env:
-             config["llm"]["api_key"] = api_key_env
-             logger.info("GEMINI_API_KEY found in environment variables.")
-         else:
-            cli_ui.print_error("GEMINI_API_KEY not found in config or environment variables. Please set it.")
-            logger.error("GEMINI_API_KEY missing.")
-            return
+    # API keys: llm.api_key / llm.api_keys, or GEMINI_API_KEY / GEMINI_API_KEYS (applied by load_config).
+    # Without one, the LLM adapter raises and the agent reports it below.
 
     # Initialize agent
     try:
@@ -250,6 +241,11 @@ async def main_async():
                 cli_ui.print_message("Exiting agent. Goodbye!", style="bold green")
                 logger.info("User requested exit.")
                 break
+            if task.split()[0] == "/calls":
+                # LLM call ledger: the current (last) task, a given task_id, or "all"
+                query = task.split()[1] if len(task.split()) > 1 else agent.task_id
+                cli_ui.display_llm_calls(agent.llm.ledger.report(None if query == "all" else query))
+                continue
 
             # Run the agent for the given task
             cli_ui.print_message(f"\nStarting task: [bold yellow]{task[:100]}...[/]", style="bold blue")
@@ -263,7 +259,13 @@ async def main_async():
             cli_ui.print_message("\nTask processing complete. Ready for next task.", style="bold green")
             logger.info("Agent finished task processing.")
 
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Ctrl-C during a task cancels only that task (Agent.cancel()); a second one, or one at the task
+            # prompt, reaches here: asyncio.run turns it into cancellation of this task, which has already
+            # stopped the agent's in-flight LLM requests, Redis commands and terminal processes
+            current = asyncio.current_task()
+            if current is not None and hasattr(current, "uncancel"):
+                current.uncancel() # Let cleanup below run to completion
             cli_ui.print_message("\n\nExecution interrupted by user. Exiting.", style="bold red")
             logger.warning("Execution interrupted by user (KeyboardInterrupt).")
             break
@@ -284,6 +286,8 @@ def main():
     """Synchronous entry point that calls the async main function."""
     try:
         asyncio.run(main_async())
+    except KeyboardInterrupt:
+        pass # Ctrl-C: main_async has already cleaned up
     except Exception as e:
         # Fallback logging if setup failed or happens outside async loop
         print(f"[MAIN CRITICAL ERROR] An unexpected error occurred: {e}", file=sys.stderr)
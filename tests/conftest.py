@@ -0,0 +1,36 @@
+import pytest
+from adapters.llm_adapter import LLMAdapter
+from adapters.llm_stub_server import StubLLMServer
+
+UNLIMITED = {"requests_per_minute": 60000, "burst": 1000} # Keeps the rate limiter out of the way
+
+
+@pytest.fixture
+async def stub_server():
+    """Start StubLLMServers for a test (optionally with a scripted handler); all are stopped afterwards"""
+    servers = []
+
+    async def start(handler=None, **options):
+        server = await StubLLMServer(handler=handler, **options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        await server.stop()
+
+
+@pytest.fixture
+async def make_llm_adapter(request):
+    """Build LLMAdapters with an unlimited rate limit; all are closed afterwards"""
+    adapters = []
+
+    def make(api_url, **config):
+        # A key per test gives every test its own shared rate limiter
+        adapter = LLMAdapter({"api_key": f"test-{request.node.name}", "api_url": api_url, "rate_limit": UNLIMITED, **config})
+        adapters.append(adapter)
+        return adapter
+
+    yield make
+    for adapter in adapters:
+        await adapter.close()
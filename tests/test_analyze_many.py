@@ -0,0 +1,92 @@
+import contextlib
+import json
+import pytest
+from core.code_analyzer import CodeAnalyzer
+
+FILES = {
+    "app/a.py": "import os\n\ndef a():\n    return os.getcwd()\n",
+    "app/b.py": "async def b():\n    return 1\n",
+    "app/c.py": "class C:\n    pass\n",
+}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get_context(self, key):
+        return self.store.get(key)
+
+    async def get_contexts(self, keys):
+        return {key: self.store.get(key) for key in keys}
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        yield
+
+    async def store_context(self, key, value, ttl=None):
+        self.store[key] = json.loads(json.dumps(value))
+        return True
+
+    async def track_file(self, file_path, metadata):
+        return True
+
+
+class FakeLLM:
+    model = "gemini-2.0-flash"
+    max_output_tokens = 4000
+    config = {}
+
+    def __init__(self, batch_response=None):
+        self.batch_response = batch_response
+        self.prompts = []
+
+    async def generate(self, prompt, formated_output=None, response_schema=None, call_type=None):
+        self.prompts.append(prompt)
+        if "### File:" in prompt:
+            if self.batch_response is not None:
+                return self.batch_response
+            paths = [line.split("### File: ")[1].rsplit(" (", 1)[0] for line in prompt.splitlines() if "### File: " in line]
+            return {"analyses": [{"file_path": path, "language": "python", "main_flow": f"batch {path}"} for path in paths]}
+        return {"language": "python", "main_flow": "single"}
+
+
+@pytest.mark.asyncio
+async def test_analyze_many_uses_one_call_and_fills_cache():
+    llm, redis = FakeLLM(), FakeRedis()
+    analyzer = CodeAnalyzer(llm, redis)
+    results = await analyzer.analyze_many(FILES)
+    assert list(results) == list(FILES)
+    assert len(llm.prompts) == 1
+    assert results["app/b.py"].main_flow == "batch app/b.py"
+    assert len([key for key in redis.store if key.startswith("analysis_cache:")]) == 3
+
+    # The per-file cache now serves the single-file API without another call
+    single = await analyzer.analyze(FILES["app/c.py"], "app/c.py")
+    assert single.main_flow == "batch app/c.py"
+    assert len(llm.prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_and_malformed_entries_fall_back_to_single_calls():
+    llm = FakeLLM(batch_response={"analyses": [
+        {"file_path": "app/a.py", "language": "python", "main_flow": "batch"},
+        "not an object",
+        {"file_path": "app/unknown.py", "language": "python"},
+    ]})
+    results = await CodeAnalyzer(llm).analyze_many(FILES)
+    assert results["app/a.py"].main_flow == "batch"
+    assert results["app/b.py"].main_flow == "single"
+    assert results["app/c.py"].main_flow == "single"
+    assert len(llm.prompts) == 3 # One batch + two fallbacks
+
+
+@pytest.mark.asyncio
+async def test_batches_respect_token_budget():
+    llm = FakeLLM()
+    analyzer = CodeAnalyzer(llm)
+    assert analyzer._pack_batches({}, "general", 10**6) == []
+    batches = analyzer._pack_batches(FILES, "general", 1)
+    assert [len(batch) for batch in batches] == [1, 1, 1] # Every file still gets analyzed
+    results = await analyzer.analyze_many(FILES, max_batch_tokens=1)
+    assert len(results) == 3 and len(llm.prompts) == 3
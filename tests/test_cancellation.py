@@ -0,0 +1,188 @@
+import asyncio
+import os
+import signal
+import time
+import pytest
+from aiohttp import web
+from adapters.llm_adapter import LLMAdapter
+from adapters.retry import RetryPolicy
+from adapters.terminal_adapter import TerminalAdapter
+from core.agent import Agent
+from utils.cli_ui import CLI_UI
+from utils.cancellation import CancelScope, DeadlineExceeded, OperationCancelled, cancellation_reason, time_remaining
+
+UNLIMITED = {"requests_per_minute": 60000, "burst": 1000, "initial_concurrency": 2}
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_the_operation():
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        async with CancelScope(timeout=0.05, name="slow step"):
+            assert 0 < time_remaining() <= 0.05
+            assert time_remaining(0.01) == 0.01
+            await asyncio.sleep(5)
+    assert time.monotonic() - start < 1
+    assert time_remaining(30) == 30 # No scope outside
+
+
+@pytest.mark.asyncio
+async def test_cancel_from_another_task_reaches_nested_work():
+    async with CancelScope(timeout=10) as outer:
+        async with CancelScope(timeout=60) as inner:
+            assert inner.deadline == outer.deadline # Never later than the enclosing scope
+
+    scope = CancelScope(name="task")
+    seen = []
+
+    async def operation():
+        try:
+            async with scope:
+                child = scope.spawn(asyncio.sleep(5))
+                async with CancelScope(name="step"):
+                    try:
+                        await asyncio.sleep(5)
+                    except asyncio.CancelledError:
+                        seen.append(cancellation_reason())
+                        raise
+        except OperationCancelled as e:
+            await asyncio.sleep(0)
+            seen.append(child.cancelled())
+            return e.reason
+
+    task = asyncio.create_task(operation())
+    await asyncio.sleep(0.01)
+    scope.cancel("user pressed cancel")
+    assert await task == "user pressed cancel"
+    assert seen == ["user pressed cancel", True]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_llm_request_frees_its_rate_limit_slot():
+    started, finished = asyncio.Event(), asyncio.Event()
+
+    async def handler(request):
+        started.set()
+        await finished.wait() # Far past the point where the caller gives up
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post("/v1/models/{model}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    adapter = LLMAdapter({
+        "api_key": "test-cancel", "model": "cancel-model", "temperature": 0,
+        "api_url": f"http://127.0.0.1:{port}/v1/models/cancel-model:generateContent",
+        "rate_limit": UNLIMITED, "cache": {"enabled": False},
+    })
+    scope = CancelScope(name="task")
+
+    async def call():
+        async with scope:
+            return await adapter.generate("Say hi")
+
+    try:
+        task = asyncio.create_task(call())
+        await started.wait()
+        assert adapter.rate_limiter.in_flight == 1
+        start = time.monotonic()
+        scope.cancel("user pressed Ctrl-C")
+        with pytest.raises(OperationCancelled):
+            await task
+        assert time.monotonic() - start < 1
+        assert adapter.rate_limiter.in_flight == 0
+        assert adapter.single_flight.in_flight() == 0
+    finally:
+        finished.set()
+        await adapter.close()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_terminal_command_is_killed_on_deadline_and_cancel(tmp_path):
+    terminal = TerminalAdapter()
+    start = time.monotonic()
+    result = await terminal.execute("sleep 5", cwd=str(tmp_path), timeout=0.2)
+    assert not result["success"] and "timed out" in result["error"]
+    assert time.monotonic() - start < 2
+
+    marker = tmp_path / "marker"
+    scope = CancelScope(name="step")
+
+    async def run():
+        async with scope:
+            await terminal.execute("sleep 0.5 && touch marker", cwd=str(tmp_path))
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(0.1)
+    scope.cancel("user answered cancel")
+    with pytest.raises(OperationCancelled):
+        await task
+    await asyncio.sleep(0.6)
+    assert not marker.exists() # The shell's child was killed with it
+
+
+def test_retry_does_not_back_off_past_the_deadline():
+    policy = RetryPolicy({"base_delay": 1, "max_delay": 1})
+    policy.backoff = lambda attempt: 1.0
+
+    async def inside_scope():
+        async with CancelScope(timeout=0.5):
+            return policy.next_delay(0, started=time.monotonic())
+
+    assert policy.next_delay(0, started=time.monotonic()) == 1.0
+    assert asyncio.run(inside_scope()) is None
+
+
+@pytest.mark.asyncio
+async def test_ctrl_c_cancels_the_running_task(tmp_path):
+    agent = Agent({"llm": {"api_key": "offline", "rate_limit": UNLIMITED, "cache": {"enabled": False}},
+                   "working_directory": str(tmp_path)}, CLI_UI())
+
+    async def run(task):
+        os.kill(os.getpid(), signal.SIGINT)
+        await asyncio.sleep(5)
+    agent._run_interactive = run
+    start = time.monotonic()
+    try:
+        results = await agent.run_interactive("anything")
+    finally:
+        await agent.cleanup()
+    assert results["cancelled"] == "interrupted by user (Ctrl-C)" and time.monotonic() - start < 1
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler # A second Ctrl-C exits as before
+
+
+class InterruptedUI(CLI_UI):
+    """A prompt the user answers with Ctrl-C: blocks the event loop thread, as input() does"""
+    def __init__(self):
+        super().__init__()
+        self.prompts = 0
+
+    def ask_confirmation(self, message, default=True):
+        self.prompts += 1
+        os.kill(os.getpid(), signal.SIGINT)
+        time.sleep(5)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_ctrl_c_at_a_blocking_prompt_cancels_the_task(tmp_path):
+    ui = InterruptedUI()
+    agent = Agent({"llm": {"api_key": "offline", "rate_limit": UNLIMITED, "cache": {"enabled": False}},
+                   "working_directory": str(tmp_path)}, ui)
+    reached = []
+
+    async def run(task):
+        await agent._ask(ui.ask_confirmation, "Proceed with executing this plan from the beginning?")
+        reached.append("after the prompt")
+    agent._run_interactive = run
+    start = time.monotonic()
+    try:
+        results = await agent.run_interactive("anything")
+    finally:
+        await agent.cleanup()
+    assert results["cancelled"] == "interrupted by user (Ctrl-C)" and time.monotonic() - start < 1
+    assert ui.prompts == 1 and reached == []
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler # A second Ctrl-C exits
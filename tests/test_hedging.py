@@ -0,0 +1,107 @@
+import asyncio
+import json
+import pytest
+from aiohttp import web
+from adapters.hedging import HedgePolicy
+from adapters.llm_adapter import LLMAdapter
+
+UNLIMITED = {"requests_per_minute": 60000, "burst": 1000, "initial_concurrency": 8}
+
+
+def primed(**config):
+    policy = HedgePolicy({"enabled": True, "min_samples": 5, "min_delay": 0.05, **config})
+    for _ in range(10):
+        policy.record(0.01)
+    return policy
+
+
+def is_error(result):
+    return isinstance(result, dict) and "error" in result
+
+
+def test_no_hedging_without_baseline_or_when_disabled():
+    assert HedgePolicy({"enabled": True, "min_samples": 5}).hedge_delay() is None
+    assert primed(enabled=False).hedge_delay() is None
+    policy = primed(min_delay=0.0, percentile=80)
+    for latency in (0.1, 0.2, 0.3):
+        policy.record(latency)
+    assert policy.hedge_delay() == 0.1 # Nearest-rank p80 of 13 samples is the 11th
+    assert policy.latency_percentile(99) == 0.3
+    assert policy.latency_percentile(50) == 0.01
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_loser_cancelled():
+    policy = primed()
+    calls, cancelled = [], []
+
+    async def attempt():
+        calls.append(len(calls))
+        try:
+            await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return {"answer": len(calls)}
+
+    result = await policy.run(attempt, is_error)
+    assert len(calls) == 2 and result == {"answer": 2}
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+    assert policy.stats["hedged"] == 1 and policy.stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged_and_errors_fall_through():
+    policy = primed()
+    ok = await policy.run(lambda: asyncio.sleep(0, {"answer": 1}), is_error)
+    failed = await policy.run(lambda: asyncio.sleep(0, {"error": "boom"}), is_error)
+    assert ok == {"answer": 1} and failed == {"error": "boom"}
+    assert policy.stats["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_budget_and_limiter_cap_hedges():
+    policy = primed(max_hedge_ratio=0.0, burst=1, percentile=50) # The median stays at the 0.05s floor
+    slow = lambda: asyncio.sleep(0.1, {"answer": 1})
+    await policy.run(slow, is_error)
+    await policy.run(slow, is_error)
+    assert policy.stats["hedged"] == 1 and policy.stats["budget_denied"] == 1
+
+    busy = primed()
+    await busy.run(slow, is_error, can_hedge=lambda: False)
+    assert busy.stats["hedged"] == 0 and busy.stats["limiter_denied"] == 1
+
+
+@pytest.mark.asyncio
+async def test_adapter_hedges_slow_generate_content():
+    seen = []
+
+    async def handler(request):
+        seen.append(await request.json())
+        if len(seen) == 1:
+            await asyncio.sleep(2) # The straggler
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": f"answer {len(seen)}"}]},
+                                                   "finishReason": "STOP"}]})
+
+    app = web.Application()
+    app.router.add_post("/v1/models/{model}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    adapter = LLMAdapter({
+        "api_key": "test-hedging", "model": "hedge-model", "temperature": 0,
+        "api_url": f"http://127.0.0.1:{port}/v1/models/hedge-model:generateContent",
+        "rate_limit": UNLIMITED, "cache": {"enabled": False},
+        "hedging": {"enabled": True, "min_samples": 1, "min_delay": 0.1},
+    })
+    adapter.hedging.record(0.05)
+    try:
+        assert await adapter.generate("Say hi") == "answer 2"
+        assert len(seen) == 2 and json.dumps(seen[0]) == json.dumps(seen[1])
+        stats = adapter.hedging.get_stats()
+        assert stats["hedge_wins"] == 1 and stats["hedge_rate"] == 1.0
+    finally:
+        await adapter.close()
+        await runner.cleanup()
@@ -0,0 +1,58 @@
+import json
+import pytest
+from adapters.llm_adapter import LLMAdapter
+from core.planner import Planner
+from utils.json_scanner import JSONScanner, find_json, iter_json
+from utils.schema import Plan
+
+PLAN = {"understanding": "Add {name} support", "files": ["a.py"],
+        "steps": [{"type": "code_generation", "description": "Write a \"}\" ``` [1] helper\\", "file_path": "a.py"}]}
+
+RESPONSES = [
+    json.dumps(PLAN),
+    f"Sure! Here it is:\n```json\n{json.dumps(PLAN, indent=2)}\n```\nAnything else?",
+    f"Replace {{name}} and see [1], then: {json.dumps(PLAN)} (done}}",
+    "```\n[1, 2, {\"a\": \"]\"}]\n```",
+]
+
+
+def test_first_balanced_value_is_found_in_one_pass():
+    bare, fenced, prose, array = (find_json(text) for text in RESPONSES)
+    assert bare.value == PLAN and bare.kind(RESPONSES[0]) == "direct"
+    assert fenced.value == PLAN and fenced.kind(RESPONSES[1]) == "markdown"
+    assert prose.value == PLAN and prose.kind(RESPONSES[2]) == "braces" # "{name}" and "[1]" are skipped
+    assert array.value == [1, 2, {"a": "]"}]
+    assert find_json("see [1] and [2] for details") is None
+    assert find_json("{'single': 'quotes'}") is None
+    assert [m.value for m in iter_json('{"a": 1}\n{"b": 2}')] == [{"a": 1}, {"b": 2}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_streamed_chunks_match_the_complete_scan(chunk_size):
+    for text in RESPONSES:
+        scanner = JSONScanner()
+        for i in range(0, len(text), chunk_size):
+            scanner.feed(text[i:i + chunk_size])
+        expected = find_json(text)
+        assert scanner.match == expected
+        assert scanner.text == text
+
+
+def test_adapter_reports_how_json_was_found():
+    adapter = LLMAdapter({"api_key": "test-json", "cache": {"enabled": False}})
+    assert [adapter._parse_json_response(text) for text in RESPONSES[:3]] == [PLAN, PLAN, PLAN]
+    assert adapter._parse_json_response('{"a": 1}\n\n{"b": 2}\n') == [{"a": 1}, {"b": 2}]
+    assert adapter._parse_json_response("42") == 42
+    assert "error" in adapter._parse_json_response("no json {here}")
+    stats = adapter.json_stats
+    assert (stats["direct"], stats["markdown"], stats["braces"], stats["lines"], stats["failed"]) == (2, 1, 1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_planner_picks_the_plan_object_out_of_prose():
+    class FakeLLM:
+        async def generate(self, prompt, formated_output=None, call_type=None):
+            return 'Config stays {"debug": false}. Plan:\n' + json.dumps(PLAN) + "\nThe {braces} above are fine."
+
+    plan = await Planner(FakeLLM()).create_plan("add name support")
+    assert isinstance(plan, Plan) and plan.steps[0].file_path == "a.py"
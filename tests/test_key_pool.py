@@ -0,0 +1,81 @@
+import pytest
+from aiohttp import web
+from adapters.key_pool import ApiKeyPool
+from adapters.llm_adapter import LLMAdapter
+
+UNLIMITED = {"requests_per_minute": 60000, "burst": 1000, "initial_concurrency": 2, "default_retry_after": 5}
+
+
+@pytest.mark.asyncio
+async def test_requests_spread_over_least_loaded_keys():
+    pool = ApiKeyPool("pool-spread", ["k1", "k2", "k3"], UNLIMITED)
+    first, second = pool.request(), pool.request()
+    async with first, second:
+        assert first.api_key != second.api_key
+        third = pool.request()
+        async with third:
+            assert third.api_key not in (first.api_key, second.api_key)
+    assert [entry["requests"] for entry in pool.get_stats()["keys"]] == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_throttled_key_cools_down_before_reuse():
+    pool = ApiKeyPool("pool-cooldown", ["k1", "k2"], UNLIMITED, cooldown=60)
+    async with pool.request() as ticket:
+        assert ticket.api_key == "k1"
+        ticket.throttled(retry_after=1)
+    for _ in range(3):
+        async with pool.request() as ticket:
+            assert ticket.api_key == "k2"
+    stats = pool.get_stats()
+    assert stats["throttled"] == 1 and stats["keys"][0]["cooling_for"] > 30
+
+    async with pool.request() as ticket:
+        ticket.throttled()
+    assert pool.pick().api_key == "k1" # Everything cooling: the key that recovers first
+    assert pool.stats["all_cooling"] == 1
+    assert not pool.has_capacity()
+
+
+def test_duplicate_keys_are_pooled_once():
+    assert len(ApiKeyPool("pool-dedupe", ["k1", "k1", "k2"])) == 2
+    with pytest.raises(ValueError):
+        ApiKeyPool("pool-empty", [])
+
+
+@pytest.mark.asyncio
+async def test_adapter_moves_off_a_throttled_key():
+    keys_seen = []
+
+    async def handler(request):
+        keys_seen.append(request.query["key"])
+        if request.query["key"] == "exhausted-key":
+            return web.Response(status=429, text='{"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}')
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": "ok"}]}, "finishReason": "STOP"}]})
+
+    app = web.Application()
+    app.router.add_post("/v1/models/{model}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    adapter = LLMAdapter({
+        "api_key": "exhausted-key", "api_keys": ["exhausted-key", "fresh-key"], "model": "pool-model", "temperature": 0,
+        "api_url": f"http://127.0.0.1:{port}/v1/models/pool-model:generateContent",
+        "rate_limit": UNLIMITED, "cache": {"enabled": False}, "retry": {"base_delay": 0.001, "max_delay": 0.01},
+    })
+    try:
+        assert await adapter.generate("first") == "ok"
+        assert await adapter.generate("second") == "ok"
+        assert keys_seen == ["exhausted-key", "fresh-key", "fresh-key"]
+        stats = adapter.key_pool.get_stats()
+        assert stats["keys"][0]["throttled"] == 1 and stats["keys"][1]["requests"] == 2
+    finally:
+        await adapter.close()
+        await runner.cleanup()
+
+
+def test_missing_api_key_is_reported_by_provider():
+    with pytest.raises(ValueError, match="No API key configured for provider 'gemini'"):
+        LLMAdapter({"api_keys": []})
+    assert LLMAdapter({"provider": "openai", "api_url": "http://localhost:8000/v1/chat/completions"}).api_keys == []
@@ -98,3 +98,20 @@ async def test_generate_create_plan_actual():
     assert "steps" in response
     assert isinstance(response["files"], list)
     assert isinstance(response["steps"], list)
+
+
+@pytest.mark.asyncio
+async def test_session_is_reused_until_closed():
+    """The adapter keeps one pooled session across calls and recreates it after close()."""
+    adapter = LLMAdapter(CONFIG)
+
+    first = adapter._get_session()
+    assert adapter._get_session() is first
+    assert first.connector.limit_per_host == adapter.pool_limit_per_host
+
+    await adapter.close()
+    assert first.closed
+
+    second = adapter._get_session()
+    assert second is not first
+    await adapter.close()
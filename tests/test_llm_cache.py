@@ -0,0 +1,94 @@
+import os
+import time
+import pytest
+from adapters.llm_cache import LLMResponseCache
+
+PAYLOAD = {"contents": [{"role": "user", "parts": [{"text": "hello"}]}], "generationConfig": {"temperature": 0.2}}
+
+
+class DictRedis:
+    """In-memory stand-in exposing the RedisAdapter context API used by the cache."""
+    def __init__(self):
+        self.data = {}
+
+    async def store_context(self, key, data, ttl=None):
+        self.data[key] = data
+        return True
+
+    async def get_context(self, key):
+        return self.data.get(key)
+
+
+def test_key_depends_on_model_config_and_prompt():
+    key = LLMResponseCache.make_key("gemini-2.0-flash", PAYLOAD)
+    assert key == LLMResponseCache.make_key("gemini-2.0-flash", dict(PAYLOAD))
+    assert key != LLMResponseCache.make_key("gemini-2.0-pro", PAYLOAD)
+    hotter = {**PAYLOAD, "generationConfig": {"temperature": 0.9}}
+    assert key != LLMResponseCache.make_key("gemini-2.0-flash", hotter)
+
+
+@pytest.mark.asyncio
+async def test_memory_lru_hit_miss_and_eviction():
+    cache = LLMResponseCache({"max_entries": 2})
+    await cache.set("a", "A")
+    await cache.set("b", "B")
+    assert await cache.get("a") == "A" # 'a' becomes most recently used
+    await cache.set("c", "C") # evicts 'b'
+    assert await cache.get("b") is None
+    stats = cache.get_stats()
+    assert stats["memory_hits"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_per_format_ttl_expires_entries():
+    cache = LLMResponseCache({"ttl": {"json": 0}})
+    await cache.set("k", "{}", formated_output="json")
+    time.sleep(0.01)
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_new_instance(tmp_path):
+    first = LLMResponseCache({"disk_dir": str(tmp_path)})
+    await first.set("deadbeef", "cached text", formated_output="code")
+    second = LLMResponseCache({"disk_dir": str(tmp_path)})
+    assert await second.get("deadbeef") == "cached text"
+    assert second.stats["disk_hits"] == 1
+    assert await second.get("deadbeef") == "cached text" # promoted to memory
+    assert second.stats["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_deletes_expired_files_and_keeps_the_newest(tmp_path):
+    cache = LLMResponseCache({"disk_dir": str(tmp_path), "ttl": {"json": 0}, "disk_max_entries": 10})
+    await cache.set("aa01", "{}", formated_output="json")
+    assert (tmp_path / "aa" / "aa01.json").exists()
+    fresh = LLMResponseCache({"disk_dir": str(tmp_path)})
+    assert await fresh.get("aa01") is None and not (tmp_path / "aa" / "aa01.json").exists()
+    assert fresh.stats["disk_expired"] == 1
+
+    capped = LLMResponseCache({"disk_dir": str(tmp_path / "capped"), "disk_max_entries": 10})
+    for i in range(12):
+        await capped.set(f"{i:02d}ff", f"text {i}", formated_output="code")
+        os.utime(tmp_path / "capped" / f"{i:02d}" / f"{i:02d}ff.json", (1000 + i, 1000 + i)) # Written in key order
+    remaining = sorted(path.name for path in (tmp_path / "capped").glob("??/*.json"))
+    assert remaining == [f"{i:02d}ff.json" for i in range(2, 12)] # The 11th file pruned the oldest down to 9
+    assert capped.stats["disk_evictions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_consulted_after_local_tiers():
+    redis = DictRedis()
+    await LLMResponseCache(redis_adapter=redis).set("k", "shared")
+    other = LLMResponseCache()
+    other.attach_redis(redis)
+    assert await other.get("k") == "shared"
+    assert other.stats["redis_hits"] == 1
+
+
+def test_bypass_for_nondeterministic_calls():
+    cache = LLMResponseCache({"bypass_nondeterministic": True})
+    assert cache.should_use(0.0)
+    assert not cache.should_use(0.7)
+    assert cache.stats["bypassed"] == 1
+    assert LLMResponseCache({"enabled": False}).should_use(0.0) is False
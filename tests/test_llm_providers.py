@@ -0,0 +1,133 @@
+import hashlib
+import json
+import pytest
+from aiohttp import web
+from adapters.llm_adapter import LLMAdapter
+from adapters.llm_cache import LLMResponseCache
+from adapters.llm_providers import GeminiProvider, OpenAICompatibleProvider, make_provider, to_json_schema
+from adapters.model_router import _tier_config
+from utils.schema import CODE_ANALYSES_SCHEMA, CODE_ANALYSIS_SCHEMA, PLAN_RESPONSE_SCHEMA, validate_schema
+
+def choice(text, finish):
+    return {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}]}
+
+
+def chat_completions(seen):
+    """Minimal chat-completions handler in the style of vLLM / llama.cpp"""
+    async def handler(request):
+        payload = await request.json()
+        seen.append((dict(request.headers), payload))
+        if "response_format" in payload:
+            return web.json_response(choice(json.dumps({"language": "python", "main_flow": "local"}), "stop"))
+        continued = payload["messages"][-1]["content"].startswith("Your previous answer was cut off")
+        text, finish = ("b = 2\n", "stop") if continued else ("a = 1\n", "length")
+        if payload.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for event in ({"choices": [{"delta": {"role": "assistant"}, "finish_reason": None}]},
+                          {"choices": [{"delta": {"content": text}, "finish_reason": None}]},
+                          {"choices": [{"delta": {}, "finish_reason": finish}]}):
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            return response
+        return web.json_response(choice(text, finish))
+
+    return handler
+
+
+@pytest.fixture
+async def local_adapter(stub_server, make_llm_adapter):
+    seen = []
+    server = await stub_server(chat_completions(seen), route="/v1/chat/completions")
+    adapter = make_llm_adapter(f"{server.base_url}/v1/chat/completions", api_key=None, provider="openai",
+                               model="qwen2.5-coder", temperature=0, cache={"enabled": False}, max_output_tokens=64)
+    adapter.seen = seen
+    return adapter
+
+
+def test_gemini_is_the_default_and_cache_keys_are_unchanged():
+    provider = make_provider({}, "gemini-2.0-flash")
+    assert isinstance(provider, GeminiProvider)
+    assert provider.stream_api_url.endswith("/gemini-2.0-flash:streamGenerateContent")
+    payload = provider.build_payload("system", "hello", 100, 0.2)
+    legacy = json.dumps({"model": "m", "generationConfig": payload["generationConfig"], "contents": payload["contents"]},
+                        sort_keys=True, separators=(",", ":"))
+    assert LLMResponseCache.make_key("m", payload) == hashlib.sha256(legacy.encode()).hexdigest()
+    with pytest.raises(ValueError):
+        make_provider({"provider": "nope"}, "m")
+
+
+def test_schema_conversion_to_json_schema():
+    converted = to_json_schema(PLAN_RESPONSE_SCHEMA)
+    assert converted["type"] == "object" and converted["additionalProperties"] is False
+    assert converted["properties"]["reply"]["type"] == ["string", "null"]
+    assert converted["properties"]["steps"]["items"]["type"] == "object"
+
+
+def object_nodes(schema):
+    if "properties" in schema:
+        yield schema
+        for sub in schema["properties"].values():
+            yield from object_nodes(sub)
+    if "items" in schema:
+        yield from object_nodes(schema["items"])
+
+
+@pytest.mark.parametrize("schema", [PLAN_RESPONSE_SCHEMA, CODE_ANALYSIS_SCHEMA, CODE_ANALYSES_SCHEMA])
+def test_strict_json_schema_requires_every_property(schema):
+    converted = to_json_schema(schema)
+    nodes = list(object_nodes(converted))
+    assert nodes and all(set(node["required"]) == set(node["properties"]) for node in nodes)
+    optional = set(schema["properties"]) - set(schema["required"])
+    assert all("null" in converted["properties"][name]["type"] for name in optional)
+
+
+def test_strict_mode_nulls_for_optional_properties_are_dropped():
+    provider = OpenAICompatibleProvider({}, "m")
+    response = {"language": "python", **{name: None for name in CODE_ANALYSIS_SCHEMA["properties"] if name != "language"}}
+    assert validate_schema(response, CODE_ANALYSIS_SCHEMA) # Strict mode answers with nulls the schema forbids
+    value = provider.normalize_structured(response, CODE_ANALYSIS_SCHEMA)
+    assert value["language"] == "python" and "imports" not in value and validate_schema(value, CODE_ANALYSIS_SCHEMA) == []
+    plan = {"understanding": "ok", "files": [], "reply": None, "steps": [{"type": "code_generation", "description": "d", "file_path": None}]}
+    assert provider.normalize_structured(plan, PLAN_RESPONSE_SCHEMA) == plan # Nullable properties keep their nulls
+
+
+def test_openai_finish_reasons_are_normalized():
+    provider = OpenAICompatibleProvider({}, "m")
+    assert provider.extract_finish_reason(choice("x", "length")) == "MAX_TOKENS"
+    assert provider.extract_finish_reason(provider.make_result("x", "STOP")) == "STOP"
+    assert provider.extract_text({"choices": [{"delta": {"content": "hi"}}]}) == "hi"
+    assert provider.parse_stream_event("[DONE]") is None
+
+
+@pytest.mark.asyncio
+async def test_openai_compatible_generate_with_schema(local_adapter):
+    result = await local_adapter.generate("analyze", formated_output="json", response_schema=CODE_ANALYSIS_SCHEMA)
+    assert result == {"language": "python", "main_flow": "local"}
+    headers, payload = local_adapter.seen[0]
+    assert "Authorization" not in headers # No key configured for the local server
+    assert payload["model"] == "qwen2.5-coder"
+    assert payload["messages"][0]["role"] == "system"
+    assert payload["response_format"]["json_schema"]["schema"]["type"] == "object"
+
+
+@pytest.mark.asyncio
+async def test_openai_compatible_truncation_is_continued(local_adapter):
+    assert await local_adapter.generate("write it") == "a = 1\nb = 2\n"
+    assert [payload["messages"][-1]["role"] for _, payload in local_adapter.seen] == ["user", "user"]
+    assert local_adapter.seen[1][1]["messages"][-2] == {"role": "assistant", "content": "a = 1\n"}
+
+    chunks = []
+    result = await local_adapter.generate_streaming("write it", on_chunk=chunks.append, use_cache=False)
+    assert result == "a = 1\nb = 2\n" and chunks == ["a = 1\n", "b = 2\n"]
+    assert local_adapter.seen[-1][1]["stream"] is True
+
+
+def test_router_tier_on_another_provider_gets_its_own_url_and_no_key():
+    base = {"api_key": "gemini-secret", "model": "gemini-2.0-flash",
+            "api_url": "https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent"}
+    local = _tier_config(base, {"provider": "openai", "model": "qwen2.5-coder"})
+    assert "api_url" not in local and "api_key" not in local
+    assert LLMAdapter({**local, "cache": {"enabled": False}}).api_url.endswith("/v1/chat/completions")
+    assert "gemini-2.0-flash-lite:" in _tier_config(base, "gemini-2.0-flash-lite")["api_url"]
@@ -0,0 +1,95 @@
+import io
+import os
+import pytest
+from rich.console import Console
+from adapters.llm_adapter import LLMAdapter
+from adapters.llm_replay import ReplayStore
+from adapters.llm_stub_server import StubLLMServer, STUB_CODE
+from core.agent import Agent
+from utils.cli_ui import CLI_UI
+from tests.conftest import UNLIMITED
+
+
+def make_adapter(api_url, replay):
+    return LLMAdapter({
+        "api_key": "test-replay",
+        "api_url": api_url,
+        "rate_limit": UNLIMITED,
+        "cache": {"enabled": False},
+        "replay": replay,
+    })
+
+
+@pytest.mark.asyncio
+async def test_recorded_responses_replay_without_network(tmp_path):
+    path = str(tmp_path / "replay.jsonl.gz")
+    async with StubLLMServer() as server:
+        recorder = make_adapter(server.api_url(), {"mode": "record", "path": path})
+        try:
+            live_code = await recorder.generate("write greet", formated_output="code")
+            live_text = "".join([chunk async for chunk in recorder.generate_stream("say hi")])
+        finally:
+            await recorder.close()
+        assert server.stats["requests"] == 2
+    assert os.path.exists(path)
+
+    # Nothing listens on this port; every answer must come from the store
+    replayer = make_adapter("http://127.0.0.1:9/v1/models/stub:generateContent", {"mode": "replay", "path": path})
+    assert len(replayer.replay_store) == 2
+    assert await replayer.generate("write greet", formated_output="code") == live_code == STUB_CODE.strip()
+    assert "".join([chunk async for chunk in replayer.generate_stream("say hi")]) == live_text
+    missing = await replayer.generate("never recorded")
+    assert "replay mode" in missing["error"]
+
+
+@pytest.mark.asyncio
+async def test_stub_server_serves_recordings_before_synthesizing(tmp_path):
+    path = str(tmp_path / "replay.jsonl.gz")
+    adapter = make_adapter("http://unused", {"mode": "off"})
+    store = ReplayStore(path)
+    await store.record(ReplayStore.make_key("stub", adapter._build_payload("ping")),
+                       {"candidates": [{"content": {"parts": [{"text": "pong"}]}}]})
+
+    async with StubLLMServer(ReplayStore(path)) as server:
+        adapter.api_url = server.api_url()
+        try:
+            assert await adapter.generate("ping") == "pong"
+            assert await adapter.generate("something else") == "This is an offline stub response."
+        finally:
+            await adapter.close()
+        assert server.stats["replayed"] == 1 and server.stats["synthesized"] == 1
+
+
+class AutoApproveUI(CLI_UI):
+    def __init__(self):
+        super().__init__()
+        self.console = Console(file=io.StringIO())
+
+    def ask_confirmation(self, message, default=True):
+        return True
+
+    def ask_edit_confirmation(self, file_path, action="write to"):
+        return "confirm"
+
+
+@pytest.mark.asyncio
+async def test_agent_runs_end_to_end_against_stub(tmp_path):
+    async with StubLLMServer() as server:
+        config = {
+            "llm": {
+                "api_key": "offline",
+                "api_url": server.api_url("gemini-2.0-flash"),
+                "rate_limit": UNLIMITED,
+                "cache": {"enabled": False},
+            },
+            "working_directory": str(tmp_path),
+        }
+        agent = Agent(config, AutoApproveUI())
+        try:
+            await agent.run_interactive("create a greeting module")
+        finally:
+            await agent.cleanup()
+        assert server.stats["requests"] >= 2 # Plan + code generation at least
+    generated = tmp_path / "stub_output.py"
+    assert generated.exists()
+    assert "def greet" in generated.read_text()
@@ -0,0 +1,67 @@
+import io
+import json
+import pytest
+from aiohttp import web
+from rich.console import Console
+from adapters.llm_adapter import LLMStreamError
+from utils.cli_ui import CodeStreamRenderer
+
+CHUNKS = ["```python\n", "def add(a, b):\n", "    return a + b\n", "```"]
+
+
+async def sse_handler(request):
+    assert request.match_info["model_action"].endswith(":streamGenerateContent")
+    assert request.query.get("alt") == "sse"
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    for chunk in CHUNKS:
+        event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+        await response.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+    await response.write_eof()
+    return response
+
+
+@pytest.mark.asyncio
+async def test_generate_stream_yields_chunks_in_order(stub_server, make_llm_adapter):
+    adapter = make_llm_adapter((await stub_server(sse_handler)).api_url())
+    received = [chunk async for chunk in adapter.generate_stream("write add")]
+    assert received == CHUNKS
+
+
+@pytest.mark.asyncio
+async def test_generate_streaming_matches_non_streaming_output_shape(stub_server, make_llm_adapter):
+    adapter = make_llm_adapter((await stub_server(sse_handler)).api_url())
+    seen = []
+    code = await adapter.generate_streaming("write add", formated_output="code", on_chunk=seen.append)
+    assert seen == CHUNKS
+    assert code == "def add(a, b):\n    return a + b"
+
+
+@pytest.mark.asyncio
+async def test_stream_http_error_surfaces_as_error_dict(stub_server, make_llm_adapter):
+    async def failing(request):
+        return web.Response(status=500, text="boom")
+
+    adapter = make_llm_adapter((await stub_server(failing)).api_url())
+    with pytest.raises(LLMStreamError):
+        async for _ in adapter.generate_stream("x"):
+            pass
+    result = await adapter.generate_streaming("x")
+    assert isinstance(result, dict) and "boom" in result["error"]
+
+
+def test_renderer_keeps_completed_lines_and_the_unfinished_tail():
+    console = Console(file=io.StringIO(), height=12, width=80)
+    renderer = CodeStreamRenderer(console, file_path="a.py")
+    with renderer:
+        for chunk in ["def add(a, b):\r", "\n    return", " a + b\n\n", "x = ad", "d(1, 2)"]:
+            renderer.on_chunk(chunk)
+        assert renderer.lines == ["def add(a, b):", "    return a + b", ""] and renderer.tail == "x = add(1, 2)"
+        panel = renderer._render()
+        assert panel.renderable.code.splitlines()[-1] == "x = add(1, 2)" and panel.renderable.start_line == 1
+        for i in range(20):
+            renderer.on_chunk(f"\ny{i} = {i}")
+        assert panel.renderable.code != renderer._render().renderable.code
+        visible = renderer._render().renderable
+        assert visible.code.splitlines() == [f"y{i} = {i}" for i in range(14, 20)] and visible.start_line == 19
+    assert renderer.chars == sum(len(line) + 1 for line in renderer.lines) + len(renderer.tail) + 1 # Plus the "\r"
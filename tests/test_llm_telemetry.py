@@ -0,0 +1,95 @@
+import asyncio
+import io
+import json
+import pytest
+from rich.console import Console
+from adapters.llm_stub_server import StubLLMServer
+from adapters.llm_telemetry import LLMLedger, note_attempt, note_usage
+from core.agent import Agent
+from utils.cli_ui import CLI_UI
+from tests.conftest import UNLIMITED
+
+PRICES = {"stub": {"prompt": 1.0, "response": 2.0}}
+
+
+@pytest.mark.asyncio
+async def test_each_call_records_timing_tokens_and_cost(stub_server, make_llm_adapter):
+    adapter = make_llm_adapter((await stub_server()).api_url(), model="stub", telemetry={"prices": PRICES})
+    adapter.ledger.task_id = "task-1"
+    await adapter.generate("Say hi", call_type="plan", priority="interactive")
+    await adapter.generate("Say hi", call_type="plan") # Served by the response cache
+    adapter.ledger.task_id = "task-2"
+    streamed = await adapter.generate_streaming("Write code", formated_output="code", call_type="generate", use_cache=False)
+
+    first, cached, stream = adapter.ledger.records()
+    assert (first.task_id, first.component, first.priority, first.source, first.attempts) == ("task-1", "plan", "interactive", "api", 1)
+    assert first.connect > 0 and 0 < first.ttfb <= first.total # A new connection was opened
+    assert first.prompt_tokens > 0 and first.response_tokens > 0
+    assert first.cost == pytest.approx((first.prompt_tokens + 2 * first.response_tokens) / 1e6)
+    assert (cached.source, cached.attempts, cached.prompt_tokens) == ("cache", 0, 0)
+    assert stream.stream and stream.task_id == "task-2" and stream.connect == 0 # Pooled connection reused
+    assert stream.response_tokens == len(streamed) // 4 + 1 # Counts from the final chunk
+    assert [r.component for r in adapter.ledger.records("task-1")] == ["plan", "plan"]
+    assert adapter.ledger.tasks() == ["task-1", "task-2"]
+
+
+@pytest.mark.asyncio
+async def test_summary_groups_by_component_and_counts_failures():
+    ledger = LLMLedger({"prices": {"m": {"prompt": 1.0, "response": 1.0}}})
+    ledger.task_id = "t"
+
+    async def call(result, tokens=(0, 0)):
+        note_attempt(queue_wait=0.5)
+        note_usage(tokens)
+        return result
+
+    await ledger.observe(call("code", (100, 50)), "m", "generate", stream=False)
+    await ledger.observe(call({"error": "quota exhausted"}), "m", "analysis", stream=False)
+    task = asyncio.ensure_future(ledger.observe(asyncio.sleep(5), "m", None, stream=False))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    summary = ledger.summary("t")
+    assert (summary["calls"], summary["errors"], summary["queue_wait"]) == (3, 2, 1.0)
+    assert summary["by_component"]["generate"]["cost"] == pytest.approx(150 / 1e6)
+    assert [r.status for r in ledger.records()] == ["ok", "error", "cancelled"]
+    assert ledger.records()[2].component == "other"
+    report = ledger.report("t")
+    assert json.loads(json.dumps(report))["calls"][1]["error"] == "quota exhausted"
+
+
+class ApprovingUI(CLI_UI):
+    def __init__(self):
+        super().__init__()
+        self.console = Console(file=io.StringIO())
+
+    def ask_confirmation(self, message, default=True):
+        return True
+
+    def ask_edit_confirmation(self, file_path, action="write to"):
+        return "confirm"
+
+
+@pytest.mark.asyncio
+async def test_task_results_are_dumped_with_the_ledger(tmp_path):
+    ui = ApprovingUI()
+    async with StubLLMServer() as server:
+        agent = Agent({
+            "llm": {"api_key": "offline", "api_url": server.api_url("gemini-2.0-flash"), "rate_limit": UNLIMITED,
+                    "cache": {"enabled": False}, "telemetry": {"results_dir": str(tmp_path / "results")}},
+            "working_directory": str(tmp_path / "work"),
+        }, ui)
+        try:
+            results = await agent.run_interactive("create a greeting module")
+        finally:
+            await agent.cleanup()
+
+    dumped = json.loads((tmp_path / "results" / f"{results['task_id']}.json").read_text())
+    assert dumped["success"] and dumped["llm_calls"]["task_id"] == results["task_id"]
+    assert {call["component"] for call in dumped["llm_calls"]["calls"]} >= {"plan", "generate"}
+    assert all(call["task_id"] == results["task_id"] for call in dumped["llm_calls"]["calls"])
+
+    ui.display_llm_calls(agent.llm.ledger.report(results["task_id"]))
+    assert "plan" in ui.console.file.getvalue()
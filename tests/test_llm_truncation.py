@@ -0,0 +1,86 @@
+import json
+import pytest
+from aiohttp import web
+from adapters.llm_adapter import LLMAdapter
+from utils.schema import CODE_ANALYSIS_SCHEMA
+
+FIRST = "```python\ndef add(a, b):\n    return a + b\n\ndef sub(a, b):\n"
+# The continuation re-opens the fence and repeats the last line, as models often do
+SECOND = "```python\ndef sub(a, b):\n    return a - b\n```"
+FULL = "def add(a, b):\n    return a + b\n\ndef sub(a, b):\n    return a - b"
+
+
+def body(text, finish):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": finish}]}
+
+
+def scripted(seen):
+    """Truncates code at MAX_TOKENS once, and structured output unless the budget was raised"""
+    async def handler(request):
+        payload = await request.json()
+        seen.append(payload)
+        continuation = len(payload["contents"]) > 3
+        text, finish = (SECOND, "STOP") if continuation else (FIRST, "MAX_TOKENS")
+        if payload["generationConfig"].get("responseSchema"):
+            big = payload["generationConfig"]["maxOutputTokens"] >= 8192
+            text, finish = (json.dumps({"language": "python"}), "STOP") if big else ('{"language": "py', "MAX_TOKENS")
+        if request.match_info["model_action"].endswith(":streamGenerateContent"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            lines = text.splitlines(keepends=True)
+            for index, line in enumerate(lines):
+                event = body(line, finish if index == len(lines) - 1 else None)
+                await response.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+            await response.write_eof()
+            return response
+        return web.json_response(body(text, finish))
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_truncated_response_is_continued_and_stitched(stub_server, make_llm_adapter):
+    seen = []
+    adapter = make_llm_adapter((await stub_server(scripted(seen))).api_url(), cache={"enabled": False})
+    assert await adapter.generate("write add and sub", formated_output="code") == FULL
+    assert len(seen) == 2
+    assert seen[1]["contents"][-2] == {"role": "model", "parts": [{"text": FIRST}]}
+    assert adapter.truncation_stats["continuations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_truncated_stream_is_continued_without_duplicates(stub_server, make_llm_adapter):
+    seen = []
+    adapter = make_llm_adapter((await stub_server(scripted(seen))).api_url(), cache={"enabled": False})
+    chunks = []
+    code = await adapter.generate_streaming("write add and sub", formated_output="code", on_chunk=chunks.append)
+    assert code == FULL
+    assert "".join(chunks).count("def sub") == 1
+    assert len(seen) == 2
+
+
+@pytest.mark.asyncio
+async def test_output_still_truncated_is_not_cached(stub_server, make_llm_adapter):
+    seen = []
+    adapter = make_llm_adapter((await stub_server(scripted(seen))).api_url(), max_continuations=0)
+    await adapter.generate("write add and sub", formated_output="code")
+    await adapter.generate("write add and sub", formated_output="code")
+    assert len(seen) == 2 # Second call was not served a truncated answer from cache
+    assert adapter.truncation_stats["unfinished"] == 2
+
+
+@pytest.mark.asyncio
+async def test_truncated_structured_response_retries_with_larger_budget(stub_server, make_llm_adapter):
+    seen = []
+    adapter = make_llm_adapter((await stub_server(scripted(seen))).api_url(), cache={"enabled": False})
+    result = await adapter.generate("analyze", response_schema=CODE_ANALYSIS_SCHEMA)
+    assert result == {"language": "python"}
+    assert [p["generationConfig"]["maxOutputTokens"] for p in seen] == [4000, 8192]
+    assert len(seen[1]["contents"]) == 3 # A fresh request, not a continuation
+
+
+def test_output_tokens_sized_from_expected_length():
+    adapter = LLMAdapter({"api_key": "test-truncation", "max_output_tokens": 4000, "max_output_tokens_cap": 8192})
+    assert adapter.size_output_tokens(100) == 4000
+    assert adapter.size_output_tokens(5000) == int(5000 * 1.3) + 512
+    assert adapter.size_output_tokens(50000) == 8192
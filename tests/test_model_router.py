@@ -0,0 +1,124 @@
+import json
+import pytest
+from aiohttp import web
+from adapters.model_router import ModelRouter, ESCALATION_NOTICE
+from utils.helpers import check_syntax
+from utils.schema import PLAN_RESPONSE_SCHEMA
+from tests.conftest import UNLIMITED
+
+GOOD_CODE = "def add(a, b):\n    return a + b\n"
+BAD_CODE = "def add(a, b)\n    return a + b\n"
+GOOD_PLAN = {"understanding": "ok", "files": ["a.py"], "steps": [{"type": "code_generation", "description": "write a.py",
+                                                                    "file_path": "a.py", "requirements": "add"}]}
+
+
+def body(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+
+def answer(model, payload):
+    """The lite model writes broken code and plans; the others answer correctly"""
+    if payload["generationConfig"].get("responseSchema"):
+        return json.dumps({"understanding": "?", "files": [], "steps": []} if model == "lite-model" else GOOD_PLAN)
+    if "json" in payload["contents"][0]["parts"][0]["text"].lower():
+        return "not json at all" if model == "lite-model" else '{"score": 1}'
+    return BAD_CODE if model == "lite-model" else GOOD_CODE
+
+
+@pytest.fixture
+async def router(stub_server):
+    seen = []
+
+    async def handler(request):
+        model, _, action = request.match_info["model_action"].partition(":")
+        seen.append(model)
+        text = answer(model, await request.json())
+        if action == "streamGenerateContent":
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            await response.write(f"data: {json.dumps(body(text))}\r\n\r\n".encode())
+            await response.write_eof()
+            return response
+        return web.json_response(body(text))
+
+    server = await stub_server(handler, route="/v1/models/{model_action}")
+    router = ModelRouter({
+        "api_key": "test", "model": "standard-model", "temperature": 0,
+        "api_url": server.api_url("standard-model"),
+        "rate_limit": UNLIMITED, "cache": {"enabled": False},
+        "routing": {
+            "tiers": {"lite": "lite-model", "standard": "standard-model", "strong": "strong-model"},
+            "order": ["lite", "standard", "strong"],
+            "routes": {"analysis": "lite", "plan": "lite", "generate": "lite", "modify": "strong"},
+        },
+    })
+    router.seen = seen
+    yield router
+    await router.close()
+
+
+def test_tiers_get_their_own_model_urls_and_share_the_cache(router):
+    assert router.default_tier == "standard" # Matches llm.model
+    assert router.model == "standard-model"
+    assert "/models/lite-model:generateContent" in router.tiers["lite"].api_url
+    assert router.tiers["strong"].stream_api_url.endswith("/models/strong-model:streamGenerateContent")
+    assert router.tiers["lite"].response_cache is router.response_cache
+    assert router.adapter_for("modify").model == "strong-model"
+    assert router.adapter_for("unrouted").model == "standard-model"
+
+
+@pytest.mark.asyncio
+async def test_invalid_json_escalates_to_next_tier(router):
+    result = await router.generate("Rate this code", formated_output="json", call_type="analysis")
+    assert result == {"score": 1}
+    assert router.seen == ["lite-model", "standard-model"]
+    stats = router.get_stats()
+    assert stats["tiers"]["lite"]["escalation_rate"] == 1.0
+    assert stats["tiers"]["standard"]["calls"] == 1 and stats["tiers"]["standard"]["escalations"] == 0
+    assert stats["routes"]["analysis"] == {"calls": 2, "escalations": 1}
+
+
+@pytest.mark.asyncio
+async def test_plan_without_steps_escalates(router):
+    result = await router.generate("Plan it", response_schema=PLAN_RESPONSE_SCHEMA, call_type="plan")
+    assert result["steps"][0]["file_path"] == "a.py"
+    assert router.seen == ["lite-model", "standard-model"]
+
+
+@pytest.mark.asyncio
+async def test_unparseable_code_escalates_and_streams_a_notice(router):
+    chunks = []
+    result = await router.generate_streaming("Write add", formated_output="code", on_chunk=chunks.append,
+                                             call_type="generate", validate=lambda code: check_syntax(code, "python"))
+    assert result == GOOD_CODE.strip()
+    assert any("escalating to standard-model" in chunk for chunk in chunks)
+    assert chunks[-1] == GOOD_CODE
+
+
+@pytest.mark.asyncio
+async def test_strongest_tier_result_is_returned_even_if_invalid(router):
+    result = await router.generate("Write add", formated_output="code", call_type="modify",
+                                   validate=lambda code: "always rejected")
+    assert result == GOOD_CODE.strip()
+    assert router.seen == ["strong-model"]
+    assert router.get_stats()["tiers"]["strong"]["validation_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_transport_errors_are_not_escalated(router):
+    router.tiers["lite"].api_url = router.tiers["lite"].api_url.replace("/v1/", "/missing/")
+    result = await router.generate("Rate this code", formated_output="json", call_type="analysis")
+    assert "error" in result and "raw_response" not in result
+    assert router.seen == []
+
+
+def test_unknown_route_tier_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter({"api_key": "test", "routing": {"tiers": {"lite": "lite-model"}, "routes": {"plan": "strong"}}})
+
+
+def test_check_syntax():
+    assert check_syntax(GOOD_CODE, "python") is None
+    assert "line 1" in check_syntax(BAD_CODE, "python")
+    assert check_syntax("{bad", "json").startswith("Invalid JSON")
+    assert check_syntax("anything goes", "markdown") is None
@@ -0,0 +1,103 @@
+import pytest
+from core.code_generator import CodeGenerator
+from utils.prompt_budget import PromptBuilder, PromptPart, estimate_tokens, summarize_text
+from utils.schema import CodeAnalysis
+
+TEMPLATE = "Code:\n{code}\nContext: {context}"
+
+
+def test_estimate_tokens_is_roughly_four_chars_per_token():
+    text = "def add(a, b):\n    return a + b\n" * 50
+    assert len(text) / 6 < estimate_tokens(text) < len(text) / 2
+    assert estimate_tokens("") == 0
+
+
+def test_summarize_text_keeps_head_and_tail_within_budget():
+    text = "\n".join(f"line {i}" for i in range(500))
+    summary = summarize_text(text, 100)
+    assert summary.startswith("line 0") and summary.endswith("line 499")
+    assert "tokens trimmed" in summary
+    assert estimate_tokens(summary) <= 120
+
+
+def test_within_budget_prompt_is_untouched():
+    built = PromptBuilder("gemini-2.0-flash").build(
+        TEMPLATE, {"code": "x = 1"}, [PromptPart("context", "task", "set x")])
+    assert not built.trimmed
+    assert '"task": "set x"' in built.prompt
+    assert built.section_tokens["code"] == estimate_tokens("x = 1")
+
+
+def test_snippets_dropped_before_context_is_summarised():
+    builder = PromptBuilder("gemini-2.0-flash", {"default_max_prompt_tokens": 400})
+    snippets = [{"code": "value = compute()\n" * 40} for _ in range(5)]
+    task = "Build a parser. " * 40
+    built = builder.build(TEMPLATE, {"code": "x = 1"}, [
+        PromptPart("context", "task", task, priority=60),
+        PromptPart("context", "similar_code", snippets, priority=10),
+    ])
+    assert built.dropped and built.dropped[0].startswith("similar_code")
+    assert built.summarised == [] # Dropping snippets was enough
+    assert task.strip() in built.prompt
+    assert built.total_tokens <= 400
+
+
+def test_required_sections_are_never_cut():
+    builder = PromptBuilder("gemini-2.0-flash", {"default_max_prompt_tokens": 50})
+    code = "print('hello')\n" * 100
+    built = builder.build(TEMPLATE, {"code": code}, [PromptPart("context", "task", "explain " * 200)])
+    assert code in built.prompt
+    assert "task" in built.dropped
+    assert "No additional context" in built.prompt
+
+
+def test_per_model_budget_respects_context_window():
+    assert PromptBuilder("gemini-2.0-flash-lite", {"max_prompt_tokens": {"gemini-2.0-flash-lite": 1000}}).budget == 1000
+    assert PromptBuilder("tiny-local-model", {"default_max_prompt_tokens": 10**9}, max_output_tokens=768).budget == 32_768 - 768
+
+
+class FakeLLM:
+    model = "gemini-2.0-flash"
+    max_output_tokens = 4000
+    config = {"prompt_budget": {"default_max_prompt_tokens": 800}}
+
+    def __init__(self):
+        self.prompts = []
+
+    def size_output_tokens(self, expected_tokens):
+        return max(self.max_output_tokens, expected_tokens)
+
+    async def generate(self, prompt, formated_output=None, max_output_tokens=None, call_type=None, validate=None):
+        self.prompts.append(prompt)
+        return "x = 2"
+
+
+@pytest.mark.asyncio
+async def test_modify_keeps_existing_code_and_reports_sections():
+    llm = FakeLLM()
+    generator = CodeGenerator(llm)
+    existing = "x = 1\n" * 300 # Larger than the whole budget on its own
+    analysis = CodeAnalysis(language="python", main_flow="Assigns x. " * 200)
+    await generator.modify(existing, "set x to 2", analysis, context={"task": "bump x"})
+    assert existing in llm.prompts[0]
+    report = generator.last_prompt_report
+    assert report["sections"]["existing_code"] == estimate_tokens(existing)
+    assert "main_flow" in report["dropped"] or "main_flow" in report["summarised"]
+
+
+class FakeRouter(FakeLLM):
+    """Routes generate calls to a small-budget model and modify calls to a large one"""
+    tiers = {"generate": type("Lite", (FakeLLM,), {"config": {"prompt_budget": {"default_max_prompt_tokens": 500}}})(),
+             "modify": type("Strong", (FakeLLM,), {"config": {"prompt_budget": {"default_max_prompt_tokens": 5000}}})()}
+
+    def adapter_for(self, call_type):
+        return self.tiers[call_type]
+
+
+@pytest.mark.asyncio
+async def test_each_call_type_uses_the_budget_of_its_routed_model():
+    generator = CodeGenerator(FakeRouter())
+    await generator.generate("write x", {"file_path": "x.py"})
+    assert generator.last_prompt_report["budget"] == 500
+    await generator.modify("x = 1\n", "set x to 2")
+    assert generator.last_prompt_report["budget"] == 5000
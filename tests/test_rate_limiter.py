@@ -0,0 +1,190 @@
+import asyncio
+import time
+import pytest
+from adapters import rate_limiter
+from adapters.llm_adapter import LLMAdapter
+from adapters.rate_limiter import AdaptiveRateLimiter, get_rate_limiter, llm_priority, parse_retry_after
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_beyond_burst():
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 600, "burst": 2}) # 10/s after the burst
+    start = time.monotonic()
+    for _ in range(4):
+        async with limiter.request():
+            pass
+    assert time.monotonic() - start >= 0.15 # two paced requests at ~0.1s each
+
+
+@pytest.mark.asyncio
+async def test_concurrency_window_caps_in_flight_requests():
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 60000, "burst": 100, "initial_concurrency": 2, "max_concurrency": 2})
+    peak = 0
+    active = 0
+
+    async def call():
+        nonlocal peak, active
+        async with limiter.request():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_throttle_halves_window_and_honours_retry_after():
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 60000, "burst": 100, "initial_concurrency": 4})
+    async with limiter.request() as ticket:
+        ticket.throttled(retry_after=0.1)
+    assert limiter.concurrency_limit == 2
+    start = time.monotonic()
+    async with limiter.request():
+        pass
+    assert time.monotonic() - start >= 0.09
+
+
+def test_aimd_grows_when_fast_and_shrinks_when_slow():
+    limiter = AdaptiveRateLimiter({"initial_concurrency": 2, "max_concurrency": 4, "latency_target": 1.0})
+    for _ in range(10):
+        limiter.on_latency(0.1)
+    assert 2 < limiter.concurrency_limit <= 4
+    grown = limiter.concurrency_limit
+    limiter.on_latency(5.0)
+    assert limiter.concurrency_limit < grown
+
+
+def test_registry_is_per_model_and_key():
+    a = get_rate_limiter("model-a", "key-1")
+    assert get_rate_limiter("model-a", "key-1") is a
+    assert get_rate_limiter("model-a", "key-2") is not a
+    assert get_rate_limiter("model-b", "key-1") is not a
+
+
+def test_later_different_settings_for_a_shared_limiter_are_reported(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(rate_limiter.logger, "warning", warnings.append)
+    first = get_rate_limiter("model-shared", "key-1", {"requests_per_minute": 600})
+    assert get_rate_limiter("model-shared", "key-1", {"requests_per_minute": 600}) is first and warnings == []
+    assert get_rate_limiter("model-shared", "key-1", {"requests_per_minute": 10}) is first
+    assert first.requests_per_minute == 600 and len(warnings) == 1 and "ignoring" in warnings[0]
+
+
+def test_deprecated_max_requests_per_minute_is_mapped():
+    adapter = LLMAdapter({"api_key": "deprecated-rpm", "model": "rpm-model", "max_requests_per_minute": 42})
+    assert adapter.rate_limiter.requests_per_minute == 42
+    adapter = LLMAdapter({"api_key": "deprecated-rpm-2", "model": "rpm-model", "max_requests_per_minute": 42,
+                          "rate_limit": {"requests_per_minute": 7}})
+    assert adapter.rate_limiter.requests_per_minute == 7
+
+
+def test_parse_retry_after_header_and_gemini_body():
+    assert parse_retry_after({"Retry-After": "3"}) == 3.0
+    assert parse_retry_after({}, '{"error": {"details": [{"retryDelay": "37s"}]}}') == 37.0
+    assert parse_retry_after({}, "no hint") is None
+
+
+async def hold_slot(limiter, started, release):
+    async with limiter.request():
+        started.set()
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_jump_queued_background_work():
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 60000, "burst": 100, "initial_concurrency": 1, "max_concurrency": 1})
+    started, release = asyncio.Event(), asyncio.Event()
+    holder = asyncio.create_task(hold_slot(limiter, started, release))
+    await started.wait()
+    order = []
+
+    async def call(name):
+        with llm_priority(name.split("-")[0]):
+            async with limiter.request():
+                order.append(name)
+
+    tasks = [asyncio.create_task(call(name)) for name in ("background-1", "background-2", "normal-1", "interactive-1")]
+    await asyncio.sleep(0.01) # All four queued behind the held slot
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    assert order == ["interactive-1", "normal-1", "background-1", "background-2"]
+    stats = limiter.get_stats()["priorities"]
+    assert stats["background"]["requests"] == 2 and stats["background"]["max_wait"] >= stats["interactive"]["max_wait"]
+
+
+@pytest.mark.asyncio
+async def test_aged_background_work_is_promoted():
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 60000, "burst": 100, "initial_concurrency": 1,
+                                   "max_concurrency": 1, "priority_aging": 0.02})
+    started, release = asyncio.Event(), asyncio.Event()
+    holder = asyncio.create_task(hold_slot(limiter, started, release))
+    await started.wait()
+    order = []
+
+    async def call(name, priority):
+        async with limiter.request(priority):
+            order.append(name)
+
+    background = asyncio.create_task(call("old", "background"))
+    await asyncio.sleep(0.05) # Two aging periods: now ranks like an interactive call
+    interactive = asyncio.create_task(call("new", "interactive"))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, background, interactive)
+    assert order == ["old", "new"]
+    assert limiter.class_stats["background"]["promoted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_background_share_keeps_slots_free():
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 60000, "burst": 100, "initial_concurrency": 4,
+                                   "max_concurrency": 4, "background_share": 0.5})
+    release = asyncio.Event()
+    peak = 0
+
+    async def background():
+        nonlocal peak
+        async with limiter.request("background"):
+            peak = max(peak, limiter._in_flight_by_class["background"])
+            await release.wait()
+
+    tasks = [asyncio.create_task(background()) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    assert limiter.in_flight == 2 and limiter.get_stats()["priorities"]["background"]["queued"] == 2
+    async with limiter.request("interactive"): # Starts immediately despite the background backlog
+        assert limiter.in_flight == 3
+    release.set()
+    await asyncio.gather(*tasks)
+    assert peak == 2
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        with llm_priority("urgent"):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_aging_hands_the_turn_to_an_untimed_waiter():
+    # The interactive call sleeps on the token bucket while the background call ages past it; the hand-off
+    # must wake the background call rather than leave both waiting with a free slot and a full token
+    limiter = AdaptiveRateLimiter({"requests_per_minute": 60, "burst": 1, "initial_concurrency": 1,
+                                   "max_concurrency": 1, "priority_aging": 0.5})
+    started, release = asyncio.Event(), asyncio.Event()
+    holder = asyncio.create_task(hold_slot(limiter, started, release))
+    await started.wait()
+    order = []
+
+    async def call(name, priority):
+        async with limiter.request(priority):
+            order.append(name)
+
+    background = asyncio.create_task(call("background", "background"))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call("interactive", "interactive"))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.wait_for(asyncio.gather(holder, background, interactive), timeout=5)
+    assert order == ["background", "interactive"]
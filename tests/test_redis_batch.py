@@ -0,0 +1,360 @@
+import asyncio
+import fnmatch
+import json
+import pytest
+import time
+from adapters.redis_adapter import RedisAdapter
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.command_stack = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.command_stack.append((name, args, kwargs))
+            return self
+        return queue
+
+    def __len__(self):
+        return len(self.command_stack)
+
+    async def execute(self):
+        self.client.round_trips += 1
+        commands, self.command_stack = self.command_stack, []
+        return [getattr(self.client, f"_{name}")(*args, **kwargs) for name, args, kwargs in commands]
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.client = client
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.client.subscribers.setdefault(channel, []).append(self)
+        self.messages.put_nowait({"type": "subscribe", "channel": channel, "data": 1})
+
+    async def listen(self):
+        while True:
+            message = await self.messages.get()
+            if isinstance(message, Exception):
+                raise message # Connection lost
+            yield message
+
+    async def aclose(self):
+        for subscribers in self.client.subscribers.values():
+            if self in subscribers:
+                subscribers.remove(self)
+
+
+class FakeClient:
+    """In-memory Redis that counts round trips"""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+        self.subscribers = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    def _close(self):
+        pass
+
+    def _delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def _publish(self, channel, message):
+        for subscriber in self.subscribers.get(channel, []):
+            subscriber.messages.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(self.subscribers.get(channel, []))
+
+    def __getattr__(self, name):
+        command = getattr(self, f"_{name}")
+
+        async def call(*args, **kwargs):
+            self.round_trips += 1
+            return command(*args, **kwargs)
+        return call
+
+    def _set(self, key, value):
+        self.data[key] = value
+        return True
+
+    def _setex(self, key, ttl, value):
+        return self._set(key, value)
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def _keys(self, pattern):
+        return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    def _hset(self, key, field=None, value=None, mapping=None):
+        self.data.setdefault(key, {}).update(mapping or {field: value})
+        return 1
+
+    def _hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def _hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def _sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+        return len(members)
+
+    def _smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def _exists(self, key):
+        return int(key in self.data)
+
+    def _ttl(self, key):
+        return -1 if key in self.data else -2
+
+    def _scan(self, cursor=0, match=None, count=None):
+        keys = self._keys(match or "*")
+        end = cursor + (count or 10)
+        return (end if end < len(keys) else 0), keys[cursor:end]
+
+    def _zadd(self, key, mapping, nx=False):
+        index = self.data.setdefault(key, {})
+        for member, score in mapping.items():
+            if not (nx and member in index):
+                index[member] = score
+        return len(mapping)
+
+    def _zrevrangebyscore(self, key, max, min, start=0, num=None, withscores=False):
+        def bound(value):
+            return float(str(value).lstrip("(")), str(value).startswith("(")
+        (top, top_open), (bottom, bottom_open) = bound(max), bound(min)
+        members = sorted(((m, s) for m, s in self.data.get(key, {}).items()
+                          if (s < top or (s == top and not top_open)) and (s > bottom or (s == bottom and not bottom_open))),
+                         key=lambda item: (item[1], item[0]), reverse=True)[start:None if num is None else start + num]
+        return members if withscores else [m for m, _ in members]
+
+    def _zrem(self, key, *members):
+        for member in members:
+            self.data.get(key, {}).pop(member, None)
+        return len(members)
+
+    def _zremrangebyrank(self, key, start, stop):
+        ranked = sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        removed = ranked[start:len(ranked) if stop == -1 else stop + 1]
+        for member, _ in removed:
+            del self.data[key][member]
+        return len(removed)
+
+
+def make_adapter():
+    adapter = RedisAdapter({"namespace": "test"})
+    adapter.client = FakeClient()
+    return adapter
+
+
+@pytest.fixture(params=["redis", "sqlite"])
+async def adapter(request, tmp_path):
+    """The same suite runs against Redis (the in-memory stand-in) and the embedded SQLite store"""
+    if request.param == "redis":
+        adapter = make_adapter()
+    else:
+        adapter = RedisAdapter({"namespace": "test", "backend": "sqlite", "sqlite_path": str(tmp_path / "storage.db")})
+    yield adapter
+    await adapter.close()
+
+
+def round_trips(adapter):
+    """Round trips since the last call"""
+    count, adapter.stats["round_trips"] = adapter.stats["round_trips"], 0
+    return count
+
+
+@pytest.mark.asyncio
+async def test_bulk_reads_take_a_fixed_number_of_round_trips(adapter):
+    async with adapter.batch():
+        for i in range(20):
+            await adapter.track_code_snippet(f"snippet-{i}", {"file_path": "app/a.py", "line": i})
+            await adapter.store_context(f"plan:{i}", {"step": i})
+    assert round_trips(adapter) == 1
+
+    snippets = await adapter.get_related_snippets("app/a.py")
+    assert len(snippets) == 20 and round_trips(adapter) == 2
+    found = await adapter.search_context("plan", limit=5)
+    assert [entry["step"] for entry in found] == [19, 18, 17, 16, 15] # Newest first, from the prefix index
+    assert round_trips(adapter) == 2
+    contexts = await adapter.get_contexts(["plan:3", "missing"])
+    assert contexts == {"plan:3": {"step": 3}, "missing": None} and round_trips(adapter) == 1
+
+
+@pytest.mark.asyncio
+async def test_fake_client_counts_the_same_round_trips_as_the_adapter():
+    adapter = make_adapter()
+    await adapter.store_context("plan:1", {"step": 1})
+    await adapter.get_contexts(["plan:1", "plan:2"])
+    assert adapter.client.round_trips == adapter.stats["round_trips"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_nests_and_drops_writes_when_the_block_fails(adapter):
+    with pytest.raises(RuntimeError):
+        async with adapter.batch():
+            await adapter.track_file("app/a.py", {"hash": "x"})
+            raise RuntimeError("abort")
+    assert await adapter.client.keys("*") == [] and round_trips(adapter) == 0
+
+    async with adapter.batch():
+        await adapter.track_file("app/a.py", {"hash": "a"})
+        async with adapter.batch(): # Inner block joins the outer pipeline
+            await adapter.track_file("app/b.py", {"hash": "b"})
+        assert round_trips(adapter) == 0
+    assert round_trips(adapter) == 1
+    metadata = await adapter.get_files_metadata(["app/a.py", "app/b.py", "app/c.py"])
+    assert metadata == {"app/a.py": {"hash": "a"}, "app/b.py": {"hash": "b"}, "app/c.py": None}
+
+
+@pytest.mark.asyncio
+async def test_index_pages_by_prefix_and_file_without_keys(adapter):
+    for i in range(7):
+        await adapter.store_context(f"improvement:app/a.py:{i}", {"file_path": "app/a.py", "n": i})
+    await adapter.store_context("improvement:app/b.py:0", {"file_path": "app/b.py", "n": 99})
+    await adapter.store_context("improvement:app/a.py:cached", {"n": -1}, ttl=60) # Expiring entries are not indexed
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = await adapter.query_context(prefix="improvement:app/a.py", limit=3, cursor=cursor)
+        pages.append([entry["n"] for entry in page])
+        if cursor is None:
+            break
+    assert pages == [[6, 5, 4], [3, 2, 1], [0]]
+    by_file, _ = await adapter.query_context(file_path="app/b.py")
+    assert [entry["n"] for entry in by_file] == [99]
+    assert len(await adapter.search_context("improvement:*", limit=20)) == 8
+
+    # An entry that expired or lost its value is dropped from the index when read
+    await adapter.client.delete("test:context:improvement:app/a.py:6")
+    page, _ = await adapter.query_context(prefix="improvement:app/a.py", limit=3)
+    assert [entry["n"] for entry in page] == [5, 4]
+    assert "improvement:app/a.py:6" not in await adapter.client.zrevrangebyscore("test:index:improvement:app/a.py", "+inf", "-inf")
+
+
+@pytest.mark.asyncio
+async def test_pages_do_not_skip_entries_written_in_the_same_instant(adapter, monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1700000000.5) # Every entry gets the same score
+    for i in range(7):
+        await adapter.store_context(f"step:{i}", {"n": i})
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = await adapter.query_context(prefix="step", limit=3, cursor=cursor)
+        seen.extend(entry["n"] for entry in page)
+        if cursor is None:
+            break
+    assert seen == [6, 5, 4, 3, 2, 1, 0]
+
+
+@pytest.mark.asyncio
+async def test_indexes_keep_the_newest_entries(adapter):
+    adapter.index_max_entries = 3
+    async with adapter.batch():
+        for i in range(5):
+            await adapter.store_context(f"log:{i}", {"file_path": "app/a.py", "n": i})
+    assert [entry["n"] for entry in await adapter.search_context("log", limit=10)] == [4, 3, 2]
+    by_file, _ = await adapter.query_context(file_path="app/a.py")
+    assert [entry["n"] for entry in by_file] == [4, 3, 2]
+    assert await adapter.get_context("log:0") == {"n": 0, "file_path": "app/a.py"} # Trimming only drops index entries
+
+
+@pytest.mark.asyncio
+async def test_glob_queries_scan_even_after_reindexing(adapter):
+    await adapter.store_context("improvement:app/a.py:1", {"n": 1})
+    await adapter.store_context("similar:app/a.py", {"n": 2})
+    await adapter.reindex_contexts()
+    assert await adapter.search_context("app/a.py") == [] # Not a key prefix
+    found = await adapter.search_context("*:app/a.py*")
+    assert sorted(entry["n"] for entry in found) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_legacy_keys_are_found_by_scan_until_reindexed(adapter):
+    adapter.client.keys = None # KEYS is never used
+    for i in range(3):
+        await adapter.client.set(f"test:context:improvement:app/old.py:{i}", json.dumps({"n": i}))
+    assert len(await adapter.search_context("improvement:app/old.py:*")) == 3 # SCAN fallback
+    assert await adapter.search_context("improve:app/old.py") == []
+
+    await adapter.client.set("test:context:improvement:app/old.py:dated", json.dumps({"n": 9, "timestamp": 1600000000}))
+    assert await adapter.reindex_contexts() == 4
+    round_trips(adapter)
+    found = await adapter.search_context("improvement:app/old.py")
+    assert len(found) == 4 and found[-1]["n"] == 9 # Scored by its own timestamp, the others by distinct recent ones
+    assert len({score for _, score in await adapter.client.zrevrangebyscore(
+        "test:index:improvement:app/old.py", "+inf", "-inf", withscores=True)}) == 4
+    assert await adapter.search_context("nothing:here") == []
+    assert round_trips(adapter) == 3 # Two index lookups, no scans
+
+
+@pytest.mark.asyncio
+async def test_large_values_are_stored_compressed_and_read_back(adapter):
+    code = "def handler(x):\n    return x\n" * 200
+    await adapter.store_context("analysis:app/a.py", {"file_path": "app/a.py", "code": code})
+    await adapter.track_code_snippet("abc", {"file_path": "app/a.py", "code": code})
+    await adapter.store_execution_state("task-1", {"log": code})
+    await adapter.client.set("test:context:analysis:legacy", json.dumps({"code": "old"})) # Written before compression
+
+    stored = await adapter.client.get("test:context:analysis:app/a.py")
+    assert not stored.startswith("{") and len(stored) < len(code) / 5
+    assert (await adapter.get_context("analysis:app/a.py"))["code"] == code
+    assert [entry["code"] for entry in await adapter.get_related_snippets("app/a.py")] == [code]
+    assert (await adapter.get_code_snippet("abc"))["code"] == code
+    assert (await adapter.get_execution_state("task-1"))["log"] == code
+    assert await adapter.get_contexts(["analysis:legacy"]) == {"analysis:legacy": {"code": "old"}}
+    assert adapter.codec.get_stats()["compressed"] == 3
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_l1_cache_skips_round_trips_and_follows_other_processes_writes():
+    writer, reader = make_adapter(), make_adapter()
+    writer.client = reader.client = shared = FakeClient() # Two processes on one Redis
+    try:
+        await writer.store_context("quality_config", {"threshold": 0.7})
+        await writer.track_file("app/a.py", {"hash": "a"})
+        assert await reader.get_context("quality_config") == {"threshold": 0.7} # Not subscribed yet: bypassed
+        await settle()
+
+        shared.round_trips = 0
+        for _ in range(5):
+            assert (await reader.get_context("quality_config"))["threshold"] == 0.7
+            assert await reader.get_file_metadata("app/a.py") == {"hash": "a"}
+            assert await reader.get_context("code_patterns") is None # Missing keys are cached too
+        assert shared.round_trips == 3
+        assert reader.l1.get_stats()["hits"] == 12
+
+        await writer.store_context("quality_config", {"threshold": 0.9})
+        await writer.track_file("app/a.py", {"hash": "b"})
+        await settle()
+        assert (await reader.get_context("quality_config"))["threshold"] == 0.9
+        assert await reader.get_files_metadata(["app/a.py"]) == {"app/a.py": {"hash": "b"}}
+
+        # Without a live subscription nothing is served from the cache
+        for subscriber in shared.subscribers[reader.l1.channel]:
+            subscriber.messages.put_nowait(ConnectionError("connection lost"))
+        await settle()
+        shared.round_trips = 0
+        assert (await reader.get_context("quality_config"))["threshold"] == 0.9
+        assert shared.round_trips == 1 and not reader.l1.live
+    finally:
+        await writer.close()
+        await reader.close()
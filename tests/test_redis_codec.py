@@ -0,0 +1,49 @@
+import json
+import zlib
+import pytest
+from adapters.redis_codec import HEADER, Codec, ValueCodec, register_codec
+
+LARGE = json.dumps({"code": "def handler(x):\n    return x\n" * 200})
+
+
+class CountingCodec(Codec):
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def compress(self, data):
+        self.calls += 1
+        return zlib.compress(data, 1)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+def test_large_values_are_compressed_behind_a_header():
+    codec = ValueCodec({"threshold": 512})
+    stored = codec.encode(LARGE)
+    assert stored.startswith(f"{HEADER}zlib:") and len(stored) < len(LARGE) / 5
+    assert codec.decode(stored) == LARGE
+    assert codec.encode('{"small": true}') == '{"small": true}'
+    assert codec.decode('{"plain": "written before compression"}') == '{"plain": "written before compression"}'
+    stats = codec.get_stats()
+    assert (stats["compressed"], stats["decompressed"]) == (1, 1) and stats["ratio"] > 5
+    assert stats["compress_seconds"] > 0
+
+    with pytest.raises(ValueError):
+        codec.decode(f"{HEADER}zlib:not-base64!")
+    with pytest.raises(ValueError):
+        codec.decode(f"{HEADER}unknown:AAAA")
+
+
+def test_codecs_are_pluggable_and_values_stay_readable_across_them():
+    counting = CountingCodec()
+    register_codec(counting)
+    writer = ValueCodec({"codec": "counting", "threshold": 0})
+    stored = writer.encode(LARGE)
+    assert stored.startswith(f"{HEADER}counting:") and counting.calls == 1
+    assert ValueCodec({"codec": "zlib"}).decode(stored) == LARGE # The header names the codec to use
+    assert ValueCodec({"enabled": False}).encode(LARGE) == LARGE
+    assert writer.encode("x" * 8) == "x" * 8 # Not smaller once compressed
+    assert writer.stats["skipped"] == 1
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import pytest
+import aiohttp
+from aiohttp import web
+from adapters.llm_adapter import LLMAdapter
+from adapters.retry import CircuitBreaker, RetryPolicy, error_result, is_retryable_exception, is_retryable_status
+from tests.conftest import UNLIMITED
+
+FAST = {"base_delay": 0.001, "max_delay": 0.01}
+
+
+def is_error(result):
+    return isinstance(result, dict) and "error" in result
+
+
+def scripted(*results):
+    """attempt() returning the given results in order"""
+    remaining = list(results)
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        return remaining.pop(0)
+    attempt.calls = calls
+    return attempt
+
+
+def test_error_classification():
+    assert all(is_retryable_status(status) for status in (429, 500, 502, 503, 504, 529))
+    assert not any(is_retryable_status(status) for status in (400, 401, 403, 404, None))
+    assert is_retryable_exception(asyncio.TimeoutError())
+    assert is_retryable_exception(aiohttp.ServerDisconnectedError())
+    assert not is_retryable_exception(aiohttp.InvalidURL("x"))
+
+
+@pytest.mark.asyncio
+async def test_retryable_errors_are_retried_until_success():
+    policy = RetryPolicy(FAST)
+    attempt = scripted(error_result("overloaded", 503, True), error_result("slow", None, True), {"ok": True})
+    assert await policy.run(attempt, is_error) == {"ok": True}
+    assert len(attempt.calls) == 3
+    assert policy.stats["retries"] == 2 and policy.stats["recovered"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fatal_errors_and_exhausted_attempts_stop():
+    policy = RetryPolicy({**FAST, "max_attempts": 2})
+    fatal = scripted(error_result("bad key", 401, False))
+    assert (await policy.run(fatal, is_error))["status"] == 401 and len(fatal.calls) == 1
+
+    down = scripted(*[error_result("down", 503, True)] * 5)
+    assert (await policy.run(down, is_error))["error"] == "down"
+    assert len(down.calls) == 2
+    assert policy.stats == {"retries": 1, "recovered": 0, "gave_up": 1, "fatal": 1}
+
+
+def test_deadline_stops_backoff():
+    policy = RetryPolicy({"base_delay": 10, "max_delay": 10, "deadline": 0.5})
+    policy.backoff = lambda attempt: 10.0
+    assert policy.next_delay(0, started=0.0) is None
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_fails_fast_and_recovers():
+    policy = RetryPolicy({**FAST, "max_attempts": 1, "circuit_breaker": {"failure_threshold": 2, "reset_timeout": 0.05}})
+    down = scripted(*[error_result("down", 503, True)] * 2)
+    await policy.run(down, is_error)
+    await policy.run(down, is_error)
+    assert policy.breaker.state == "open"
+
+    never = scripted()
+    result = await policy.run(never, is_error)
+    assert result["error"].startswith("Circuit open") and not never.calls
+
+    await asyncio.sleep(0.06)
+    assert await policy.run(scripted({"ok": True}), is_error) == {"ok": True} # Trial request closes it
+    assert policy.get_stats()["circuit"] == "closed" and policy.get_stats()["opened"] == 1
+
+
+def test_throttling_and_client_errors_do_not_open_the_circuit():
+    policy = RetryPolicy({"circuit_breaker": {"failure_threshold": 1}})
+    policy.observe(True, 429, failed=True)
+    policy.observe(False, 400, failed=True)
+    assert policy.breaker.state == "closed"
+
+
+def test_half_open_allows_one_trial_at_a_time():
+    breaker = CircuitBreaker({"failure_threshold": 1, "reset_timeout": 0})
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_adapter_retries_transient_http_errors():
+    hits = []
+
+    async def handler(request):
+        hits.append(request.match_info["model"])
+        if len(hits) % 3 != 0: # Two failures before each success
+            return web.Response(status=503, text="The model is overloaded")
+        event = {"candidates": [{"content": {"parts": [{"text": "hello"}]}, "finishReason": "STOP"}]}
+        if hits[-1].endswith(":streamGenerateContent"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            await response.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+            await response.write_eof()
+            return response
+        return web.json_response(event)
+
+    app = web.Application()
+    app.router.add_post("/v1/models/{model}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    adapter = LLMAdapter({
+        "api_key": "test-retry", "model": "retry-model", "temperature": 0,
+        "api_url": f"http://127.0.0.1:{port}/v1/models/retry-model:generateContent",
+        "rate_limit": UNLIMITED, "cache": {"enabled": False}, "retry": FAST,
+    })
+    try:
+        assert await adapter.generate("Say hi") == "hello"
+        assert await adapter.generate_streaming("Say hi", use_cache=False) == "hello"
+        assert len(hits) == 6
+        assert adapter.retry.get_stats()["retries"] == 4
+    finally:
+        await adapter.close()
+        await runner.cleanup()
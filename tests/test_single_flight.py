@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from aiohttp import web
+from adapters.single_flight import SingleFlight
+from adapters.llm_adapter import LLMAdapter
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return {"value": 42}
+
+    results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+    assert calls == 1
+    assert all(r == {"value": 42} for r in results)
+    assert len({id(r) for r in results}) == 5 # followers receive copies
+    assert flight.stats["coalesced"] == 4
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_does_not_cancel_others():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(flight.do("k", work))
+    second = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_work_is_cancelled_when_every_waiter_leaves():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.ensure_future(flight.do("k", work))
+    await started.wait()
+    waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert flight.stats["abandoned"] == 1
+
+
+@pytest.mark.asyncio
+async def test_adapter_sends_one_request_for_identical_concurrent_prompts():
+    hits = 0
+
+    async def handle(request):
+        nonlocal hits
+        hits += 1
+        await asyncio.sleep(0.05)
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": '{"ok": true}'}]}}]})
+
+    app = web.Application()
+    app.router.add_post("/v1/models/{model}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    adapter = LLMAdapter({
+        "api_key": "test-single-flight",
+        "api_url": f"http://127.0.0.1:{port}/v1/models/stub:generateContent",
+        "rate_limit": {"requests_per_minute": 60000, "burst": 1000},
+        "cache": {"enabled": False},
+    })
+    try:
+        results = await asyncio.gather(*(adapter.generate("same prompt", formated_output="json") for _ in range(4)))
+        assert hits == 1
+        assert results == [{"ok": True}] * 4
+    finally:
+        await adapter.close()
+        await runner.cleanup()
@@ -0,0 +1,95 @@
+import asyncio
+import io
+import pytest
+from rich.console import Console
+from adapters.llm_stub_server import StubLLMServer, STUB_CODE
+from core.agent import Agent
+from core.speculation import SpeculativeSteps
+from utils.cli_ui import CLI_UI
+from utils.schema import Plan, Step
+from tests.conftest import UNLIMITED
+
+
+def is_error(result):
+    return not isinstance(result, str)
+
+
+async def produce(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_result_is_used_only_while_inputs_match():
+    speculation = SpeculativeSteps(enabled=True)
+    speculation.start(1, ("task", "hash-a"), produce("code"))
+    assert await speculation.take(1, ("task", "hash-a"), is_error) == "code"
+
+    speculation.start(2, ("task", "hash-a"), produce("stale", delay=5))
+    task = speculation._current.task
+    assert await speculation.take(2, ("task", "hash-b"), is_error) is None # The file changed underneath
+    await asyncio.sleep(0)
+    assert task.cancelled()
+
+    speculation.start(3, ("task",), produce({"error": "quota"}))
+    assert await speculation.take(3, ("task",), is_error) is None
+    assert await speculation.take(4, ("task",), is_error) is None # Nothing speculated
+    assert speculation.get_stats() == {"started": 3, "used": 1, "discarded": 1, "failed": 1, "hit_rate": 0.333}
+
+
+class ReviewingUI(CLI_UI):
+    """Approves everything; reviewing `touch_on_review` simulates a hand edit of that file"""
+    def __init__(self, touch_on_review=None):
+        super().__init__()
+        self.console = Console(file=io.StringIO())
+        self.touch_on_review = touch_on_review
+        self.reviewed = []
+
+    def ask_confirmation(self, message, default=True):
+        return True
+
+    def ask_edit_confirmation(self, file_path, action="write to"):
+        self.reviewed.append(file_path)
+        if self.touch_on_review and len(self.reviewed) == 1:
+            self.touch_on_review.write_text("# edited by hand\n")
+        return "confirm"
+
+
+async def run_two_step_plan(tmp_path, ui):
+    async with StubLLMServer() as server:
+        config = {
+            "llm": {
+                "api_key": "offline",
+                "api_url": server.api_url("gemini-2.0-flash"),
+                "rate_limit": UNLIMITED,
+                "cache": {"enabled": False},
+            },
+            "working_directory": str(tmp_path),
+            "speculation": {"enabled": True},
+        }
+        agent = Agent(config, ui)
+        agent.current_task = "create two modules"
+        plan = Plan(understanding="two files", files=["a.py", "b.py"], steps=[
+            Step(type="code_generation", description="Create a.py", requirements="greet", file_path="a.py"),
+            Step(type="code_generation", description="Create b.py", requirements="greet", file_path="b.py"),
+        ])
+        try:
+            assert await agent.execute_plan_interactive(plan)
+        finally:
+            await agent.cleanup()
+        return agent, server
+
+
+@pytest.mark.asyncio
+async def test_agent_generates_the_next_step_during_review(tmp_path):
+    agent, server = await run_two_step_plan(tmp_path, ReviewingUI())
+    assert agent.speculation.stats["used"] == 1
+    assert (tmp_path / "b.py").read_text().strip() == STUB_CODE.strip()
+
+
+@pytest.mark.asyncio
+async def test_hand_edit_discards_the_speculated_step(tmp_path):
+    (tmp_path / "b.py").write_text("# original\n")
+    agent, _ = await run_two_step_plan(tmp_path, ReviewingUI(touch_on_review=tmp_path / "b.py"))
+    assert agent.speculation.stats["used"] == 0 and agent.speculation.stats["discarded"] == 1
+    assert (tmp_path / "b.py").read_text().strip() == STUB_CODE.strip() # Regenerated normally, then written
@@ -0,0 +1,86 @@
+import asyncio
+import socket
+import sqlite3
+import pytest
+from adapters.redis_adapter import RedisAdapter
+from adapters.sqlite_store import SQLiteStore
+from core.code_analyzer import CodeAnalyzer
+
+
+def sqlite_adapter(path):
+    return RedisAdapter({"namespace": "test", "backend": "sqlite", "sqlite_path": str(path)})
+
+
+class FakeLLM:
+    model = "gemini-2.0-flash"
+    max_output_tokens = 4000
+    config = {}
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt, formated_output=None, response_schema=None, call_type=None):
+        self.prompts.append(prompt)
+        return {"language": "python", "main_flow": "single"}
+
+
+@pytest.mark.asyncio
+async def test_state_and_analysis_cache_survive_a_restart(tmp_path):
+    path = tmp_path / "state" / "storage.db"
+    first = sqlite_adapter(path)
+    llm = FakeLLM()
+    await CodeAnalyzer(llm, first).analyze("def a():\n    return 1\n", "app/a.py")
+    await first.store_execution_state("task-1", {"completed_steps": [{"description": "step 1"}]})
+    await first.store_context("session", {"n": 1}, ttl=1)
+    await first.close()
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    second = sqlite_adapter(path) # A new run on the same machine
+    try:
+        cached = await CodeAnalyzer(llm, second).analyze("def a():\n    return 1\n", "app/a.py")
+        assert cached.main_flow == "single" and len(llm.prompts) == 1 # Served from the store, no LLM call
+        state = await second.get_execution_state("task-1")
+        assert state["completed_steps"] == [{"description": "step 1"}]
+        await asyncio.sleep(1.1)
+        assert await second.get_context("session") is None # Expired
+    finally:
+        await second.close()
+
+
+@pytest.mark.asyncio
+async def test_auto_backend_falls_back_to_sqlite_when_redis_is_unreachable(tmp_path):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1] # Nothing listens here once the probe is closed
+    adapter = RedisAdapter({"host": "127.0.0.1", "port": port, "backend": "auto", "timeout": 2,
+                            "sqlite_path": str(tmp_path / "storage.db")})
+    try:
+        assert adapter.storage == "sqlite" # Decided when the adapter is created, without waiting for connect()
+        assert await adapter.connect() and adapter.storage == "sqlite"
+        assert isinstance(adapter.client, SQLiteStore) and not adapter.l1.enabled
+        await adapter.track_file("app/a.py", {"hash": "a"})
+        assert await adapter.get_file_metadata("app/a.py") == {"hash": "a"}
+    finally:
+        await adapter.close()
+
+    strict = RedisAdapter({"host": "127.0.0.1", "port": port, "timeout": 2})
+    try:
+        assert not await strict.connect() and strict.storage == "redis"
+    finally:
+        await strict.close()
+
+
+@pytest.mark.asyncio
+async def test_pipelined_commands_succeed_or_fail_on_their_own(tmp_path):
+    store = SQLiteStore(str(tmp_path / "storage.db"))
+    try:
+        pipeline = store.pipeline(transaction=False)
+        pipeline.set("a", "1").zadd("z", {"x": 1, None: 2}).set("b", "2") # The None member fails after "x" was added
+        with pytest.raises(sqlite3.IntegrityError):
+            await pipeline.execute()
+        assert await store.mget(["a", "b"]) == ["1", "2"] # The commands around it were applied...
+        assert await store.zrevrangebyscore("z", "+inf", "-inf") == [] # ...and the failed one was undone entirely
+        results = await pipeline.zadd("z", {"m": 1}).zadd("z", {None: 1}).execute(raise_on_error=False)
+        assert results[0] == 1 and isinstance(results[1], sqlite3.IntegrityError)
+    finally:
+        await store.close()
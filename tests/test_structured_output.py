@@ -0,0 +1,78 @@
+import json
+import pytest
+from aiohttp import web
+from core.planner import Planner
+from utils.schema import (Plan, PLAN_RESPONSE_SCHEMA, CODE_ANALYSIS_SCHEMA, dataclass_schema, validate_schema)
+
+def test_schema_is_derived_from_dataclasses():
+    steps = PLAN_RESPONSE_SCHEMA["properties"]["steps"]["items"]
+    assert PLAN_RESPONSE_SCHEMA["required"] == ["understanding", "files", "steps"]
+    assert "code_modification" in steps["properties"]["type"]["enum"]
+    assert steps["required"] == ["type", "description"]
+    assert steps["properties"]["file_path"]["nullable"] is True
+    assert "params" not in steps["properties"] # Free-form dicts cannot be expressed
+    assert CODE_ANALYSIS_SCHEMA["properties"]["functions"]["items"]["required"] == ["name"]
+    assert dataclass_schema(Plan)["properties"]["files"] == {"type": "ARRAY", "items": {"type": "STRING"}}
+
+
+def test_validate_schema_reports_every_violation():
+    bad = {"understanding": 1, "steps": [{"type": "delete_everything"}]}
+    errors = validate_schema(bad, PLAN_RESPONSE_SCHEMA)
+    assert "$.files: missing required property" in errors
+    assert "$.understanding: expected string" in errors
+    assert any("delete_everything" in e for e in errors)
+    assert "$.steps[0].description: missing required property" in errors
+
+
+@pytest.mark.asyncio
+async def test_structured_request_round_trips_through_stub(stub_server, make_llm_adapter):
+    adapter = make_llm_adapter((await stub_server()).api_url(), cache={"enabled": False})
+    payload = adapter._build_payload("analyze", "json", CODE_ANALYSIS_SCHEMA)
+    assert payload["generationConfig"]["responseMimeType"] == "application/json"
+    result = await adapter.generate("analyze this", response_schema=CODE_ANALYSIS_SCHEMA)
+    assert not validate_schema(result, CODE_ANALYSIS_SCHEMA)
+    assert adapter.json_stats["structured"] == 1
+
+    # The stub rejects schemas the real API would reject
+    rejected = await adapter.generate("x", response_schema={"type": "OBJECT", "properties": {}})
+    assert "non-empty properties" in rejected["error"]
+
+
+@pytest.mark.asyncio
+async def test_schema_violation_is_an_error_not_a_guess(stub_server, make_llm_adapter):
+    async def handler(request):
+        text = json.dumps({"understanding": "x"}) # Missing files/steps
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    adapter = make_llm_adapter((await stub_server(handler)).api_url(), cache={"enabled": False})
+    result = await adapter.generate("plan", response_schema=PLAN_RESPONSE_SCHEMA)
+    assert "violates schema" in result["error"]
+    assert adapter.json_stats["structured_invalid"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disabled_structured_output_falls_back_to_prompt_json(make_llm_adapter):
+    adapter = make_llm_adapter("http://unused", cache={"enabled": False}, structured_output=False)
+    captured = {}
+
+    async def fake_send(data, formated_output, cache_key, response_schema=None):
+        captured.update(data["generationConfig"])
+        return adapter._process_output('```json\n{"language": "python"}\n```', formated_output)
+
+    adapter._send_generate_request = fake_send
+    result = await adapter.generate("analyze", formated_output="json", response_schema=CODE_ANALYSIS_SCHEMA)
+    assert result == {"language": "python"}
+    assert "responseSchema" not in captured
+    assert adapter.json_stats["markdown"] == 1
+
+
+@pytest.mark.asyncio
+async def test_planner_returns_reply_for_conversational_structured_response():
+    class FakeLLM:
+        structured_output = True
+
+        async def generate(self, prompt, formated_output=None, response_schema=None, call_type=None):
+            assert response_schema is PLAN_RESPONSE_SCHEMA
+            return {"understanding": "", "files": [], "steps": [], "reply": "Hi! What should I build?"}
+
+    assert await Planner(FakeLLM()).create_plan("hello there") == "Hi! What should I build?"
@@ -0,0 +1,122 @@
+"""
+Task-scoped cancellation and deadlines.
+A CancelScope wraps one agent operation (a task, a step). Cancelling it, or passing its deadline, cancels
+the asyncio task running it, so in-flight LLM requests, Redis commands and terminal processes stop at once
+instead of running out their own timeouts. Adapters read the deadline through time_remaining().
+"""
+import asyncio
+import contextvars
+import time
+from typing import Any, Coroutine, Optional, Set
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_current_scope: contextvars.ContextVar[Optional["CancelScope"]] = contextvars.ContextVar("cancel_scope", default=None)
+
+class OperationCancelled(Exception):
+    """Raised out of a CancelScope that was cancelled; reason says why"""
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class DeadlineExceeded(OperationCancelled):
+    """Raised out of a CancelScope whose deadline passed"""
+
+class CancelScope:
+    def __init__(self, timeout: Optional[float] = None, name: str = "operation"):
+        self.name = name
+        self.timeout = timeout # Seconds from entry; None inherits the enclosing scope's deadline only
+        self.deadline: Optional[float] = None # time.monotonic() value
+        self.reason: Optional[str] = None
+        self._expired = False
+        self._task: Optional[asyncio.Task] = None
+        self._active = False
+        self._cancelled_task = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._children: Set[asyncio.Task] = set()
+        self._token: Optional[contextvars.Token] = None
+        self.parent: Optional["CancelScope"] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (never negative), or None without one"""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    async def __aenter__(self) -> "CancelScope":
+        self._task = asyncio.current_task()
+        parent = self.parent = _current_scope.get()
+        inherited = parent.deadline if parent else None
+        own = time.monotonic() + self.timeout if self.timeout is not None else None
+        self.deadline = min((d for d in (inherited, own) if d is not None), default=None)
+        if own is not None and (inherited is None or own < inherited):
+            # An inherited deadline is enforced by the scope that set it
+            self._timer = asyncio.get_running_loop().call_later(self.remaining(), self._expire)
+        self._token = _current_scope.set(self)
+        self._active = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._active = False
+        _current_scope.reset(self._token)
+        if self._timer:
+            self._timer.cancel()
+        for child in list(self._children):
+            child.cancel() # Nothing started in the scope outlives it
+        if self._cancelled_task:
+            uncancel = getattr(self._task, "uncancel", None) # Python 3.11+
+            if uncancel:
+                uncancel()
+            if exc_type is asyncio.CancelledError:
+                error = DeadlineExceeded if self._expired else OperationCancelled
+                raise error(self.reason) from exc
+        return False
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the operation and everything it spawned (call from another task, a callback or a signal handler)"""
+        if self.reason is not None:
+            return
+        self.reason = reason
+        logger.info(f"Cancelling {self.name}: {reason}")
+        for child in list(self._children):
+            child.cancel()
+        if self._active and self._task is not None and not self._task.done():
+            self._cancelled_task = True
+            self._task.cancel()
+
+    def _expire(self):
+        self._expired = True
+        self.cancel(f"{self.name} exceeded its {self.timeout:g}s deadline")
+
+    def spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Start coro as a task bound to this scope: cancelled with it, and when it exits"""
+        task = asyncio.ensure_future(coro)
+        self._children.add(task)
+        task.add_done_callback(self._children.discard)
+        if self.cancelled or not self._active:
+            task.cancel()
+        return task
+
+def current_scope() -> Optional[CancelScope]:
+    return _current_scope.get()
+
+def cancellation_reason() -> Optional[str]:
+    """Why the current operation was cancelled (innermost cancelled scope), or None"""
+    scope = _current_scope.get()
+    while scope is not None:
+        if scope.cancelled:
+            return scope.reason
+        scope = scope.parent
+    return None
+
+def time_remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the current scope's deadline, capped at default (None: no limit either way)"""
+    scope = _current_scope.get()
+    remaining = scope.remaining() if scope else None
+    if remaining is None:
+        return default
+    return remaining if default is None else min(default, remaining)
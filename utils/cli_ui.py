@@ -1,5 +1,6 @@
 import sys
 import os # Import os for path operations
+import time
 from typing import Dict, Any, Optional, List, Literal
 
 from rich.console import Console
@@ -11,6 +12,7 @@ from rich.text import Text
 from rich.table import Table
 from rich.tree import Tree
 from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.live import Live
 
 # Assuming schema definitions are in utils.schema
 # Need to handle potential import errors if schema is complex or has issues
@@ -27,6 +29,71 @@ except ImportError as e:
      # raise
 
 
+class CodeStreamRenderer:
+    """Renders code into a live-updating panel as chunks stream in from the LLM."""
+
+    def __init__(self, console: Console, language: str = 'python', file_path: Optional[str] = None):
+        self.console = console
+        self.language = language
+        self.file_path = file_path
+        self.lines: List[str] = [] # Completed lines; appending a chunk never rescans them
+        self.tail = "" # The line still being streamed
+        self.chars = 0
+        self.start_time: Optional[float] = None
+        self.first_chunk_time: Optional[float] = None
+        self._live: Optional[Live] = None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """Seconds between the request starting and the first chunk arriving."""
+        if self.start_time is None or self.first_chunk_time is None:
+            return None
+        return self.first_chunk_time - self.start_time
+
+    def __enter__(self) -> 'CodeStreamRenderer':
+        self.start_time = time.perf_counter()
+        # Transient: the live panel is replaced by the final display_code panel once done
+        self._live = Live(self._render(), console=self.console, refresh_per_second=8, transient=True)
+        self._live.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._live:
+            self._live.__exit__(exc_type, exc, tb)
+            self._live = None
+        elapsed = time.perf_counter() - (self.start_time or time.perf_counter())
+        ttft = self.time_to_first_token
+        if ttft is not None:
+            self.console.print(f"[dim]First token after {ttft:.2f}s, {self.chars} chars streamed in {elapsed:.2f}s[/dim]")
+        return False # Never swallow exceptions
+
+    def on_chunk(self, chunk: str):
+        """Append a streamed chunk and refresh the live panel."""
+        if self.first_chunk_time is None:
+            self.first_chunk_time = time.perf_counter()
+        self.chars += len(chunk)
+        *completed, self.tail = (self.tail + chunk).split("\n")
+        self.lines.extend(line.rstrip("\r") for line in completed)
+        if self._live:
+            self._live.update(self._render())
+
+    def _render(self) -> Panel:
+        title = f"Generating ({self.language})"
+        if self.file_path:
+            title += f" - Target: {self.file_path}"
+        if self.first_chunk_time is None:
+            return Panel("[dim]Waiting for first token...[/dim]", title=title, border_style="yellow")
+        title += f" - TTFT {self.time_to_first_token:.2f}s"
+        # Only the tail fits on screen while streaming
+        max_lines = max(self.console.height - 6, 5)
+        total = len(self.lines) + bool(self.tail)
+        visible_lines = self.lines[-max_lines:] if not self.tail else self.lines[-(max_lines - 1):] + [self.tail]
+        visible = "\n".join(visible_lines)
+        start_line = max(total - max_lines, 0) + 1
+        syntax = Syntax(visible, self.language, theme="default", line_numbers=True, start_line=start_line, word_wrap=False)
+        return Panel(syntax, title=title, border_style="yellow", expand=True)
+
+
 class CLI_UI:
     """Handles all Command Line Interface interactions using Rich."""
 
@@ -41,7 +108,7 @@ class CLI_UI:
             title="Welcome",
             border_style="green"
         ))
-        self.console.print("Type your coding task below, or 'exit' to quit.", style="dim")
+        self.console.print("Type your coding task below, '/calls [task_id|all]' to see LLM calls, or 'exit' to quit.", style="dim")
 
     def ask_for_task(self) -> str:
         """Prompts the user for the next task."""
@@ -211,6 +278,10 @@ class CLI_UI:
         # Display Syntax object within a Panel
         self.console.print(Panel(syntax, title=title, border_style="blue", expand=True)) # Expand panel to fit code
 
+    def stream_code(self, language: str = 'python', file_path: Optional[str] = None) -> CodeStreamRenderer:
+        """Returns a context manager that renders streamed code live; feed it via its on_chunk method."""
+        return CodeStreamRenderer(self.console, language=language, file_path=file_path)
+
     def display_command(self, command: str):
         """Displays a command to be executed, formatted in a Panel."""
         # Use Rich markup for styling the command prompt
@@ -378,4 +449,37 @@ class CLI_UI:
 
              self.console.print(table) # Print the steps summary table
          else:
-             self.console.print("[dim]No step results recorded for this task.[/dim]") # Message if no results
\ No newline at end of file
+             self.console.print("[dim]No step results recorded for this task.[/dim]") # Message if no results
+         # One-line LLM usage summary (full per-call breakdown: the /calls command)
+         llm_summary = results.get("llm_calls", {}).get("summary")
+         if llm_summary and llm_summary["calls"]:
+             self.console.print(self._format_llm_summary(llm_summary), style="dim")
+
+    def _format_llm_summary(self, summary: Dict[str, Any]) -> str:
+        return (f"LLM: {summary['calls']} calls ({summary['cached']} cached, {summary['errors']} failed), "
+                f"{summary['seconds']:.1f}s total, {summary['queue_wait']:.1f}s queued, "
+                f"{summary['prompt_tokens']} prompt + {summary['response_tokens']} response tokens, ${summary['cost']:.4f}")
+
+    def display_llm_calls(self, report: Dict[str, Any]):
+        """Displays the LLM call ledger for a task: one row per call, then totals per component."""
+        calls = report.get("calls", [])
+        title = f"LLM calls for task {report['task_id']}" if report.get("task_id") else "LLM calls (all tasks)"
+        if not calls:
+            self.console.print(f"[dim]No LLM calls recorded ({title}).[/dim]")
+            return
+        table = Table(title=title, show_header=True, header_style="bold blue", border_style="dim")
+        for column in ("#", "Component", "Model", "Source", "Status", "Queue", "Connect", "TTFB", "Total", "Tokens in/out", "Cost"):
+            table.add_column(column, justify="left" if column in ("Component", "Model", "Source", "Status") else "right")
+        for idx, call in enumerate(calls, 1):
+            color = {"ok": "green", "cancelled": "yellow"}.get(call["status"], "red")
+            ttfb = f"{call['ttfb']:.2f}s" if call["ttfb"] is not None else "-"
+            table.add_row(str(idx), call["component"], call["model"], call["source"], f"[{color}]{call['status']}[/{color}]",
+                          f"{call['queue_wait']:.2f}s", f"{call['connect']:.2f}s", ttfb, f"{call['total']:.2f}s",
+                          f"{call['prompt_tokens']}/{call['response_tokens']}", f"${call['cost']:.4f}")
+        self.console.print(table)
+
+        summary = report["summary"]
+        for component, totals in summary["by_component"].items():
+            self.console.print(f"  [cyan]{component}[/cyan]: {totals['calls']} calls, {totals['seconds']:.1f}s, "
+                               f"{totals['prompt_tokens'] + totals['response_tokens']} tokens, ${totals['cost']:.4f}")
+        self.console.print(self._format_llm_summary(summary), style="bold")
@@ -2,7 +2,7 @@
 Helper utilities for the AI Coding Agent
 """
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 import hashlib
 import os
 import platform
@@ -37,6 +37,24 @@ def format_code(code: str, language: str) -> str:
     # For now, just return the code as-is
     return code
 
+def check_syntax(code: str, language: str) -> Optional[str]:
+    """Return a description of the first syntax error in code, or None if it parses (or cannot be checked)"""
+    if not isinstance(code, str):
+        return "response is not code"
+    if language == "python":
+        try:
+            compile(code, "<generated>", "exec")
+        except SyntaxError as e:
+            return f"SyntaxError on line {e.lineno}: {e.msg}"
+        except ValueError as e: # e.g. null bytes
+            return str(e)
+    elif language == "json":
+        try:
+            json.loads(code)
+        except json.JSONDecodeError as e:
+            return f"Invalid JSON on line {e.lineno}: {e.msg}"
+    return None
+
 def extract_language_from_path(file_path: str) -> str:
     """Extract the programming language from a file path."""
     extension = os.path.splitext(file_path)[1].lower()
@@ -0,0 +1,187 @@
+"""
+Single-pass extraction of JSON from LLM responses.
+Finds the first JSON object or array in free text: a bare value, the body of a ```json fence, or an object
+embedded in prose, with brackets inside strings handled. find_json()/iter_json() scan complete text and parse
+each candidate once with the C decoder; JSONScanner does the same incrementally as stream chunks arrive.
+Arrays are only taken at the start of the text or of a fence, so "[1]"-style references in prose are skipped.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional
+
+FENCE = "```"
+
+_OUTSIDE_RE = re.compile(r"```|[{\[]") # Fences and possible value starts
+# Inside a value only strings and brackets matter; the rest is skipped in C. A string that runs to the end of the text
+# so far matches without its closing quote (group 1 empty, or a trailing backslash that may escape the next chunk)
+_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("|\\?\Z)|[{}\[\]]', re.S)
+_STRING_BODY_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S) # String contents up to the closing quote
+_FENCE_HEADER_RE = re.compile(r"[\w+-]*\s*") # Language tag and whitespace after an opening fence
+_WHITESPACE_RE = re.compile(r"\s*")
+_CLOSERS = {"{": "}", "[": "]"}
+_decoder = json.JSONDecoder()
+
+@dataclass
+class JSONMatch:
+    value: Any
+    start: int # Offsets of the value in the scanned text
+    end: int
+    fenced: bool # Found inside a ``` block
+
+    def kind(self, text: str) -> str:
+        """How the value was embedded: "direct" (the whole text), "markdown" (a fence) or "braces" (prose)"""
+        if self.fenced:
+            return "markdown"
+        if not text[:self.start].strip() and not text[self.end:].strip():
+            return "direct"
+        return "braces"
+
+class JSONScanner:
+    """Incremental scanner: feed() chunks as they arrive; .match is set once the first value is complete"""
+
+    def __init__(self, text: str = ""):
+        self.match: Optional[JSONMatch] = None
+        self._chunks: List[str] = [text]
+        self._text: Optional[str] = text # Joined chunks, built on demand
+        self._buffer = text # Text from offset _base on; scanned text is trimmed so each chunk is scanned once
+        self._base = 0
+        self._pos = 0
+        self._fenced = False
+        self._region_start: Optional[int] = 0 # Start of the text or of a fence body: where an array may begin
+        self._start: Optional[int] = None # Start of the value being tracked
+        self._start_fenced = False
+        self._stack: List[str] = []
+        self._in_string = False
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._chunks)
+            self._chunks = [self._text]
+        return self._text
+
+    def feed(self, chunk: str) -> Optional[JSONMatch]:
+        self._chunks.append(chunk)
+        self._text = None
+        if self.match is None:
+            self._buffer += chunk
+            self._scan(complete=False)
+            self._trim()
+        return self.match
+
+    def _scan(self, complete: bool):
+        """Advance until a value is matched or the text runs out; complete=True when no more text will arrive"""
+        while self.match is None:
+            if self._start is None:
+                if not self._find_start(complete):
+                    return
+            elif not self._track():
+                return
+
+    def _find_start(self, complete: bool) -> bool:
+        buffer, base = self._buffer, self._base
+        found = _OUTSIDE_RE.search(buffer, self._pos - base)
+        if found is None:
+            if not complete:
+                # A fence may be split across chunks: rescan any trailing backticks next time
+                self._pos = max(self._pos, base + len(buffer.rstrip("`")))
+            else:
+                self._pos = base + len(buffer)
+            return False
+        index = base + found.start()
+        if found.group() == FENCE:
+            self._fenced = not self._fenced
+            self._pos = base + found.end()
+            self._region_start = self._pos if self._fenced else None
+            return True
+        if found.group() == "[" and not self._at_region_start(index):
+            self._pos = index + 1
+            return True
+        self._start, self._start_fenced = index, self._fenced
+        if complete:
+            self._decode(index) # Complete text: let the C decoder find the end
+        else:
+            self._stack = [_CLOSERS[found.group()]]
+            self._pos = index + 1
+        return True
+
+    def _region_prefix_end(self, end: int) -> int:
+        """How far from the region start the text is still only whitespace (or a fence's language tag)"""
+        pattern = _FENCE_HEADER_RE if self._fenced else _WHITESPACE_RE
+        return self._base + pattern.match(self._buffer, self._region_start - self._base, end - self._base).end()
+
+    def _at_region_start(self, index: int) -> bool:
+        return self._region_start is not None and self._region_prefix_end(index) == index
+
+    def _track(self) -> bool:
+        """Follow brackets and strings of the current value; False when more text is needed"""
+        buffer, base = self._buffer, self._base
+        pos = self._pos - base
+        while True:
+            if self._in_string:
+                pos = _STRING_BODY_RE.match(buffer, pos).end()
+                if pos == len(buffer) or buffer[pos] == "\\":
+                    self._pos = base + pos # Unterminated so far (a trailing backslash is rescanned)
+                    return False
+                pos, self._in_string = pos + 1, False
+                continue
+            for found in _TOKEN_RE.finditer(buffer, pos):
+                char = buffer[found.start()]
+                if char == '"':
+                    if found.group(1) != '"':
+                        self._in_string = True # Runs past the end of the text so far
+                        break
+                elif char in _CLOSERS:
+                    self._stack.append(_CLOSERS[char])
+                elif not self._stack or self._stack.pop() != char:
+                    self._reject()
+                    return True
+                elif not self._stack:
+                    self._decode(self._start)
+                    return True
+            else:
+                self._pos = base + len(buffer)
+                return False
+            pos = found.start() + 1
+
+    def _decode(self, start: int):
+        try:
+            value, end = _decoder.raw_decode(self.text, start)
+        except ValueError:
+            self._reject()
+            return
+        self.match = JSONMatch(value, start, end, self._start_fenced)
+        self._start = None
+
+    def _reject(self):
+        """Not JSON after all (e.g. "{name}" in prose): resume looking just past its opening bracket"""
+        self._pos = self._start + 1
+        self._start, self._stack, self._in_string = None, [], False
+        if self._pos < self._base:
+            self._buffer, self._base = self.text[self._pos:], self._pos
+
+    def _trim(self):
+        """Drop scanned text from the buffer, first settling whether an array may still start the region"""
+        cut = self._pos # A value being tracked is decoded from the joined text, so its start can go too
+        if cut <= self._base:
+            return
+        if self._region_start is not None and self._region_start < cut:
+            self._region_start = cut if self._region_prefix_end(cut) == cut else None
+        self._buffer, self._base = self._buffer[cut - self._base:], cut
+
+def iter_json(text: str, start: int = 0) -> Iterator[JSONMatch]:
+    """Consecutive JSON values in complete text, from offset start"""
+    scanner = JSONScanner(text)
+    scanner._pos = scanner._region_start = start
+    while True:
+        scanner._scan(complete=True)
+        if scanner.match is None:
+            return
+        match, scanner.match = scanner.match, None
+        yield match
+        scanner._pos = scanner._region_start = match.end
+
+def find_json(text: str) -> Optional[JSONMatch]:
+    """First JSON object or array in complete text, or None"""
+    return next(iter_json(text), None)
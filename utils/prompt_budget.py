@@ -0,0 +1,197 @@
+"""
+Token-budgeted prompt assembly.
+Estimates tokens offline, fits optional context into a per-model budget by priority
+(drop low-value items, then summarise, then drop), and never cuts required sections.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Advertised input context windows; unknown models fall back to DEFAULT_CONTEXT_WINDOW
+MODEL_CONTEXT_WINDOWS = {
+    "gemini-2.0-flash": 1_048_576,
+    "gemini-2.0-flash-lite": 1_048_576,
+    "gemini-1.5-flash": 1_048_576,
+    "gemini-1.5-pro": 2_097_152,
+}
+DEFAULT_CONTEXT_WINDOW = 32_768
+DEFAULT_MAX_PROMPT_TOKENS = 24_000 # Far below the window: prompt size drives latency long before the hard limit
+
+# Words, digit runs, newline-bearing whitespace and single punctuation marks, in one pass
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|\s*\n\s*|[^\w\s]")
+_SUMMARY_MARKER = "\n... [{} tokens trimmed] ...\n"
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count without a tokenizer (errs slightly high for code)"""
+    if not text:
+        return 0
+    tokens = 0
+    for match in _TOKEN_RE.finditer(text):
+        piece = match.group()
+        if piece[0].isalpha():
+            tokens += 1 + (len(piece) - 1) // 5 # Long identifiers split into several sub-words
+        elif piece[0].isdigit():
+            tokens += 1 + (len(piece) - 1) // 3
+        else:
+            tokens += 1
+    return tokens
+
+def summarize_text(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of text within roughly max_tokens, marking what was cut"""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    keep_chars = max(0, int(len(text) * max_tokens / total) - len(_SUMMARY_MARKER))
+    head = keep_chars * 2 // 3 # The start of a snippet/history usually says what it is
+    tail = keep_chars - head
+    return text[:head] + _SUMMARY_MARKER.format(total - max_tokens) + (text[-tail:] if tail else "")
+
+def _render(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, indent=2, default=str)
+
+@dataclass
+class PromptPart:
+    """One optional piece of context rendered into a template field as a JSON object entry"""
+    field: str # Template placeholder this part is rendered into
+    name: str # Key inside that field's JSON object; also the report label
+    value: Any
+    priority: int = 50 # Lower is trimmed first
+    droppable: bool = True # List values may lose individual items before anything is summarised
+
+@dataclass
+class BuiltPrompt:
+    prompt: str
+    section_tokens: Dict[str, int]
+    total_tokens: int
+    budget: int
+    dropped: List[str] = field(default_factory=list)
+    summarised: List[str] = field(default_factory=list)
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.dropped or self.summarised)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "sections": self.section_tokens,
+            "total_tokens": self.total_tokens,
+            "budget": self.budget,
+            "dropped": self.dropped,
+            "summarised": self.summarised,
+        }
+
+class PromptBuilder:
+    def __init__(self, model: str, config: Optional[Dict[str, Any]] = None, max_output_tokens: int = 0):
+        config = config or {}
+        self.model = model
+        self.enabled = config.get("enabled", True)
+        per_model = config.get("max_prompt_tokens", {})
+        max_prompt = per_model.get(model, config.get("default_max_prompt_tokens", DEFAULT_MAX_PROMPT_TOKENS))
+        window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+        self.budget = max(0, min(int(max_prompt), window - int(max_output_tokens)))
+
+    @classmethod
+    def for_adapter(cls, llm_adapter: Any, call_type: Optional[str] = None) -> "PromptBuilder":
+        """Budget for the adapter's model, reading llm.prompt_budget from its config"""
+        if call_type and hasattr(llm_adapter, "adapter_for"):
+            llm_adapter = llm_adapter.adapter_for(call_type) # ModelRouter: budget for the routed tier's model
+        config = getattr(llm_adapter, "config", None) or {}
+        return cls(
+            getattr(llm_adapter, "model", "unknown"),
+            config.get("prompt_budget", {}),
+            max_output_tokens=getattr(llm_adapter, "max_output_tokens", 0)
+        )
+
+    def build(self, template: str, required: Dict[str, str], parts: List[PromptPart],
+              empty_text: Optional[Dict[str, str]] = None) -> BuiltPrompt:
+        """
+        Format template with the required fields verbatim and as many optional parts as fit the budget.
+        Trimming order: drop list items of droppable parts (lowest priority first), then summarise
+        the remaining parts (lowest priority first), then drop whole parts.
+        empty_text maps optional fields to the text used when none of their parts survive.
+        """
+        empty_text = empty_text or {}
+        values: Dict[str, Any] = {part.name: part.value for part in parts}
+        optional_fields = list(dict.fromkeys([*empty_text, *(part.field for part in parts)]))
+        dropped: List[str] = []
+        summarised: List[str] = []
+
+        def render_fields() -> Dict[str, str]:
+            rendered = {}
+            for field_name in optional_fields:
+                entries = {p.name: values[p.name] for p in parts if p.field == field_name and p.name in values}
+                if entries:
+                    rendered[field_name] = json.dumps(entries, indent=2, default=str)
+                else:
+                    rendered[field_name] = empty_text.get(field_name, "No additional context")
+            return rendered
+
+        skeleton = template.format(**required, **{f: "" for f in optional_fields})
+        fixed_tokens = estimate_tokens(skeleton)
+        part_tokens = {name: estimate_tokens(_render(value)) for name, value in values.items()}
+
+        def over_budget() -> int:
+            # Per-part estimates plus the JSON framing; exact enough to steer trimming
+            return fixed_tokens + sum(part_tokens.values()) + 4 * len(part_tokens) - self.budget
+
+        if self.enabled and over_budget() > 0:
+            by_priority = sorted(parts, key=lambda p: p.priority)
+
+            # 1. Drop individual items from list-valued parts (e.g. related snippets), largest first
+            for part in by_priority:
+                value = values.get(part.name)
+                if not part.droppable or not isinstance(value, list):
+                    continue
+                items = sorted(value, key=lambda item: estimate_tokens(_render(item)))
+                while items and over_budget() > 0:
+                    items.pop()
+                    values[part.name] = items
+                    part_tokens[part.name] = estimate_tokens(_render(items))
+                if len(items) < len(value):
+                    dropped.append(f"{part.name}: {len(value) - len(items)} of {len(value)} items")
+                if not items:
+                    del values[part.name], part_tokens[part.name]
+                if over_budget() <= 0:
+                    break
+
+            # 2. Summarise whatever is left, lowest priority first
+            for part in by_priority:
+                excess = over_budget()
+                if excess <= 0:
+                    break
+                if part.name not in values:
+                    continue
+                target = part_tokens[part.name] - excess
+                if target < 32:
+                    continue # Too small to be a useful summary; left for step 3
+                values[part.name] = summarize_text(_render(values[part.name]), target)
+                part_tokens[part.name] = estimate_tokens(values[part.name])
+                summarised.append(part.name)
+
+            # 3. Still over: drop whole parts
+            for part in by_priority:
+                if over_budget() <= 0:
+                    break
+                if part.name in values:
+                    del values[part.name], part_tokens[part.name]
+                    dropped.append(part.name)
+
+        prompt = template.format(**required, **render_fields())
+        section_tokens = {name: estimate_tokens(text) for name, text in required.items()}
+        section_tokens.update(part_tokens)
+        section_tokens["template"] = max(0, fixed_tokens - sum(estimate_tokens(text) for text in required.values()))
+        built = BuiltPrompt(prompt, section_tokens, estimate_tokens(prompt), self.budget, dropped, summarised)
+
+        if fixed_tokens > self.budget:
+            logger.warning(f"Required prompt sections alone need ~{fixed_tokens} tokens (budget {self.budget}); sending them uncut")
+        if built.trimmed:
+            logger.info(f"Trimmed prompt to ~{built.total_tokens}/{self.budget} tokens (dropped={dropped}, summarised={summarised})")
+        logger.debug(f"Prompt tokens by section: {section_tokens}")
+        return built
@@ -71,8 +71,8 @@
 
 # utils/schema.py
 
-from typing import Dict, List, Any, Optional, Union, Literal
-from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Union, Literal, get_args, get_origin, get_type_hints
+from dataclasses import dataclass, field, fields, is_dataclass, MISSING
 # Define the data classes
 
 @dataclass
@@ -121,12 +121,25 @@ class CodeAnalysis:
     language: str
     analysis_focus: Optional[str] = "general" # Added: What was analyzed (e.g., 'general', 'dependencies')
     imports: List[str] = field(default_factory=list)
-    functions: List[Dict[str, Any]] = field(default_factory=list) # e.g., [{"name": "...", "signature": "...", "purpose": "..."}]
-    classes: List[Dict[str, Any]] = field(default_factory=list) # e.g., [{"name": "...", "methods": [...]}]
+    functions: List[Dict[str, Any]] = field(default_factory=list, metadata={"schema": {
+        "type": "ARRAY", "items": {"type": "OBJECT", "properties": {
+            "name": {"type": "STRING"}, "signature": {"type": "STRING"}, "purpose": {"type": "STRING"}
+        }, "required": ["name"]}
+    }}) # e.g., [{"name": "...", "signature": "...", "purpose": "..."}]
+    classes: List[Dict[str, Any]] = field(default_factory=list, metadata={"schema": {
+        "type": "ARRAY", "items": {"type": "OBJECT", "properties": {
+            "name": {"type": "STRING"}, "methods": {"type": "ARRAY", "items": {"type": "STRING"}}
+        }, "required": ["name"]}
+    }}) # e.g., [{"name": "...", "methods": [...]}]
     main_flow: Optional[str] = None # Summary of execution or structure
     issues: List[str] = field(default_factory=list) # Potential problems found
     uses_async: bool = False
-    specific_focus_details: Optional[Dict[str, Any]] = field(default_factory=dict) # Added: Detailed results for specific focus
+    specific_focus_details: Optional[Dict[str, Any]] = field(default_factory=dict, metadata={"schema": {
+        # Response schemas cannot express free-form objects; ask for key/value pairs and fold them back into a dict
+        "type": "ARRAY", "items": {"type": "OBJECT", "properties": {
+            "key": {"type": "STRING"}, "value": {"type": "STRING"}
+        }, "required": ["key", "value"]}
+    }}) # Added: Detailed results for specific focus
 
 @dataclass
 class StepResult:
@@ -136,4 +149,91 @@ class StepResult:
     file: Optional[str] = None # Relative path of file generated/modified
     output: Optional[str] = None # Stdout/stderr from terminal commands
     result: Optional[Dict[str, Any]] = None # Other structured results (e.g., file hash, return code)
-    note: Optional[str] = None # Additional notes (e.g., "skipped by user", "analysis details")
\ No newline at end of file
+    note: Optional[str] = None # Additional notes (e.g., "skipped by user", "analysis details")
+
+# --- Response schemas for schema-constrained (structured output) generation ---
+_SCHEMA_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+def _type_schema(hint: Any) -> Optional[Dict[str, Any]]:
+    """Gemini Schema for a type hint, or None when it cannot be expressed (free-form dicts, Any)"""
+    origin, args = get_origin(hint), get_args(hint)
+    if origin is Union:
+        non_none = [arg for arg in args if arg is not type(None)]
+        inner = _type_schema(non_none[0]) if len(non_none) == 1 else None
+        return {**inner, "nullable": True} if inner else None
+    if origin is Literal:
+        return {"type": "STRING", "enum": [str(arg) for arg in args]}
+    if origin is list:
+        items = _type_schema(args[0]) if args else None
+        return {"type": "ARRAY", "items": items} if items else None
+    if is_dataclass(hint):
+        return dataclass_schema(hint)
+    if hint in _SCHEMA_TYPES:
+        return {"type": _SCHEMA_TYPES[hint]}
+    return None
+
+def dataclass_schema(cls: type, extra: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Derive a responseSchema (OpenAPI subset used by Gemini) from a dataclass.
+    Fields without defaults are required; a field's metadata["schema"] overrides the derived schema;
+    fields that cannot be expressed are left out. extra adds properties (required unless nullable).
+    """
+    hints = get_type_hints(cls)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for f in fields(cls):
+        schema = f.metadata.get("schema") or _type_schema(hints[f.name])
+        if schema is None:
+            continue
+        properties[f.name] = schema
+        if f.default is MISSING and f.default_factory is MISSING:
+            required.append(f.name)
+    for name, schema in (extra or {}).items():
+        properties[name] = schema
+        if not schema.get("nullable"):
+            required.append(name)
+    return {"type": "OBJECT", "properties": properties, "required": required}
+
+def validate_schema(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """Check value against a response schema in one pass; returns human-readable violations"""
+    if value is None:
+        return [] if schema.get("nullable") else [f"{path}: null is not allowed"]
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        if not isinstance(value, dict):
+            return [f"{path}: expected object"]
+        errors = [f"{path}.{name}: missing required property" for name in schema.get("required", []) if name not in value]
+        for name, sub_schema in schema.get("properties", {}).items():
+            if name in value:
+                errors.extend(validate_schema(value[name], sub_schema, f"{path}.{name}"))
+        return errors
+    if kind == "ARRAY":
+        if not isinstance(value, list):
+            return [f"{path}: expected array"]
+        errors = []
+        for index, item in enumerate(value):
+            errors.extend(validate_schema(item, schema.get("items", {}), f"{path}[{index}]"))
+        return errors
+    if kind == "STRING":
+        if not isinstance(value, str):
+            return [f"{path}: expected string"]
+        if "enum" in schema and value not in schema["enum"]:
+            return [f"{path}: '{value}' is not one of {schema['enum']}"]
+        return []
+    if kind == "BOOLEAN":
+        return [] if isinstance(value, bool) else [f"{path}: expected boolean"]
+    if kind in ("INTEGER", "NUMBER"):
+        allowed = int if kind == "INTEGER" else (int, float)
+        return [] if isinstance(value, allowed) and not isinstance(value, bool) else [f"{path}: expected {kind.lower()}"]
+    return []
+
+PLAN_RESPONSE_SCHEMA = dataclass_schema(Plan, extra={
+    # Lets the planner answer conversationally (with no steps) while staying schema-valid
+    "reply": {"type": "STRING", "nullable": True},
+})
+CODE_ANALYSIS_SCHEMA = dataclass_schema(CodeAnalysis)
+CODE_ANALYSES_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"analyses": {"type": "ARRAY", "items": dataclass_schema(CodeAnalysis, extra={"file_path": {"type": "STRING"}})}},
+    "required": ["analyses"],
+}